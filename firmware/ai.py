@@ -1,22 +1,83 @@
 """AI integrations — Claude Vision for scene analysis, Whisper for STT."""
 
 import base64
+import io
+import json
 import logging
 import tempfile
+import threading
+import time
+import wave
 from pathlib import Path
 
-import anthropic
 from config import (
     ANTHROPIC_API_KEY,
+    ANTHROPIC_BASE_URL,
+    DEEPGRAM_API_KEY,
+    DEEPGRAM_URL,
+    HEDGE_VISION,
+    LLM_DEADLINE_SEC,
+    RAPID_DEADLINE_SEC,
+    RAPID_MAX_TOKENS,
+    STT_DEADLINE_SEC,
+    VISION_DEADLINE_SEC,
+    VISION_FALLBACK_DEADLINE_SEC,
+    VISION_FALLBACK_MAX_SIDE,
+    VISION_FALLBACK_MAX_TOKENS,
     VISION_MODEL,
     VISION_MAX_TOKENS,
+    VOSK_MODEL_PATH,
 )
+from audio import encode
+from link import controller, estimator
+from resilience import Resilient, ServiceUnavailable
 
 log = logging.getLogger(__name__)
 
-# --- Claude Vision ---
+# --- Clients ---
+# Created on first use, not at import: the anthropic SDK alone takes seconds to
+# import on a Pi. warm_up() builds them in the background during startup.
+
+_clients: dict = {}
+_locks = {"anthropic": threading.Lock(), "deepgram": threading.Lock(), "vosk": threading.Lock()}
+
+# Deadline, hedging and circuit breaker per service (see resilience.py). The
+# clients don't retry on their own; a retry or hedge is the guard's decision.
+_stt = Resilient("stt", STT_DEADLINE_SEC)
+_vision = Resilient("vision", VISION_DEADLINE_SEC, hedge=HEDGE_VISION)
+_llm = Resilient("llm", LLM_DEADLINE_SEC, hedge=False)
+# A hedged batch would pay for every image twice; nobody is waiting on it anyway
+_vision_batch = Resilient("vision_batch", RAPID_DEADLINE_SEC, hedge=False)
+
+
+def _anthropic():
+    with _locks["anthropic"]:
+        if "anthropic" not in _clients:
+            import anthropic
+
+            _clients["anthropic"] = anthropic.Anthropic(
+                api_key=ANTHROPIC_API_KEY, base_url=ANTHROPIC_BASE_URL, max_retries=0
+            )
+        return _clients["anthropic"]
+
+
+def _deepgram():
+    with _locks["deepgram"]:
+        if "deepgram" not in _clients:
+            import httpx
 
-client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+            # One pooled client, so each turn reuses the TLS connection instead of a fresh handshake
+            _clients["deepgram"] = httpx.Client(base_url=DEEPGRAM_URL, timeout=STT_DEADLINE_SEC)
+        return _clients["deepgram"]
+
+
+def warm_up():
+    """Import the SDKs and build the clients, so the first turn doesn't pay for it."""
+    _deepgram()
+    _anthropic()
+
+
+# --- Claude Vision ---
 
 SYSTEM_PROMPT = """You are Airpiece, a hands-free AI assistant mounted on a hard hat.
 You help with green roof site surveys. You can see through a camera on the user's head.
@@ -30,88 +91,218 @@ Guidelines:
 - You have access to GPS coordinates and timestamps for geolocation."""
 
 
-def analyse_scene(image_b64: str, user_query: str, context: str = "") -> str:
-    """Send a camera frame + user query to Claude Vision. Returns text response."""
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "image/jpeg",
-                        "data": image_b64,
-                    },
-                },
-                {
-                    "type": "text",
-                    "text": f"{context}\n\nUser says: {user_query}" if context else user_query,
-                },
-            ],
-        }
-    ]
+SHORT_PROMPT = """You are Airpiece, a hands-free site survey assistant on a hard hat camera.
+Answer in one short sentence; it is read aloud through an earpiece."""
+
+
+def analyse_scene(image_b64: str, user_query: str, context: str = "", usage: dict = None) -> str:
+    """Send a camera frame + user query to Claude Vision. Returns text response.
 
+    If a usage dict is given, the call's input and output token counts are stored in it.
+    While the API is slow or failing, a smaller image and shorter prompt are sent instead.
+    image_b64 may be None when the link is too slow to send a frame at all.
+    """
     try:
-        response = client.messages.create(
-            model=VISION_MODEL,
-            max_tokens=VISION_MAX_TOKENS,
-            system=SYSTEM_PROMPT,
-            messages=messages,
-        )
-        return response.content[0].text
-    except Exception as e:
+        return _vision.call(_vision_request, image_b64, user_query, context, usage,
+                            fallback=_vision_fallback)
+    except ServiceUnavailable as e:
         log.error("Claude Vision API error: %s", e)
         return f"Sorry, I couldn't process that. Error: {e}"
 
 
-def generate_report(events: list[dict]) -> str:
-    """Generate a site survey report from today's logged events."""
-    event_summary = "\n".join(
-        f"- [{e['timestamp']}] ({e['event_type']}) {e.get('transcript', '')} → {e.get('ai_response', '')}"
-        for e in events
+def _vision_request(image_b64: str, user_query: str, context: str, usage: dict | None,
+                    system: str = SYSTEM_PROMPT, max_tokens: int = VISION_MAX_TOKENS,
+                    timeout: float = VISION_DEADLINE_SEC) -> str:
+    text = f"{context}\n\nUser says: {user_query}" if context else user_query
+    content = [{"type": "text", "text": text}]
+    if image_b64:
+        content.insert(0, {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": "image/jpeg",
+                "data": image_b64,
+            },
+        })
+    else:
+        content[0]["text"] = f"(No image: the connection is too slow to send one.)\n{text}"
+    messages = [{"role": "user", "content": content}]
+    t0 = time.monotonic()
+    response = _anthropic().messages.create(
+        model=VISION_MODEL,
+        max_tokens=max_tokens,
+        system=system,
+        messages=messages,
+        timeout=timeout,
+    )
+    estimator.observe("vision", len(image_b64 or "") + len(system) + len(text), time.monotonic() - t0)
+    if usage is not None:
+        usage["input_tokens"] = response.usage.input_tokens
+        usage["output_tokens"] = response.usage.output_tokens
+    return response.content[0].text
+
+
+def _vision_fallback(image_b64: str, user_query: str, context: str, usage: dict | None) -> str:
+    """Degraded mode: a downscaled frame, the short prompt and a short answer."""
+    return _vision_request(
+        shrink_jpeg(image_b64, VISION_FALLBACK_MAX_SIDE), user_query, context, usage,
+        system=SHORT_PROMPT, max_tokens=VISION_FALLBACK_MAX_TOKENS,
+        timeout=VISION_FALLBACK_DEADLINE_SEC,
     )
 
-    response = client.messages.create(
+
+def shrink_jpeg(image_b64: str, max_side: int) -> str:
+    """Re-encode a base64 JPEG with its longest side at most max_side."""
+    from PIL import Image
+
+    if not image_b64:
+        return image_b64
+    image = Image.open(io.BytesIO(base64.standard_b64decode(image_b64)))
+    if max(image.size) <= max_side:
+        return image_b64
+    image.thumbnail((max_side, max_side))
+    buf = io.BytesIO()
+    image.convert("RGB").save(buf, format="JPEG", quality=70)
+    return base64.standard_b64encode(buf.getvalue()).decode("utf-8")
+
+
+BATCH_PROMPT = """You are Airpiece, a hands-free AI assistant mounted on a hard hat,
+helping with green roof site surveys. The user is logging observations quickly
+while walking the roof; each numbered item below is one camera frame with the
+note the user spoke when it was taken.
+
+For every item, write what the frame shows that bears on the note, in 1-2 sentences.
+For plant/species ID, give common name first, then latin name.
+
+Reply with only a JSON array, one object per item, in item order:
+[{"item": 1, "response": "...", "hazard": false}, ...]
+Set "hazard" to true only for a safety hazard the user should hear about now."""
+
+
+def analyse_batch(items: list[tuple[str | None, str, str]], usage: dict = None) -> list[dict | None]:
+    """One vision call for several observations, each (image_b64, note, context).
+
+    Returns one {"response", "hazard"} dict per item, in order; None for an item
+    the reply left out. Raises ServiceUnavailable if the call fails.
+    """
+    return _vision_batch.call(_batch_request, items, usage)
+
+
+def _batch_request(items: list[tuple[str | None, str, str]], usage: dict | None) -> list[dict | None]:
+    content = []
+    for i, (image_b64, note, context) in enumerate(items, 1):
+        text = f"Item {i}. {context}\nUser says: {note}" if context else f"Item {i}. User says: {note}"
+        if not image_b64:
+            text += "\n(No image: the connection is too slow to send one.)"
+        content.append({"type": "text", "text": text})
+        if image_b64:
+            content.append({
+                "type": "image",
+                "source": {"type": "base64", "media_type": "image/jpeg", "data": image_b64},
+            })
+    t0 = time.monotonic()
+    response = _anthropic().messages.create(
         model=VISION_MODEL,
-        max_tokens=2048,
-        system="You are a technical report writer for green roof site surveys.",
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Generate a concise site survey report from these logged events:
-
-{event_summary}
-
-Format: Summary, Key Findings (bulleted), Recommended Actions, Issues Noted.
-Keep it professional and suitable for a client handover.""",
-            }
-        ],
+        max_tokens=RAPID_MAX_TOKENS * len(items),
+        system=BATCH_PROMPT,
+        messages=[{"role": "user", "content": content}],
+        timeout=RAPID_DEADLINE_SEC,
     )
-    return response.content[0].text
+    up_bytes = len(BATCH_PROMPT) + sum(len(p.get("text", "")) for p in content)
+    up_bytes += sum(len(image_b64 or "") for image_b64, _, _ in items)
+    estimator.observe("vision_batch", up_bytes, time.monotonic() - t0)
+    if usage is not None:
+        usage["input_tokens"] = response.usage.input_tokens
+        usage["output_tokens"] = response.usage.output_tokens
+    return parse_batch(response.content[0].text, len(items))
 
 
-# --- Deepgram Speech-to-Text ---
+def parse_batch(text: str, n: int) -> list[dict | None]:
+    """Per-item results from a batch reply; raises ValueError if it isn't a JSON array."""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        raise ValueError(f"batch reply is not a JSON array: {text[:80]!r}")
+    results: list[dict | None] = [None] * n
+    for position, entry in enumerate(json.loads(text[start:end + 1])):
+        if not isinstance(entry, dict) or not entry.get("response"):
+            continue
+        i = entry.get("item", position + 1)
+        if isinstance(i, int) and 1 <= i <= n:
+            results[i - 1] = {"response": str(entry["response"]), "hazard": bool(entry.get("hazard"))}
+    return results
 
-def transcribe_audio(wav_bytes: bytes) -> str:
-    """Transcribe WAV audio to text using Deepgram."""
-    from deepgram import DeepgramClient, PrerecordedOptions
-    from config import DEEPGRAM_API_KEY
 
-    client = DeepgramClient(DEEPGRAM_API_KEY)
+def complete(system: str, prompt: str, max_tokens: int) -> str:
+    """Single text-only Claude call. Raises on API errors."""
+    return _llm.call(_complete_request, system, prompt, max_tokens)
 
-    options = PrerecordedOptions(
-        model="nova-2",
-        language="en-GB",
-        smart_format=True,
+
+def _complete_request(system: str, prompt: str, max_tokens: int) -> str:
+    response = _anthropic().messages.create(
+        model=VISION_MODEL,
+        max_tokens=max_tokens,
+        system=system,
+        messages=[{"role": "user", "content": prompt}],
+        timeout=LLM_DEADLINE_SEC,
     )
+    return response.content[0].text
+
+
+def generate_report(events: list[dict]) -> str:
+    """Generate a site survey report from today's logged events."""
+    from report import ReportEngine
 
+    return ReportEngine(complete).generate(events)
+
+
+# --- Deepgram Speech-to-Text ---
+
+def transcribe_audio(wav_bytes: bytes) -> str:
+    """Transcribe WAV audio to text using Deepgram, or offline with Vosk while Deepgram is down.
+
+    The upload is compressed with the current link profile's codec.
+    """
+    encoded = encode(wav_bytes, controller.profile.audio)
     try:
-        response = client.listen.rest.v("1").transcribe_file(
-            {"buffer": wav_bytes, "mimetype": "audio/wav"},
-            options
-        )
-        return response.results.channels[0].alternatives[0].transcript.strip()
-    except Exception as e:
+        return _stt.call(_deepgram_transcribe, wav_bytes, encoded, fallback=_local_transcribe)
+    except ServiceUnavailable as e:
         log.error("Deepgram STT error: %s", e)
         return ""
+
+
+def _deepgram_transcribe(wav_bytes: bytes, encoded: tuple[bytes, str]) -> str:
+    body, mime = encoded
+    t0 = time.monotonic()
+    response = _deepgram().post(
+        "/v1/listen",
+        params={"model": "nova-2", "language": "en-GB", "smart_format": "true"},
+        headers={
+            "Authorization": f"Token {DEEPGRAM_API_KEY}",
+            "Content-Type": mime,
+        },
+        content=body,
+    )
+    estimator.observe("stt", len(body), time.monotonic() - t0)
+    response.raise_for_status()
+    result = response.json()
+    return result["results"]["channels"][0]["alternatives"][0]["transcript"].strip()
+
+
+def _local_transcribe(wav_bytes: bytes, encoded=None) -> str:
+    """Offline STT with Vosk, if it is installed and a model is in VOSK_MODEL_PATH."""
+    with _locks["vosk"]:
+        if "vosk" not in _clients:
+            from vosk import Model, SetLogLevel
+
+            if not VOSK_MODEL_PATH.exists():
+                raise FileNotFoundError(f"No Vosk model at {VOSK_MODEL_PATH}")
+            SetLogLevel(-1)
+            _clients["vosk"] = Model(str(VOSK_MODEL_PATH))
+        model = _clients["vosk"]
+
+    from vosk import KaldiRecognizer
+
+    with wave.open(io.BytesIO(wav_bytes)) as wf:
+        recogniser = KaldiRecognizer(model, wf.getframerate())
+        recogniser.AcceptWaveform(wf.readframes(wf.getnframes()))
+    return json.loads(recogniser.FinalResult()).get("text", "").strip()
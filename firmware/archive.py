@@ -0,0 +1,207 @@
+"""Columnar archive of closed survey days.
+
+Closed days are moved out of SQLite into Parquet files laid out as
+    archive/date=YYYY-MM-DD/event_type=<type>/<source>.parquet
+where <source> is device-<id> for a device's own archive and fleet-<id> for
+the server's copy of that device's events, so the two never overwrite each
+other when they share a data directory (as on a dev machine). Analytics
+read only the partitions and columns they need. The hot events table then
+only holds today (and anything not yet synced).
+
+pyarrow is optional; without it nothing is archived and queries raise.
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config import ARCHIVE_DIR, DB_PATH, DEVICE_ID, SYNC_URL
+from logger import _connect as _events_connect, day_bounds, today
+
+log = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+COLUMNS = (
+    "device_id", "seq", "timestamp", "transcript", "ai_response",
+    "image_path", "latitude", "longitude", "metadata", "site_id",
+)
+
+
+def _schema():
+    return pa.schema([
+        ("device_id", pa.string()),
+        ("seq", pa.int64()),
+        ("timestamp", pa.string()),
+        ("transcript", pa.string()),
+        ("ai_response", pa.string()),
+        ("image_path", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("metadata", pa.string()),
+        ("site_id", pa.string()),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([("date", pa.string()), ("event_type", pa.string())]), flavor="hive"
+    )
+
+
+def write_day(rows: list[dict], day: str, source: str, root: Path = ARCHIVE_DIR) -> int:
+    """Write one day's events from one source, split by event type.
+
+    Rows already archived for the day are kept: a late sync recreates a
+    partition holding only the new rows, so they are merged in, and a row
+    sent again (a revision) replaces its earlier copy by (device_id, seq).
+    """
+    by_type: dict[str, list[dict]] = {}
+    for row in rows:
+        by_type.setdefault(row["event_type"], []).append(row)
+
+    for event_type, typed in by_type.items():
+        path = root / f"date={day}" / f"event_type={event_type}" / f"{source}.parquet"
+        merged = {}
+        if path.exists():
+            for r in pq.read_table(path).to_pylist():
+                merged[(r["device_id"], r["seq"])] = {c: r.get(c) for c in COLUMNS}
+        for r in typed:
+            merged[(r.get("device_id"), r.get("seq"))] = {c: r.get(c) for c in COLUMNS}
+        table = pa.Table.from_pylist(
+            sorted(merged.values(), key=lambda r: (r["device_id"] or "", r["seq"] or 0)), schema=_schema()
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")  # dot-files are skipped by readers
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+    return len(rows)
+
+
+def _sync_marks(conn: sqlite3.Connection) -> tuple[int, int] | None:
+    """(events_hwm, revisions_hwm) confirmed on the server, or None if sync is disabled."""
+    if not SYNC_URL:
+        return None
+    try:
+        marks = {
+            key: int(value) for key, value in conn.execute(
+                "SELECT key, value FROM sync_state WHERE key IN ('events_hwm', 'revisions_hwm')"
+            )
+        }
+    except sqlite3.OperationalError:
+        return 0, 0
+    return marks.get("events_hwm", 0), marks.get("revisions_hwm", 0)
+
+
+def _fully_synced(conn: sqlite3.Connection, rows: list[dict], start: str, end: str, marks) -> bool:
+    """Every event of the day, and every later rewrite of one, is on the server."""
+    if marks is None:
+        return True
+    events_hwm, revisions_hwm = marks
+    if max(r["id"] for r in rows) > events_hwm:
+        return False
+    pending = conn.execute(
+        "SELECT 1 FROM event_revisions r JOIN events e ON e.id = r.event_id "
+        "WHERE e.timestamp >= ? AND e.timestamp < ? AND r.rev > ? LIMIT 1",
+        (start, end, revisions_hwm),
+    ).fetchone()
+    return pending is None
+
+
+def archive_closed_days(db_path=DB_PATH, root: Path = ARCHIVE_DIR) -> int:
+    """Move every day before today from the events table into the archive.
+
+    Days with events or revisions not yet synced to the server are left in
+    place. Returns the number of events archived.
+    """
+    if not HAS_PYARROW:
+        return 0
+    start_of_today, _ = day_bounds(today())
+    conn = _events_connect(db_path)
+    conn.row_factory = sqlite3.Row
+    marks = _sync_marks(conn)
+    days = [
+        row[0] for row in conn.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 10) FROM events WHERE timestamp < ?",
+            (start_of_today,),
+        )
+    ]
+
+    archived = 0
+    for day in days:
+        start, end = day_bounds(day)
+        rows = [
+            {**dict(r), "device_id": DEVICE_ID, "seq": r["id"]}
+            for r in conn.execute(
+                "SELECT * FROM events WHERE timestamp >= ? AND timestamp < ? ORDER BY id",
+                (start, end),
+            )
+        ]
+        if not _fully_synced(conn, rows, start, end, marks):
+            log.debug("Not archiving %s yet — not fully synced", day)
+            continue
+        write_day(rows, day, f"device-{DEVICE_ID}", root)
+        with conn:
+            conn.execute(
+                "DELETE FROM events WHERE timestamp >= ? AND timestamp < ?", (start, end)
+            )
+        archived += len(rows)
+        log.info("Archived %d events from %s", len(rows), day)
+    conn.close()
+    return archived
+
+
+# --- Query path ---
+
+def _dataset(root: Path = ARCHIVE_DIR):
+    if not HAS_PYARROW:
+        raise RuntimeError("pyarrow is not installed — archive queries unavailable")
+    # An explicit schema, so days archived before a column existed read it as null
+    schema = pa.unify_schemas([_schema(), _partitioning().schema])
+    return ds.dataset(root, format="parquet", partitioning=_partitioning(), schema=schema)
+
+
+def _filter(start: str, end: str, event_types: list[str] = None):
+    expr = (pc.field("date") >= start) & (pc.field("date") <= end)
+    if event_types:
+        expr &= pc.field("event_type").isin(event_types)
+    return expr
+
+
+def query(
+    columns: list[str], start: str, end: str, event_types: list[str] = None,
+    root: Path = ARCHIVE_DIR,
+) -> list[dict]:
+    """Read only the requested columns from the partitions in [start, end]."""
+    if not root.exists():
+        return []
+    table = _dataset(root).to_table(columns=columns, filter=_filter(start, end, event_types))
+    return table.to_pylist()
+
+
+def counts(
+    by: str, start: str, end: str, event_types: list[str] = None, root: Path = ARCHIVE_DIR
+) -> dict[str, int]:
+    """Event counts grouped by one column (date, event_type, device_id, ...)."""
+    if not root.exists():
+        return {}
+    table = _dataset(root).to_table(columns=[by], filter=_filter(start, end, event_types))
+    grouped = table.group_by(by).aggregate([([], "count_all")])
+    return dict(zip(grouped[by].to_pylist(), grouped["count_all"].to_pylist()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    t0 = datetime.now(timezone.utc)
+    n = archive_closed_days()
+    print(f"Archived {n} events in {(datetime.now(timezone.utc) - t0).total_seconds():.1f}s")
@@ -1,34 +1,95 @@
 """Audio capture, voice activity detection, and wake word detection."""
 
 import io
+import shutil
+import subprocess
 import wave
 import logging
 import struct
-import pyaudio
-import webrtcvad
+import time
+from typing import Callable
+
+import numpy as np  # also imported by picamera2, so no extra startup cost on the device
+
 from config import (
+    BARGE_IN_FRAMES,
     SAMPLE_RATE,
     CHANNELS,
     CHUNK_SIZE,
     VAD_AGGRESSIVENESS,
-    SILENCE_TIMEOUT_SEC,
 )
+from endpointer import Endpointer
 
 log = logging.getLogger(__name__)
 
 
+def rms(pcm: bytes) -> float:
+    """Root-mean-square level of 16-bit PCM."""
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2).astype(np.float32)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.dot(samples, samples) / samples.size))
+
+
+def frames_to_wav(frames: list[bytes]) -> bytes:
+    """Wrap raw PCM frames from the mic in a WAV header."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(2)  # 16-bit
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(b"".join(frames))
+    return buf.getvalue()
+
+
+# codec -> (encoder command reading WAV on stdin, MIME type)
+CODECS = {
+    "flac": (["flac", "--silent", "--best", "--stdout", "-"], "audio/flac"),
+    "opus": (["opusenc", "--quiet", "--speech", "--bitrate", "16", "-", "-"], "audio/ogg"),
+}
+
+
+def encode(wav: bytes, codec: str) -> tuple[bytes, str]:
+    """Compress a WAV for upload; (data, MIME type). Falls back to the WAV if the encoder is missing."""
+    if codec in CODECS:
+        command, mime = CODECS[codec]
+        if shutil.which(command[0]):
+            result = subprocess.run(command, input=wav, capture_output=True, timeout=10)
+            if result.returncode == 0:
+                return result.stdout, mime
+            log.warning("%s encode failed: %s", codec, result.stderr.decode(errors="replace"))
+        else:
+            log.debug("%s not installed — sending WAV", command[0])
+    return wav, "audio/wav"
+
+
 class AudioCapture:
     """Captures audio from the INMP441 I2S mic via ALSA/PyAudio."""
 
+    # Set by the app for full-duplex operation: current playback level, and a
+    # callback fired once per utterance after BARGE_IN_FRAMES voiced frames
+    echo_reference: Callable[[], float] | None = None
+    on_speech_start: Callable[[], None] | None = None
+    # Called with the frames recorded so far after every chunk of an utterance
+    on_recording: Callable[[list[bytes]], None] | None = None
+    # Created on first listen, and kept so the noise floor carries across utterances
+    endpointer: Endpointer | None = None
+
     def __init__(self):
+        # Imported here rather than at module level: mock sources need no PortAudio,
+        # and webrtcvad pulls in pkg_resources, which is slow to load
+        import pyaudio
+        import webrtcvad
+
         self.pa = pyaudio.PyAudio()
         self.vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
         self.stream = None
+        self.last_speech_at: float | None = None  # perf_counter of the last voiced chunk
 
     def start(self):
         """Open the audio input stream."""
         self.stream = self.pa.open(
-            format=pyaudio.paInt16,
+            format=self.pa.get_format_from_width(2),  # paInt16
             channels=CHANNELS,
             rate=SAMPLE_RATE,
             input=True,
@@ -48,53 +109,26 @@ class AudioCapture:
         """Read a single chunk of audio data."""
         return self.stream.read(CHUNK_SIZE, exception_on_overflow=False)
 
-    def is_speech(self, chunk: bytes) -> bool:
-        """Check if an audio chunk contains speech using VAD."""
-        try:
-            return self.vad.is_speech(chunk, SAMPLE_RATE)
-        except Exception:
-            return False
+    def _on_voiced(self, run: int):
+        self.last_speech_at = time.perf_counter()
+        if run == BARGE_IN_FRAMES and self.on_speech_start:
+            self.on_speech_start()
 
     def listen_for_speech(self) -> bytes | None:
         """
         Block until speech is detected, then record until silence.
         Returns WAV audio bytes, or None if nothing meaningful captured.
         """
-        frames = []
-        silent_chunks = 0
-        max_silent = int(SILENCE_TIMEOUT_SEC / (CHUNK_SIZE / SAMPLE_RATE))
-        recording = False
-        min_speech_chunks = 10  # ~300ms minimum to avoid false triggers
-
+        if self.endpointer is None:
+            self.endpointer = Endpointer(
+                lambda chunk: self.vad.is_speech(chunk, SAMPLE_RATE),
+                on_voiced=self._on_voiced,
+                echo_reference=lambda: self.echo_reference() if self.echo_reference else 0.0,
+            )
+        endpointer = self.endpointer
         log.debug("Listening for speech...")
-
-        while True:
-            chunk = self.read_chunk()
-
-            if self.is_speech(chunk):
-                if not recording:
-                    log.debug("Speech detected, recording...")
-                    recording = True
-                frames.append(chunk)
-                silent_chunks = 0
-            elif recording:
-                frames.append(chunk)
-                silent_chunks += 1
-                if silent_chunks >= max_silent:
-                    break
-
-        if len(frames) < min_speech_chunks:
-            log.debug("Too short, ignoring (%d chunks)", len(frames))
-            return None
-
-        return self._frames_to_wav(frames)
-
-    def _frames_to_wav(self, frames: list[bytes]) -> bytes:
-        """Convert raw PCM frames to WAV format."""
-        buf = io.BytesIO()
-        with wave.open(buf, "wb") as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(2)  # 16-bit
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(b"".join(frames))
-        return buf.getvalue()
+        while not endpointer.feed(self.read_chunk()):
+            if endpointer.recording and self.on_recording:
+                self.on_recording(endpointer.frames)
+        frames = endpointer.take()
+        return frames_to_wav(frames) if frames else None
@@ -0,0 +1,211 @@
+"""Hardware backends — the device's and a laptop's microphone, camera, GPS and speaker.
+
+The pipeline talks to hardware through four interfaces, each defined by the
+Pi implementation it replaces:
+
+  - audio source: AudioCapture; a backend provides start(), stop() and
+    read_chunk() (CHUNK_SIZE frames of 16-bit PCM), and inherits VAD,
+    endpointing and barge-in unchanged
+  - camera: Camera; start(), stop() and capture_frame() returning the latest
+    frame as a PIL image without waiting for a new exposure
+  - GPS: GPS; start(), stop(), update() and get_position()
+  - audio sink: the synthesise and open_output callables given to
+    tts.Speaker; open_output(rate, channels) returns an object with write(),
+    close() (let buffered audio finish) and kill() (stop now)
+
+"pi" uses the classes in audio.py, camera.py, gps.py and tts.py. "desktop"
+runs the same loop on a laptop (dev/airpiece_mac.py): PortAudio through
+sounddevice for the mic and speakers, the webcam held open by a grabber
+thread so a frame is as cheap to take as from the Pi's continuously running
+camera, macOS `say` when Piper isn't installed, and a fixed position from
+AIRPIECE_POSITION in place of a receiver.
+"""
+
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+from audio import AudioCapture
+from camera import Camera
+from capture_store import CaptureStore
+from config import (
+    CAMERA_RESOLUTION, CHANNELS, CHUNK_SIZE, DESKTOP_POSITION, HARDWARE, SAMPLE_RATE,
+    VAD_AGGRESSIVENESS, WEBCAM_INDEX,
+)
+from gps import GPS
+from tts import Speaker, _synthesise
+
+log = logging.getLogger(__name__)
+
+
+# --- Desktop ---
+
+class SoundDeviceAudio(AudioCapture):
+    """Default microphone through sounddevice, which ships its own PortAudio on macOS."""
+
+    def __init__(self):
+        import webrtcvad
+
+        self.vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+        self.stream = None
+        self.last_speech_at: float | None = None
+
+    def start(self):
+        import sounddevice as sd
+
+        self.stream = sd.RawInputStream(
+            samplerate=SAMPLE_RATE, channels=CHANNELS, dtype="int16", blocksize=CHUNK_SIZE
+        )
+        self.stream.start()
+        log.info("Microphone opened (rate=%d, chunk=%d)", SAMPLE_RATE, CHUNK_SIZE)
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+
+    def read_chunk(self) -> bytes:
+        data, overflowed = self.stream.read(CHUNK_SIZE)
+        if overflowed:
+            log.debug("Microphone overflow")
+        return bytes(data)
+
+
+class WebcamCamera(Camera):
+    """Webcam kept open, with a thread grabbing frames so the latest is always at hand.
+
+    Opening the device per request costs a second or more, plus frames thrown
+    away while the exposure settles; the Pi camera runs continuously, and so
+    does this.
+    """
+
+    def __init__(self, index: int = WEBCAM_INDEX, store: CaptureStore = None):
+        super().__init__(store=store)
+        self.index = index
+        self._capture = None  # cv2.VideoCapture; self.camera stays None, so the mock frame is the fallback
+        self._frame = None  # latest BGR array
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        import cv2
+
+        capture = cv2.VideoCapture(self.index)
+        if not capture.isOpened():
+            log.warning("Webcam %d not available (camera permission?) — using mock camera", self.index)
+            return
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_RESOLUTION[0])
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_RESOLUTION[1])
+        self._capture = capture
+        self._running = True
+        self._thread = threading.Thread(target=self._grab, name="webcam", daemon=True)
+        self._thread.start()
+        log.info("Webcam %d started at %dx%d", self.index,
+                 capture.get(cv2.CAP_PROP_FRAME_WIDTH), capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._capture:
+            self._capture.release()
+            log.info("Webcam stopped")
+
+    def _grab(self):
+        while self._running:
+            ok, frame = self._capture.read()
+            with self._cond:
+                if not ok:
+                    log.warning("Webcam read failed — using mock camera")
+                    self._running = False
+                else:
+                    self._frame = frame
+                self._cond.notify_all()
+
+    def capture_frame(self) -> Image.Image:
+        with self._cond:
+            if self._frame is None and self._running:
+                self._cond.wait(timeout=5)  # first frames after opening
+            frame = self._frame
+        if frame is None:
+            return super().capture_frame()
+        import cv2
+
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+class FixedGPS(GPS):
+    """No receiver: reports AIRPIECE_POSITION ("lat,lon") as a standing fix, if set."""
+
+    def __init__(self, position: str = DESKTOP_POSITION):
+        super().__init__()
+        self.position = position
+
+    def start(self):
+        if self.position:
+            self.last_lat, self.last_lon = (float(v) for v in self.position.split(","))
+            log.info("Fixed position %.5f, %.5f", self.last_lat, self.last_lon)
+
+    def stop(self):
+        pass
+
+    def update(self) -> bool:
+        return self.last_lat is not None
+
+
+class SoundDeviceOutput:
+    """Default speakers through sounddevice, in place of tts._Aplay."""
+
+    def __init__(self, rate: int, channels: int):
+        import sounddevice as sd
+
+        self.stream = sd.RawOutputStream(samplerate=rate, channels=channels, dtype="int16")
+        self.stream.start()
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    def close(self):
+        self.stream.stop()  # returns once buffered audio has played
+        self.stream.close()
+
+    def kill(self):
+        self.stream.abort()
+        self.stream.close()
+
+
+def desktop_synthesise(text: str) -> bytes | None:
+    """Piper if it is installed, else macOS `say`, as 16-bit WAV."""
+    if shutil.which("piper") or not shutil.which("say"):
+        return _synthesise(text)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "say.wav"
+        result = subprocess.run(
+            ["say", "-r", "180", "-o", str(path), "--file-format=WAVE", "--data-format=LEI16@22050", text],
+            capture_output=True,
+            timeout=30,
+        )
+        if result.returncode != 0:
+            log.error("say failed: %s", result.stderr.decode(errors="replace"))
+            return None
+        return path.read_bytes()
+
+
+def hardware(name: str = HARDWARE) -> dict:
+    """Airpiece constructor arguments for a backend: "pi" (the defaults) or "desktop"."""
+    if name == "pi":
+        return {}
+    if name == "desktop":
+        return {
+            "audio": SoundDeviceAudio(),
+            "camera": WebcamCamera(),
+            "gps": FixedGPS(),
+            "speaker": Speaker(synthesise=desktop_synthesise, open_output=SoundDeviceOutput),
+        }
+    raise ValueError(f"unknown hardware backend {name!r} (expected 'pi' or 'desktop')")
@@ -3,41 +3,36 @@
 import base64
 import io
 import logging
-from datetime import datetime, timezone
 from pathlib import Path
 from PIL import Image
-from config import CAMERA_RESOLUTION, JPEG_QUALITY, CAPTURES_DIR
+from capture_store import CaptureStore
+from config import CAMERA_RESOLUTION, JPEG_QUALITY
 
 log = logging.getLogger(__name__)
 
-# picamera2 only available on Raspberry Pi — import conditionally
-try:
-    from picamera2 import Picamera2
-
-    HAS_PICAMERA = True
-except ImportError:
-    HAS_PICAMERA = False
-    log.warning("picamera2 not available — using mock camera")
-
 
 class Camera:
     """Controls the Pi Camera Module 3."""
 
-    def __init__(self):
+    def __init__(self, store: CaptureStore = None):
         self.camera = None
+        self.store = store or CaptureStore()
 
     def start(self):
         """Initialize and start the camera."""
-        if HAS_PICAMERA:
-            self.camera = Picamera2()
-            config = self.camera.create_still_configuration(
-                main={"size": CAMERA_RESOLUTION}
-            )
-            self.camera.configure(config)
-            self.camera.start()
-            log.info("Camera started at %s", CAMERA_RESOLUTION)
-        else:
-            log.info("Mock camera started (no picamera2)")
+        # picamera2 is only available on the Pi, and slow to import — load it here
+        try:
+            from picamera2 import Picamera2
+        except ImportError:
+            log.warning("picamera2 not available — using mock camera")
+            return
+        self.camera = Picamera2()
+        config = self.camera.create_still_configuration(
+            main={"size": CAMERA_RESOLUTION}
+        )
+        self.camera.configure(config)
+        self.camera.start()
+        log.info("Camera started at %s", CAMERA_RESOLUTION)
 
     def stop(self):
         """Stop the camera."""
@@ -47,27 +42,25 @@ class Camera:
 
     def capture_frame(self) -> Image.Image:
         """Capture a single frame and return as PIL Image."""
-        if HAS_PICAMERA:
+        if self.camera:
             array = self.camera.capture_array()
             return Image.fromarray(array)
         else:
             # Mock: return a small placeholder image for testing
             return Image.new("RGB", (320, 240), color=(100, 150, 100))
 
-    def capture_and_save(self, label: str = "") -> Path:
-        """Capture a frame, save to disk, return the file path."""
-        frame = self.capture_frame()
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{label}.jpg" if label else f"{timestamp}.jpg"
-        filepath = CAPTURES_DIR / filename
-        frame.save(filepath, "JPEG", quality=JPEG_QUALITY)
-        log.info("Frame saved: %s", filepath)
-        return filepath
+    def capture_and_save(self, label: str = "", frame: Image.Image = None) -> Path:
+        """Save a frame (captured now unless given) to the capture store, return the file path."""
+        return self.store.save(frame if frame is not None else self.capture_frame(), label=label)
 
-    def frame_to_base64(self, frame: Image.Image = None) -> str:
-        """Capture (or convert) a frame to base64 JPEG for the vision API."""
+    def frame_to_base64(self, frame: Image.Image = None, max_side: int = None,
+                        quality: int = JPEG_QUALITY) -> str:
+        """Capture (or convert) a frame to base64 JPEG for the vision API, optionally downscaled."""
         if frame is None:
             frame = self.capture_frame()
+        if max_side and max(frame.size) > max_side:
+            frame = frame.copy()
+            frame.thumbnail((max_side, max_side))
         buf = io.BytesIO()
-        frame.save(buf, format="JPEG", quality=JPEG_QUALITY)
+        frame.save(buf, format="JPEG", quality=quality)
         return base64.standard_b64encode(buf.getvalue()).decode("utf-8")
@@ -0,0 +1,149 @@
+"""Content-addressed capture storage.
+
+Images are named by the SHA-256 of their encoded bytes and sharded into
+two levels of subdirectories (ab/cd/abcd...jpg), so names never collide,
+identical frames are stored once, and no directory grows past a few
+hundred entries. An index table in SQLite records each image and the
+events that reference it.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config import CAPTURES_DIR, DB_PATH, JPEG_QUALITY, ensure_dirs
+
+log = logging.getLogger(__name__)
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS captures (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            label TEXT,
+            created TEXT NOT NULL,
+            synced_at TEXT,
+            deleted_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS capture_events (
+            sha256 TEXT NOT NULL,
+            event_id INTEGER NOT NULL,
+            PRIMARY KEY (sha256, event_id)
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_capture_events_event ON capture_events (event_id)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_captures_created ON captures (created)")
+    return conn
+
+
+def shard_path(digest: str, ext: str = "jpg", root: Path = CAPTURES_DIR) -> Path:
+    return root / digest[:2] / digest[2:4] / f"{digest}.{ext}"
+
+
+def relative_name(image_path: str, root: Path = CAPTURES_DIR) -> str:
+    """Path of a capture relative to the captures dir, as served under /captures."""
+    path = Path(image_path)
+    try:
+        return path.relative_to(root).as_posix()
+    except ValueError:
+        pass
+    # Recorded on another machine: keep whatever follows its captures directory
+    parts = path.parts
+    if root.name in parts:
+        idx = len(parts) - 1 - parts[::-1].index(root.name)
+        return "/".join(parts[idx + 1:])
+    return path.name
+
+
+def bytes_stored(day: str, db_path=DB_PATH) -> int:
+    """Bytes on disk now for captures first saved on day, each stored frame counted once."""
+    conn = _connect(db_path)
+    (total,) = conn.execute(
+        "SELECT COALESCE(SUM(bytes), 0) FROM captures "
+        "WHERE deleted_at IS NULL AND created >= ? AND created < date(?, '+1 day')",
+        (day, day),
+    ).fetchone()
+    conn.close()
+    return total
+
+
+def write_atomic(path: Path, data: bytes):
+    """Write via a temp file and rename, so a crash never leaves a truncated image."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CaptureStore:
+    """Stores captures under content-hash names and indexes them in SQLite."""
+
+    def __init__(self, root: Path = CAPTURES_DIR, db_path=DB_PATH):
+        self.root = root
+        self.db_path = db_path
+        _connect(self.db_path).close()
+
+    def save(self, frame, label: str = "") -> Path:
+        """Encode a PIL image as JPEG and store it. Returns the file path."""
+        buf = io.BytesIO()
+        frame.save(buf, format="JPEG", quality=JPEG_QUALITY)
+        return self.save_bytes(buf.getvalue(), "jpg", label=label, size=frame.size)
+
+    def save_bytes(
+        self, data: bytes, ext: str, label: str = "", size: tuple[int, int] = None
+    ) -> Path:
+        """Store already-encoded image bytes, deduplicating identical content."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = shard_path(digest, ext, self.root)
+        if path.exists():
+            log.debug("Duplicate frame, reusing %s", path)
+        else:
+            write_atomic(path, data)
+
+        width, height = size or (None, None)
+        conn = _connect(self.db_path)
+        conn.execute(
+            "INSERT OR IGNORE INTO captures (sha256, path, bytes, width, height, label, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (digest, str(path), len(data), width, height, label or None,
+             datetime.now(timezone.utc).isoformat()),
+        )
+        conn.commit()
+        conn.close()
+        log.info("Frame saved: %s", path)
+        return path
+
+    def link(self, image_path: str | Path, event_id: int):
+        """Record that an event references a stored capture."""
+        digest = Path(image_path).stem
+        conn = _connect(self.db_path)
+        conn.execute(
+            "INSERT OR IGNORE INTO capture_events (sha256, event_id) VALUES (?, ?)",
+            (digest, event_id),
+        )
+        conn.commit()
+        conn.close()
+
+    def lookup(self, digest: str) -> dict | None:
+        conn = _connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM captures WHERE sha256 = ?", (digest,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
@@ -1,6 +1,8 @@
 """Airpiece configuration — hardware pins, API keys, settings."""
 
 import os
+import socket
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,14 +12,33 @@ load_dotenv()
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY", "")
 
+# --- Cloud endpoints (overridable to point at local stubs for benchmarks) ---
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None  # None = SDK default
+DEEPGRAM_URL = os.getenv("DEEPGRAM_URL", "https://api.deepgram.com")
+
 # --- Audio ---
 SAMPLE_RATE = 16000
 CHANNELS = 1
 CHUNK_SIZE = 480  # 30ms frames at 16kHz (required by webrtcvad)
 VAD_AGGRESSIVENESS = 2  # 0-3, higher = more aggressive filtering
-SILENCE_TIMEOUT_SEC = 1.5  # seconds of silence before processing speech
+SILENCE_TIMEOUT_SEC = 1.5  # seconds of silence before processing speech, in loud background noise
+BARGE_IN_FRAMES = 5  # consecutive voiced 30ms frames that interrupt playback
+ECHO_GATE_RATIO = 0.5  # during playback, mic RMS must exceed this x playback RMS to count as speech
 WAKE_WORD = "airpiece"  # Porcupine wake word
 
+# --- Endpointing (see endpointer.py) ---
+ENDPOINT_GATE_LOW_DB = 4.0  # frames less than this above the noise floor are silence, without a VAD call
+ENDPOINT_GATE_HIGH_DB = 15.0  # ...and frames this far above it carry on an utterance without one
+ENDPOINT_FLOOR_RISE_DB_SEC = 5.0  # how fast the noise floor follows a rising background
+ENDPOINT_QUIET_DB = -60.0  # noise floor (dBFS) up to which the shortest silence timeout applies
+ENDPOINT_NOISY_DB = -35.0  # ...and from which SILENCE_TIMEOUT_SEC does
+ENDPOINT_SILENCE_MIN_SEC = 0.8
+ENDPOINT_RESUME_SEC = 0.09  # voiced audio that restarts the silence timeout; shorter blips don't
+ENDPOINT_MIN_SPEECH_SEC = 0.3  # voiced audio an utterance needs, so clicks and bumps are ignored
+ENDPOINT_PREROLL_SEC = 0.2  # audio kept from before the onset
+ENDPOINT_TAIL_SEC = 0.3  # trailing silence kept in the utterance; the rest isn't uploaded
+ENDPOINT_MAX_UTTERANCE_SEC = 30.0
+
 # --- Camera ---
 CAMERA_RESOLUTION = (1920, 1080)
 CAMERA_FRAME_RATE = 15
@@ -27,25 +48,130 @@ JPEG_QUALITY = 85  # For frames sent to vision API
 GPS_SERIAL_PORT = "/dev/ttyAMA0"
 GPS_BAUD_RATE = 9600
 
+# --- Hardware backends (see backends.py) ---
+# "pi" for the device; "desktop" runs the same pipeline on a laptop with its
+# webcam, default microphone and speakers. macOS defaults to desktop.
+HARDWARE = os.getenv("AIRPIECE_HARDWARE") or ("desktop" if sys.platform == "darwin" else "pi")
+WEBCAM_INDEX = int(os.getenv("AIRPIECE_WEBCAM", "0"))
+DESKTOP_POSITION = os.getenv("AIRPIECE_POSITION", "")  # "lat,lon" the desktop GPS reports; empty = no fix
+
 # --- TTS ---
 PIPER_MODEL = "en_GB-alba-medium"  # British English voice
 TTS_SPEED = 1.1  # Slightly faster than default
+PLAYBACK_BLOCK_SEC = 0.05  # PCM written to aplay per block; bounds barge-in stop latency
+PLAYBACK_LEAD_SEC = 0.1  # how far writes run ahead of the earpiece
 
 # --- Claude Vision ---
 VISION_MODEL = "claude-sonnet-4-20250514"
 VISION_MAX_TOKENS = 1024
 
+# --- Cloud call resilience (see resilience.py) ---
+STT_DEADLINE_SEC = 5.0  # final answer (or fallback) from STT within this
+VISION_DEADLINE_SEC = 12.0
+VISION_FALLBACK_DEADLINE_SEC = 6.0  # degraded request: small image, short prompt
+VISION_FALLBACK_MAX_SIDE = 640
+VISION_FALLBACK_MAX_TOKENS = 150
+LLM_DEADLINE_SEC = 90.0  # text-only summary/report calls, which run in the background
+HEDGE_VISION = True  # a hedged vision call can spend its tokens twice
+HEDGE_MIN_SAMPLES = 10  # latencies needed before hedging at p95 (until then, at half the deadline)
+HEDGE_WINDOW = 50  # recent successful calls the p95 is taken over
+BREAKER_FAILURES = 3  # consecutive failed calls that open a service's circuit
+BREAKER_COOLDOWN_SEC = 30  # time an open circuit sends everything to the fallback
+
+# --- Link-adaptive quality (see link.py) ---
+LINK_UPLOAD_BUDGET_SEC = 3.0  # time a turn's audio + image may take to upload
+LINK_UPGRADE_MARGIN = 0.7  # a better profile must fit in this share of the budget
+LINK_WINDOW = 12  # recent requests per service the link estimate is fitted to
+LINK_WINDOW_SEC = 300  # ...as long as they are this recent
+LINK_MAX_KBPS = 50_000  # cap on the estimate when uploads aren't the bottleneck
+
+# --- Speculative vision ---
+# Transcribe the utterance while it is still being recorded and start the
+# vision call once the interim transcripts settle. Costs extra STT requests,
+# and vision tokens whenever the final transcript disagrees.
+SPECULATIVE_VISION = os.getenv("AIRPIECE_SPECULATE", "").lower() in ("1", "true", "yes")
+SPECULATE_PARTIAL_SEC = 0.5  # audio recorded between interim transcriptions
+SPECULATE_AGREE = 2  # consecutive identical interim transcripts before speculating
+
+# --- Rapid log (see rapid.py) ---
+# "Rapid log on": observations are acknowledged at once and analysed later,
+# several frames per vision call, with the results written back to their events.
+RAPID_BATCH_MAX = 6  # observations per vision call
+RAPID_BATCH_WAIT_SEC = 8.0  # send a partial batch once its oldest observation has waited this long
+RAPID_BATCHES_IN_FLIGHT = 2  # concurrent batch calls; more observations queue behind them
+RAPID_MAX_ATTEMPTS = 3  # batch calls an observation gets before it is marked failed
+RAPID_DEADLINE_SEC = 45.0
+RAPID_MAX_TOKENS = 300  # per observation in the batch
+
+# --- Sites (see sites.py) ---
+SITE_GRID_DEG = 0.002  # index cell size, about 220 m north-south
+SITE_MARGIN_M = 15.0  # a fix this close outside a roof outline still counts as on it (GPS error)
+
+# --- Reports ---
+REPORT_CHUNK_MINUTES = 30  # events are summarised in windows of this length
+REPORT_CHUNK_MAX_EVENTS = 60  # ...split further if a window is busier than this
+REPORT_DIRECT_MAX_EVENTS = 40  # small days skip the map stage entirely
+REPORT_MERGE_FAN_IN = 8  # partial summaries combined per merge call
+REPORT_WORKERS = 4  # concurrent chunk summaries
+SUMMARY_DEBOUNCE_SEC = 20  # quiet time after an observation before the rolling summary refreshes
+
 # --- Paths ---
 PROJECT_ROOT = Path(__file__).parent.parent
-DATA_DIR = PROJECT_ROOT / "data"
+DATA_DIR = Path(os.getenv("AIRPIECE_DATA_DIR", PROJECT_ROOT / "data"))
 DB_PATH = DATA_DIR / "airpiece.db"
 CAPTURES_DIR = DATA_DIR / "captures"
 AUDIO_DIR = DATA_DIR / "audio"
+THUMBS_DIR = DATA_DIR / "thumbs"
+ARCHIVE_DIR = DATA_DIR / "archive"  # Parquet partitions of closed days
+SESSIONS_DIR = DATA_DIR / "sessions"  # recorded input sessions for replay
+TTS_CACHE_DIR = DATA_DIR / "tts_cache"  # pre-rendered fixed prompts
+SITES_PATH = Path(os.getenv("AIRPIECE_SITES", DATA_DIR / "sites.geojson"))  # roof outlines (see sites.py)
+# Offline STT model for when Deepgram is unreachable (optional)
+VOSK_MODEL_PATH = Path(os.getenv("VOSK_MODEL_PATH", PROJECT_ROOT / "models" / "vosk-model-small-en-us-0.15"))
+
+
+def ensure_dirs():
+    """Create the data directories. Called on first use rather than at import."""
+    for d in (DATA_DIR, CAPTURES_DIR, AUDIO_DIR, THUMBS_DIR):
+        d.mkdir(parents=True, exist_ok=True)
+
+
+# --- Image variants (companion server) ---
+# name -> (longest side in px, encoder quality)
+IMAGE_VARIANTS = {
+    "thumb": (320, 70),
+    "medium": (1280, 80),
+}
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+IMAGE_WORKERS = 2  # decode/resize processes
+
+# --- Live feed (companion server) ---
+FEED_POLL_SEC = 0.5  # how often the single tail query runs while anyone is subscribed
+FEED_QUEUE_SIZE = 256  # per-client backlog before a slow client is dropped
+
+# --- Storage budget ---
+STORAGE_BUDGET_BYTES = int(os.getenv("STORAGE_BUDGET_BYTES", 20 * 1024**3))  # of a 32 GB card
+STORAGE_MIN_FREE_BYTES = 1024**3  # below this, prune regardless of budget
+STORAGE_CHECK_SEC = 600
+RECOMPRESS_AFTER_DAYS = 7
+RECOMPRESS_FORMAT = "webp"
+RECOMPRESS_MAX_SIDE = 1280
+RECOMPRESS_QUALITY = 70
+
+# --- Archive ---
+ARCHIVE_INTERVAL_SEC = 3600  # how often the server archives closed fleet days
+
+# --- Sync to companion server ---
+SYNC_URL = os.getenv("SYNC_URL", "")  # e.g. http://office-pc:8080; empty disables sync
+SYNC_TOKEN = os.getenv("SYNC_TOKEN", "")  # shared secret checked by the ingest endpoints
+DEVICE_ID = os.getenv("DEVICE_ID") or socket.gethostname()
+SYNC_INTERVAL_SEC = 60
+SYNC_BATCH_SIZE = 200  # events per request
+SYNC_CHUNK_BYTES = 256 * 1024  # capture upload chunk
+SYNC_TIMEOUT_SEC = 30
 
-# Ensure data dirs exist
-DATA_DIR.mkdir(exist_ok=True)
-CAPTURES_DIR.mkdir(exist_ok=True)
-AUDIO_DIR.mkdir(exist_ok=True)
+# --- Session recording ---
+SESSION_RECORD = os.getenv("AIRPIECE_RECORD", "").lower() in ("1", "true", "yes")
 
 # --- Logging ---
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
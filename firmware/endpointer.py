@@ -0,0 +1,192 @@
+"""Endpointing — where an utterance starts and ends in the microphone stream.
+
+A cheap energy gate comes first. Each 30 ms frame's level is measured with
+NumPy, a block of frames at a time, against a noise floor that follows the
+background. Frames barely above the floor are silence. Frames far above it
+carry on an utterance that has already started. Only the frames in between,
+and every onset, go to webrtcvad, so on a quiet roof and through the middle of
+a sentence it is hardly called.
+
+The noise floor also sets the silence timeout. In quiet, an utterance ends
+after ENDPOINT_SILENCE_MIN_SEC of silence. Next to roof plant or in wind the
+VAD loses soft word endings more often, so the wait stretches up to
+SILENCE_TIMEOUT_SEC.
+
+Memory stays bounded:
+  - while waiting: a pre-roll ring buffer, so the first syllable (heard before
+    the VAD is sure) isn't clipped
+  - while recording: at most ENDPOINT_MAX_UTTERANCE_SEC
+  - afterwards, trailing silence beyond ENDPOINT_TAIL_SEC is trimmed off
+    before the utterance is handed on
+"""
+
+import logging
+import math
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+from config import (
+    CHUNK_SIZE, ENDPOINT_FLOOR_RISE_DB_SEC, ENDPOINT_GATE_HIGH_DB, ENDPOINT_GATE_LOW_DB,
+    ENDPOINT_MAX_UTTERANCE_SEC, ENDPOINT_MIN_SPEECH_SEC, ENDPOINT_NOISY_DB, ENDPOINT_PREROLL_SEC,
+    ENDPOINT_QUIET_DB, ENDPOINT_RESUME_SEC, ENDPOINT_SILENCE_MIN_SEC, ENDPOINT_TAIL_SEC, ECHO_GATE_RATIO,
+    SAMPLE_RATE, SILENCE_TIMEOUT_SEC,
+)
+
+log = logging.getLogger(__name__)
+
+FULL_SCALE_DB = 20 * math.log10(32768)  # level of a full-scale 16-bit square wave
+FLOOR_FALL = 0.3  # share of the gap the floor closes per frame when the background drops
+
+
+def frame_levels(pcm: bytes, frame_samples: int = CHUNK_SIZE) -> np.ndarray:
+    """Level in dBFS of each whole frame of 16-bit PCM, in one vectorised pass."""
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+    n = len(samples) // frame_samples
+    frames = samples[: n * frame_samples].reshape(n, frame_samples).astype(np.float32)
+    power = np.einsum("ij,ij->i", frames, frames) / frame_samples
+    return 10 * np.log10(power + 1.0) - FULL_SCALE_DB
+
+
+def frame_level(frame: bytes) -> float:
+    """Level in dBFS of a single frame; cheaper than frame_levels() for one."""
+    samples = np.frombuffer(frame, dtype=np.int16, count=len(frame) // 2).astype(np.float32)
+    return 10 * math.log10(float(samples @ samples) / max(1, samples.size) + 1.0) - FULL_SCALE_DB
+
+
+class Endpointer:
+    """Splits a PCM stream into utterances; keeps its noise floor between them.
+
+    feed() takes any whole number of frames and returns True once an utterance
+    has ended. take() then returns the utterance's frames, or None if it was
+    too short to be speech. Frames fed after the endpoint are carried over to
+    the next utterance.
+
+    vad is asked about a single frame. on_voiced is called with the length of
+    the current voiced run after each voiced frame. While echo_reference
+    reports a playback level, frames must be louder than ECHO_GATE_RATIO times
+    that level to count as speech.
+    """
+
+    def __init__(
+        self,
+        vad: Callable[[bytes], bool],
+        on_voiced: Callable[[int], None] | None = None,
+        echo_reference: Callable[[], float] | None = None,
+        frame_samples: int = CHUNK_SIZE,
+    ):
+        self._vad = vad
+        self._on_voiced = on_voiced
+        self._echo_reference = echo_reference
+        self.frame_samples = frame_samples
+        self.frame_sec = frame_samples / SAMPLE_RATE
+        self.floor_db: float | None = None
+        self.stats = {"frames": 0, "vad_calls": 0}
+        self._frame_bytes = frame_samples * 2
+        self._min_voiced = round(ENDPOINT_MIN_SPEECH_SEC / self.frame_sec)
+        self._resume = round(ENDPOINT_RESUME_SEC / self.frame_sec)
+        self._tail = round(ENDPOINT_TAIL_SEC / self.frame_sec)
+        self._max_frames = round(ENDPOINT_MAX_UTTERANCE_SEC / self.frame_sec)
+        self._preroll: deque[bytes] = deque(maxlen=max(1, round(ENDPOINT_PREROLL_SEC / self.frame_sec)))
+        self._carry = b""
+        self._reset()
+
+    def _reset(self):
+        self.frames: list[bytes] = []
+        self.recording = False
+        self.done = False
+        self.voiced = 0  # voiced frames in the utterance
+        self.voiced_run = 0
+        self.silent_run = 0
+
+    @property
+    def timeout_sec(self) -> float:
+        """Silence that ends an utterance at the current noise floor."""
+        floor = ENDPOINT_QUIET_DB if self.floor_db is None else self.floor_db
+        noisy = (floor - ENDPOINT_QUIET_DB) / (ENDPOINT_NOISY_DB - ENDPOINT_QUIET_DB)
+        noisy = min(1.0, max(0.0, noisy))
+        return ENDPOINT_SILENCE_MIN_SEC + noisy * (SILENCE_TIMEOUT_SEC - ENDPOINT_SILENCE_MIN_SEC)
+
+    def feed(self, pcm: bytes) -> bool:
+        """Process frames; True once the current utterance has ended (call take())."""
+        if self._carry:
+            pcm, self._carry = self._carry + pcm, b""
+        if self.done:
+            self._carry = pcm
+            return True
+        fb = self._frame_bytes
+        echo = self._echo_reference() if self._echo_reference else 0.0
+        echo_db = 20 * math.log10(echo * ECHO_GATE_RATIO) - FULL_SCALE_DB if echo > 0 else None
+        if len(pcm) == fb:  # one frame per read, as on the device
+            levels = [frame_level(pcm)]
+        else:
+            levels = frame_levels(pcm, self.frame_samples).tolist()
+        for i, level in enumerate(levels):
+            if self._step(pcm[i * fb:(i + 1) * fb], level, echo_db):
+                self._carry = pcm[(i + 1) * fb:]
+                return True
+        self._carry = pcm[len(pcm) // fb * fb:]
+        return False
+
+    def take(self) -> list[bytes] | None:
+        """The finished utterance, trailing silence trimmed; None if too short to be speech."""
+        frames, voiced = self.frames, self.voiced
+        if self.silent_run > self._tail:
+            del frames[len(frames) - (self.silent_run - self._tail):]
+        self._reset()
+        if voiced < self._min_voiced:
+            log.debug("Too short, ignoring (%d voiced frames)", voiced)
+            return None
+        return frames
+
+    def _step(self, frame: bytes, level: float, echo_db: float | None) -> bool:
+        self.stats["frames"] += 1
+        floor = level if self.floor_db is None else self.floor_db
+        above = level - floor
+        if above < ENDPOINT_GATE_LOW_DB or (echo_db is not None and level < echo_db):
+            voiced = False
+        elif self.recording and above >= ENDPOINT_GATE_HIGH_DB and echo_db is None:
+            voiced = True
+        else:
+            voiced = self._is_speech(frame)
+
+        if voiced:
+            if not self.recording:
+                log.debug("Speech detected, recording...")
+                self.recording = True
+                self.frames.extend(self._preroll)
+                self._preroll.clear()
+            self.frames.append(frame)
+            self.voiced += 1
+            self.voiced_run += 1
+            if self.voiced_run >= self._resume:
+                self.silent_run = 0
+            elif self.silent_run:
+                self.silent_run += 1  # a blip in the silence (a gust, a knock) doesn't restart it
+            if self._on_voiced:
+                self._on_voiced(self.voiced_run)
+        else:
+            # The floor follows the background: down quickly, up slowly so speech can't drag it
+            if level < floor:
+                floor += (level - floor) * FLOOR_FALL
+            else:
+                floor += min(level - floor, ENDPOINT_FLOOR_RISE_DB_SEC * self.frame_sec)
+            self.floor_db = floor
+            if self.recording:
+                self.frames.append(frame)
+                self.voiced_run = 0
+                self.silent_run += 1
+            else:
+                self._preroll.append(frame)
+
+        if self.silent_run * self.frame_sec >= self.timeout_sec or len(self.frames) >= self._max_frames:
+            self.done = True
+        return self.done
+
+    def _is_speech(self, frame: bytes) -> bool:
+        self.stats["vad_calls"] += 1
+        try:
+            return self._vad(frame)
+        except Exception:
+            return False
@@ -0,0 +1,193 @@
+"""Link estimation and bandwidth-adaptive quality profiles.
+
+Site connectivity runs from good Wi-Fi to one bar of 3G, so the size of what
+a turn uploads (the utterance for STT, the frame for vision) has to follow
+the link. The estimator fits request time against request size over recent
+STT and vision calls,
+
+    seconds = service_overhead + up_bytes / upload_rate
+
+with one shared upload rate and an overhead per service (round trip plus
+server time). The profile controller then picks the best profile whose
+audio and image are expected to upload within LINK_UPLOAD_BUDGET_SEC,
+stepping down at once when the link gets worse and back up only with
+headroom to spare. A request far slower or faster than the fit predicts
+means the link itself has changed, and the older timings are dropped.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from config import (
+    DB_PATH, LINK_MAX_KBPS, LINK_UPLOAD_BUDGET_SEC, LINK_UPGRADE_MARGIN, LINK_WINDOW,
+    LINK_WINDOW_SEC, ensure_dirs,
+)
+
+log = logging.getLogger(__name__)
+
+# Encoded audio bytes per second of 16 kHz mono speech
+AUDIO_BYTES_PER_SEC = {"wav": 32000, "flac": 18000, "opus": 2000}
+TYPICAL_UTTERANCE_SEC = 3.0
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    max_side: int  # longest side of the frame sent for vision; 0 = no image
+    quality: int  # JPEG quality
+    audio: str  # codec for STT uploads
+    image_bytes: int  # expected base64 JPEG size until real frames have been measured
+
+
+PROFILES = (
+    Profile("full", 1920, 85, "wav", 530_000),
+    Profile("high", 1280, 80, "wav", 240_000),
+    Profile("medium", 960, 70, "flac", 120_000),
+    Profile("low", 640, 60, "opus", 55_000),
+    Profile("text", 0, 0, "opus", 0),
+)
+
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS link_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+class LinkEstimator:
+    """Upload rate and per-service overhead from the timings of real requests."""
+
+    def __init__(self, window: int = LINK_WINDOW, max_age: float = LINK_WINDOW_SEC):
+        self.max_age = max_age
+        self._window = window
+        self._obs: dict[str, deque[tuple[float, int, float]]] = {}  # service -> (at, bytes, seconds)
+        self._lock = threading.Lock()
+
+    def observe(self, service: str, up_bytes: int, seconds: float):
+        rate, overhead = self.fit()
+        if rate and service in overhead:
+            expected = overhead[service] + up_bytes / rate
+            if abs(seconds - expected) > 0.3 and not expected / 2 <= seconds <= expected * 2:
+                # Off by more than 2x: the link has changed (walked out of Wi-Fi
+                # range, say), so the older timings describe a different link
+                log.info("%s took %.1f s, expected %.1f s — resetting link estimate",
+                         service, seconds, expected)
+                with self._lock:
+                    self._obs.clear()
+        with self._lock:
+            self._obs.setdefault(service, deque(maxlen=self._window)).append(
+                (time.monotonic(), up_bytes, seconds)
+            )
+
+    def observed(self) -> bool:
+        return any(self._recent().values())
+
+    def _recent(self) -> dict[str, list[tuple[int, float]]]:
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            return {
+                service: [(b, s) for at, b, s in obs if at >= cutoff]
+                for service, obs in self._obs.items()
+            }
+
+    def fit(self) -> tuple[float | None, dict[str, float]]:
+        """(upload bytes/sec, {service: overhead seconds}); rate is None until there is evidence."""
+        recent = {s: obs for s, obs in self._recent().items() if obs}
+        if not recent:
+            return None, {}
+        # Shared slope from each service's deviations about its own mean
+        num = den = 0.0
+        means = {}
+        for service, obs in recent.items():
+            mx = sum(b for b, _ in obs) / len(obs)
+            my = sum(s for _, s in obs) / len(obs)
+            means[service] = (mx, my)
+            num += sum((b - mx) * (s - my) for b, s in obs)
+            den += sum((b - mx) ** 2 for b, _ in obs)
+        n = sum(len(obs) for obs in recent.values())
+        if den / n >= 10_000 ** 2:  # sizes spread by ~10 KB or more
+            slope = max(num / den, 0.0)
+        else:
+            # Not enough spread to fit: every request took at least its upload
+            # time, so the best bytes/second seen is a floor on the rate. Only
+            # sizeable uploads say anything; small ones are all overhead.
+            floors = [b / s for obs in recent.values() for b, s in obs if b >= 20_000 and s > 0]
+            if not floors:
+                return None, {}
+            slope = 1 / max(floors)
+        rate = min(1 / slope if slope else float("inf"), LINK_MAX_KBPS * 1000 / 8)
+        overhead = {s: max(0.0, my - mx / rate) for s, (mx, my) in means.items()}
+        return rate, overhead
+
+
+class ProfileController:
+    """Chooses the quality profile for the next turn from the link estimate."""
+
+    def __init__(self, estimator: LinkEstimator, budget: float = LINK_UPLOAD_BUDGET_SEC):
+        self.estimator = estimator
+        self.budget = budget
+        self.profile = PROFILES[0]
+        self._image_bytes = {p.name: float(p.image_bytes) for p in PROFILES}
+
+    def expected_upload(self, profile: Profile) -> int:
+        audio = AUDIO_BYTES_PER_SEC[profile.audio] * TYPICAL_UTTERANCE_SEC
+        return int(audio + self._image_bytes[profile.name])
+
+    def update(self) -> Profile:
+        """Re-choose the profile; call once per turn, before anything is uploaded."""
+        rate, _ = self.estimator.fit()
+        current = PROFILES.index(self.profile)
+        if rate is None:
+            if self.estimator.observed() and current > 0:
+                # Only small uploads lately, which can't show the rate: probe one step up
+                self.profile = PROFILES[current - 1]
+                log.info("Link rate unknown — trying %s profile", self.profile.name)
+            return self.profile
+        chosen = PROFILES[-1]
+        for i, profile in enumerate(PROFILES):
+            # Moving up needs headroom, so one fast request doesn't cause flapping
+            budget = self.budget * (LINK_UPGRADE_MARGIN if i < current else 1.0)
+            if self.expected_upload(profile) / rate <= budget:
+                chosen = profile
+                break
+        if chosen != self.profile:
+            log.info("Link %.0f kbps — switching to %s profile", rate * 8 / 1000, chosen.name)
+            self.profile = chosen
+        return chosen
+
+    def observe_image(self, profile: Profile, nbytes: int):
+        """Learn real JPEG sizes per profile (scene detail changes them a lot)."""
+        self._image_bytes[profile.name] += 0.3 * (nbytes - self._image_bytes[profile.name])
+
+    def save(self, db_path=DB_PATH):
+        """Store the current estimate and profile for the companion server's /metrics."""
+        rate, overhead = self.estimator.fit()
+        state = {"profile": self.profile.name}
+        if rate is not None:
+            state["upload_kbps"] = f"{rate * 8 / 1000:.1f}"
+            state.update({f"overhead_{s}": f"{o:.3f}" for s, o in overhead.items()})
+        conn = _connect(db_path)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO link_state (key, value) VALUES (?, ?)", state.items())
+        conn.close()
+
+
+def get_state(db_path=DB_PATH) -> dict[str, str]:
+    conn = _connect(db_path)
+    rows = conn.execute("SELECT key, value FROM link_state").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+estimator = LinkEstimator()
+controller = ProfileController(estimator)
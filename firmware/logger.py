@@ -2,14 +2,29 @@
 
 import sqlite3
 import json
-from datetime import datetime, timezone
-from pathlib import Path
-from config import DB_PATH
+import threading
+from datetime import datetime, timedelta, timezone
+from capture_store import bytes_stored
+from config import DB_PATH, ensure_dirs
 
+_init_lock = threading.Lock()
+_initialised: set = set()
 
-def init_db():
-    """Create the events table if it doesn't exist."""
-    conn = sqlite3.connect(DB_PATH)
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    """Open the events database, creating the schema on first use (not on import)."""
+    if db_path not in _initialised:
+        with _init_lock:
+            if db_path not in _initialised:
+                init_db(db_path)
+                _initialised.add(db_path)
+    return sqlite3.connect(db_path)
+
+
+def init_db(db_path=DB_PATH):
+    """Create the events, daily_stats and event_revisions tables if they don't exist."""
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
     conn.execute("""
         CREATE TABLE IF NOT EXISTS events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -20,13 +35,77 @@ def init_db():
             image_path TEXT,
             latitude REAL,
             longitude REAL,
-            metadata TEXT
+            metadata TEXT,
+            site_id TEXT
         )
     """)
+    # site_id came later (sites.py); older databases get the column added
+    if "site_id" not in {row[1] for row in conn.execute("PRAGMA table_info(events)")}:
+        conn.execute("ALTER TABLE events ADD COLUMN site_id TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp)"
+    )
+
+    # Per-day aggregates, kept current by a trigger so status checks never scan events.
+    # Capture bytes aren't kept here: frames are shared between events and shrink
+    # or go away later (storage.py), so get_stats reads them from the captures index.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            first_ts TEXT,
+            last_ts TEXT,
+            gps_count INTEGER NOT NULL DEFAULT 0,
+            capture_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, event_type)
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS events_daily_stats AFTER INSERT ON events
+        BEGIN
+            INSERT INTO daily_stats (day, event_type, count, first_ts, last_ts, gps_count, capture_count)
+            VALUES (
+                substr(NEW.timestamp, 1, 10), NEW.event_type, 1, NEW.timestamp, NEW.timestamp,
+                NEW.latitude IS NOT NULL, NEW.image_path IS NOT NULL
+            )
+            ON CONFLICT (day, event_type) DO UPDATE SET
+                count = count + 1,
+                first_ts = min(first_ts, excluded.first_ts),
+                last_ts = max(last_ts, excluded.last_ts),
+                gps_count = gps_count + excluded.gps_count,
+                capture_count = capture_count + excluded.capture_count;
+        END
+    """)
+    # Events rewritten after they were logged (e.g. rapid-log results arriving
+    # later). rev increases with every rewrite, so sync and the dashboard can
+    # pick up changed rows the same way they tail new ones by id.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_revisions (
+            event_id INTEGER PRIMARY KEY,
+            rev INTEGER NOT NULL,
+            revised_at TEXT NOT NULL
+        )
+    """)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_event_revisions_rev ON event_revisions (rev)"
+    )
+    if conn.execute("SELECT 1 FROM daily_stats LIMIT 1").fetchone() is None:
+        _backfill_stats(conn)
     conn.commit()
     conn.close()
 
 
+def _backfill_stats(conn: sqlite3.Connection):
+    """Build daily_stats from existing events (first run after upgrading)."""
+    conn.execute("""
+        INSERT INTO daily_stats (day, event_type, count, first_ts, last_ts, gps_count, capture_count)
+        SELECT substr(timestamp, 1, 10), event_type, COUNT(*), MIN(timestamp), MAX(timestamp),
+               COUNT(latitude), COUNT(image_path)
+        FROM events GROUP BY 1, 2
+    """)
+
+
 def log_event(
     event_type: str,
     transcript: str = None,
@@ -35,17 +114,19 @@ def log_event(
     latitude: float = None,
     longitude: float = None,
     metadata: dict = None,
+    site_id: str = None,
 ) -> int:
     """Log an event and return its ID."""
-    conn = sqlite3.connect(DB_PATH)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    conn = _connect()
     cursor = conn.execute(
         """
         INSERT INTO events (timestamp, event_type, transcript, ai_response,
-                           image_path, latitude, longitude, metadata)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                           image_path, latitude, longitude, metadata, site_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
-            datetime.now(timezone.utc).isoformat(),
+            timestamp,
             event_type,
             transcript,
             ai_response,
@@ -53,6 +134,7 @@ def log_event(
             latitude,
             longitude,
             json.dumps(metadata) if metadata else None,
+            site_id,
         ),
     )
     conn.commit()
@@ -61,9 +143,75 @@ def log_event(
     return event_id
 
 
+def update_metadata(event_id: int, updates: dict):
+    """Merge keys into an event's metadata JSON."""
+    conn = _connect()
+    # Read and write under one lock, so concurrent merges (rapid-log results) aren't lost
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("SELECT metadata FROM events WHERE id = ?", (event_id,)).fetchone()
+    if row is not None:
+        metadata = {**(json.loads(row[0]) if row[0] else {}), **updates}
+        conn.execute(
+            "UPDATE events SET metadata = ? WHERE id = ?", (json.dumps(metadata), event_id)
+        )
+    conn.commit()
+    conn.close()
+
+
+def update_event(event_id: int, ai_response: str = None, metadata: dict = None):
+    """Rewrite an event's response and merge keys into its metadata, as a new revision.
+
+    Unlike update_metadata, the change is recorded in event_revisions, so it
+    is synced again and shows on the dashboard.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("SELECT metadata FROM events WHERE id = ?", (event_id,)).fetchone()
+    if row is not None:
+        merged = {**(json.loads(row[0]) if row[0] else {}), **(metadata or {})}
+        conn.execute(
+            "UPDATE events SET ai_response = coalesce(?, ai_response), metadata = ? WHERE id = ?",
+            (ai_response, json.dumps(merged) if merged else None, event_id),
+        )
+        conn.execute(
+            """
+            INSERT INTO event_revisions (event_id, rev, revised_at)
+            VALUES (?, (SELECT coalesce(max(rev), 0) + 1 FROM event_revisions), ?)
+            ON CONFLICT (event_id) DO UPDATE SET rev = excluded.rev, revised_at = excluded.revised_at
+            """,
+            (event_id, datetime.now(timezone.utc).isoformat()),
+        )
+    conn.commit()
+    conn.close()
+
+
+def get_revised_since(last_rev: int, limit: int = 500) -> list[dict]:
+    """Events rewritten after revision last_rev, in revision order, each with its "rev"."""
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT e.*, r.rev FROM event_revisions r JOIN events e ON e.id = r.event_id "
+        "WHERE r.rev > ? ORDER BY r.rev ASC LIMIT ?",
+        (last_rev, limit),
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_latest_revision() -> dict | None:
+    """Return the rev and revised_at of the most recent rewrite."""
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    row = conn.execute(
+        "SELECT rev, revised_at FROM event_revisions ORDER BY rev DESC LIMIT 1"
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
 def get_events(event_type: str = None, limit: int = 100) -> list[dict]:
     """Retrieve recent events, optionally filtered by type."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     conn.row_factory = sqlite3.Row
     if event_type:
         rows = conn.execute(
@@ -78,18 +226,71 @@ def get_events(event_type: str = None, limit: int = 100) -> list[dict]:
     return [dict(row) for row in rows]
 
 
-def get_today_events() -> list[dict]:
-    """Get all events from today (UTC)."""
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    conn = sqlite3.connect(DB_PATH)
+def day_bounds(day: str) -> tuple[str, str]:
+    """Return the [start, end) ISO timestamp range covering a UTC day."""
+    start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def today() -> str:
+    """Today's date (UTC) as YYYY-MM-DD."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def get_today_events(limit: int = None, offset: int = 0) -> list[dict]:
+    """Get events from today (UTC), oldest first, optionally one page at a time."""
+    start, end = day_bounds(today())
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT * FROM events WHERE timestamp >= ? AND timestamp < ? "
+        "ORDER BY timestamp ASC LIMIT ? OFFSET ?",
+        (start, end, -1 if limit is None else limit, offset),
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_events_since(last_id: int, limit: int = 500) -> list[dict]:
+    """Return events with id greater than last_id, oldest first (rowid tail)."""
+    conn = _connect()
     conn.row_factory = sqlite3.Row
     rows = conn.execute(
-        "SELECT * FROM events WHERE timestamp LIKE ? ORDER BY timestamp ASC",
-        (f"{today}%",),
+        "SELECT * FROM events WHERE id > ? ORDER BY id ASC LIMIT ?", (last_id, limit)
     ).fetchall()
     conn.close()
     return [dict(row) for row in rows]
 
 
-# Initialize on import
-init_db()
+def get_stats(day: str = None) -> dict:
+    """Aggregate counts for a day (default today) from daily_stats — no event scan."""
+    day = day or today()
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT * FROM daily_stats WHERE day = ?", (day,)).fetchall()
+    conn.close()
+
+    total = sum(r["count"] for r in rows)
+    gps_count = sum(r["gps_count"] for r in rows)
+    return {
+        "day": day,
+        "total": total,
+        "by_type": {r["event_type"]: r["count"] for r in rows},
+        "first": min((r["first_ts"] for r in rows), default=None),
+        "last": max((r["last_ts"] for r in rows), default=None),
+        "gps_count": gps_count,
+        "gps_coverage": gps_count / total if total else 0.0,
+        "capture_count": sum(r["capture_count"] for r in rows),
+        "capture_bytes": bytes_stored(day),
+    }
+
+
+def get_latest_event() -> dict | None:
+    """Return the id and timestamp of the most recently logged event."""
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    row = conn.execute(
+        "SELECT id, timestamp FROM events ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
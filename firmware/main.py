@@ -6,53 +6,161 @@ sends both to AI, and speaks the response through the earpiece.
 """
 
 import logging
+import re
 import signal
+import sqlite3
 import sys
+import threading
 import time
+from functools import partial
+from pathlib import Path
 
 from audio import AudioCapture
 from camera import Camera
 from gps import GPS
-from ai import analyse_scene, transcribe_audio, generate_report
-from tts import speak, speak_confirmation
-from logger import log_event, get_today_events
-from config import LOG_LEVEL
-
-# --- Logging setup ---
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
-)
+from ai import analyse_batch, analyse_scene, complete, transcribe_audio, generate_report, warm_up
+from tts import Speaker, Utterance
+from link import controller as link_profiles
+from logger import get_stats, get_today_events, log_event, update_metadata
+from rapid import BatchLogger, Observation
+from resilience import flush_counts
+from sites import Site, SiteIndex
+from storage import StorageManager
+from summary import RollingSummariser, get_summary
+from sync import SyncClient
+from tracing import Trace
+from backends import hardware
+from config import HARDWARE, LOG_LEVEL, SESSION_RECORD, SPECULATIVE_VISION, ensure_dirs
+
 log = logging.getLogger("airpiece")
 
+COMMAND_PHRASES = (
+    "rapid log", "generate report", "summarise today", "summary", "shut down", "stop listening", "status",
+)
+RAPID_ACK = "Logged."
+STORAGE_FAILED = "Storage problem, that wasn't logged."
+
+
+def is_command(transcript: str) -> bool:
+    """Whether _handle_command would take this transcript."""
+    lower = transcript.lower()
+    return any(phrase in lower for phrase in COMMAND_PHRASES)
+
 
 class Airpiece:
     """Main application controller."""
 
-    def __init__(self):
-        self.audio = AudioCapture()
-        self.camera = Camera()
-        self.gps = GPS()
+    def __init__(
+        self, audio: AudioCapture = None, camera: Camera = None, gps: GPS = None,
+        transcribe=None, analyse=None, speaker: Speaker = None,
+        speculate: bool = SPECULATIVE_VISION, analyse_batch=analyse_batch,
+    ):
+        # Hardware and cloud calls can be injected, e.g. mocks for benchmarks or session replay
+        self.audio = audio or AudioCapture()
+        self.camera = camera or Camera()
+        self.gps = gps or GPS()
+        self.transcribe = transcribe or transcribe_audio
+        self.analyse = analyse or analyse_scene
+        self.speaker = speaker or Speaker()
+        # Full duplex: the mic keeps listening during replies and can cut them off
+        self.audio.echo_reference = self.speaker.reference_level
+        self.audio.on_speech_start = self._barge_in
+        self.speculator = None
+        if speculate:
+            from speculate import Speculator
+
+            self.speculator = Speculator(
+                self.transcribe, self.analyse, self._capture_frame, self._encode_frame,
+                self._context, skip=lambda t: self.rapid_mode or is_command(t),
+            )
+            self.audio.on_recording = self.speculator.on_recording
+        # Rapid log: acknowledge at once, analyse several observations per vision call
+        self.rapid = BatchLogger(analyse_batch, on_written=self._rapid_written)
+        self.rapid_mode = False
+        # Roof outlines, loaded in the background at start; every GPS fix is tagged with one
+        self.sites = SiteIndex()
+        self.site: Site | None = None
         self.running = False
+        self.busy = False
+        # The summary waits for rapid-log results, so it never folds in an observation without one
+        self.summariser = RollingSummariser(
+            complete, is_idle=lambda: self._idle() and not self.rapid.pending
+        )
+        self.storage = StorageManager(is_idle=self._idle)
+        self.sync = SyncClient(is_idle=self._idle)
+        self._report_thread = None
+        self._ready: dict[str, threading.Event] = {}
+        self.startup: dict[str, dict] = {}  # component -> {"took_ms", "ready_ms"}
 
     def start(self):
-        """Initialize all hardware and start the main loop."""
+        """Bring up hardware and services, listening as soon as the microphone is open.
+
+        Camera, GPS and the cloud clients start in background threads; the loop
+        only waits for the camera when it first needs a frame.
+        """
         log.info("Starting Airpiece...")
-        self.audio.start()
-        self.camera.start()
-        self.gps.start()
+        t0 = time.perf_counter()
+        ensure_dirs()
+        for name, fn in (
+            ("camera", self.camera.start), ("gps", self.gps.start), ("cloud", warm_up), ("sites", self._load_sites),
+        ):
+            self._ready[name] = threading.Event()
+            threading.Thread(
+                target=self._start_in_background, args=(name, fn, t0),
+                name=f"start-{name}", daemon=True,
+            ).start()
+        self._timed_start("audio", self.audio.start, t0)
+        self.speaker.start()
+        if self.speculator:
+            self.speculator.start()
+        self.rapid.start()
+        self.summariser.start()
+        self.storage.start()
+        self.sync.start()
         self.running = True
-        speak("Airpiece ready.")
-        log.info("All systems ready.")
+        self.speaker.prompt("Airpiece ready.")
+        self.startup["listening"] = {"ready_ms": (time.perf_counter() - t0) * 1000}
+        log.info("Listening %.0f ms after start", self.startup["listening"]["ready_ms"])
+
+    def _timed_start(self, name: str, fn, t0: float):
+        started = time.perf_counter()
+        fn()
+        done = time.perf_counter()
+        self.startup[name] = {"took_ms": (done - started) * 1000, "ready_ms": (done - t0) * 1000}
+        log.info("%s ready in %.0f ms", name, self.startup[name]["took_ms"])
+
+    def _start_in_background(self, name: str, fn, t0: float):
+        try:
+            self._timed_start(name, fn, t0)
+        except Exception as e:
+            log.error("%s failed to start: %s", name, e)
+        finally:
+            self._ready[name].set()
+
+    def _wait_ready(self, name: str, timeout: float = 30):
+        """Block until a background component has finished starting (or failed to)."""
+        ready = self._ready.get(name)
+        if ready and not ready.is_set():
+            log.info("Waiting for %s to finish starting...", name)
+            ready.wait(timeout)
 
     def stop(self):
         """Clean shutdown."""
         log.info("Shutting down...")
         self.running = False
+        self._wait_ready("camera", timeout=5)
+        self.speaker.stop()
+        if self.speculator:
+            self.speculator.stop()
+        self.rapid.stop()  # waits for the last batch, so queued observations get their results
+        self.summariser.stop()
+        self.storage.stop()
+        self.sync.stop()
         self.audio.stop()
         self.camera.stop()
         self.gps.stop()
-        speak("Airpiece shutting down.")
+        flush_counts()
+        self.speaker.prompt("Airpiece shutting down.")
         log.info("Shutdown complete.")
 
     def run(self):
@@ -61,17 +169,30 @@ class Airpiece:
 
         try:
             while self.running:
-                # Update GPS in background
-                self.gps.update()
+                trace = Trace()
 
-                # Listen for speech
+                # Update GPS in background
+                with trace.span("gps"):
+                    if self.gps.update():
+                        self._tag_site()
+
+                # Listen for speech (idle time for background work)
+                self.busy = False
+                if self.speculator:
+                    self.speculator.reset()
                 wav_bytes = self.audio.listen_for_speech()
                 if wav_bytes is None:
                     continue
+                self.busy = True
+                speech_end = self.audio.last_speech_at or time.perf_counter()
+                trace.add("endpoint", time.perf_counter() - speech_end)
+                profile = link_profiles.update()
 
                 # Transcribe speech
                 log.info("Transcribing speech...")
-                transcript = transcribe_audio(wav_bytes)
+                with trace.span("stt"):
+                    transcript = self.transcribe(wav_bytes)
+                speculation = self.speculator.resolve(transcript) if self.speculator else None
                 if not transcript:
                     log.debug("Empty transcription, ignoring")
                     continue
@@ -82,79 +203,276 @@ class Airpiece:
                 if self._handle_command(transcript):
                     continue
 
-                # Capture camera frame
-                frame_b64 = self.camera.frame_to_base64()
-                image_path = self.camera.capture_and_save(
-                    label=transcript[:30].replace(" ", "_")
-                )
-
-                # Get GPS position
-                lat, lon = self.gps.get_position()
-                context = f"GPS: {lat}, {lon}" if lat else "GPS: no fix"
+                if self.rapid_mode:
+                    self._rapid_log(transcript, trace, speech_end, profile)
+                    continue
 
-                # Send to Claude Vision
-                log.info("Sending to AI...")
-                response = analyse_scene(frame_b64, transcript, context)
+                response, image_path = self._observe(transcript, speculation, trace)
                 log.info("AI response: %s", response)
 
+                lat, lon = self.gps.get_position()
+
                 # Log the event
-                log_event(
-                    event_type="observation",
-                    transcript=transcript,
-                    ai_response=response,
-                    image_path=str(image_path),
-                    latitude=lat,
-                    longitude=lon,
+                with trace.span("log"):
+                    event_id = self._log_event(
+                        image_path,
+                        event_type="observation",
+                        transcript=transcript,
+                        ai_response=response,
+                        latitude=lat,
+                        longitude=lon,
+                        site_id=self.site.id if self.site else None,
+                    )
+
+                self.summariser.notify()
+
+                # Speak the response while going straight back to listening
+                self.speaker.say(
+                    response, trace=trace,
+                    on_done=partial(
+                        self._finish_turn, event_id=event_id, speech_end=speech_end,
+                        speculation=speculation, profile=profile.name,
+                    ),
                 )
 
-                # Speak the response
-                speak(response)
-
         except KeyboardInterrupt:
             log.info("Interrupted by user")
         finally:
             self.stop()
 
+    def _observe(self, transcript: str, speculation, trace: Trace) -> tuple[str, Path | None]:
+        """The vision reply and stored capture for a turn, from a speculative hit if there was one."""
+        label = transcript[:30].replace(" ", "_")
+        if speculation and speculation.hit:
+            # Vision started from an interim transcript; wait for what's left of it
+            trace.add("spec_lead", speculation.lead)
+            with trace.span("vision"):
+                response = speculation.result()
+            if response is not None:
+                with trace.span("capture"):
+                    return response, self._save_capture(label, speculation.frame)
+
+        # Capture camera frame
+        with trace.span("frame"):
+            frame = self._capture_frame()
+        with trace.span("encode"):
+            frame_b64 = self._encode_frame(frame)
+        with trace.span("capture"):
+            image_path = self._save_capture(label, frame)
+
+        # Send to Claude Vision
+        log.info("Sending to AI...")
+        with trace.span("vision"):
+            response = self.analyse(frame_b64, transcript, self._context())
+        return response, image_path
+
+    def _rapid_log(self, transcript: str, trace: Trace, speech_end: float, profile):
+        """Log the observation and acknowledge it now; its analysis comes with the next batch."""
+        with trace.span("frame"):
+            frame = self._capture_frame()
+        with trace.span("encode"):
+            frame_b64 = self._encode_frame(frame)
+        with trace.span("capture"):
+            image_path = self._save_capture(transcript[:30].replace(" ", "_"), frame)
+        lat, lon = self.gps.get_position()
+        with trace.span("log"):
+            event_id = self._log_event(
+                image_path,
+                event_type="observation",
+                transcript=transcript,
+                latitude=lat,
+                longitude=lon,
+                metadata={"rapid": {"status": "pending"}},
+                site_id=self.site.id if self.site else None,
+            )
+        if event_id is None:
+            self.speaker.say(STORAGE_FAILED, cache=True)
+            return
+        self.rapid.submit(Observation(event_id, transcript, frame_b64, self._context()))
+        self.speaker.say(
+            RAPID_ACK, trace=trace, cache=True,
+            on_done=partial(
+                self._finish_turn, event_id=event_id, speech_end=speech_end, profile=profile.name,
+            ),
+        )
+
+    def _save_capture(self, label: str, frame):
+        """Store the capture; None if the card can't take it, so the event is logged without it."""
+        try:
+            return self.camera.capture_and_save(label, frame=frame)
+        except OSError as e:
+            log.error("Could not save capture, logging without it: %s", e)
+            self.storage.check_now()
+            return None
+
+    def _log_event(self, image_path, **fields) -> int | None:
+        """Log an event and link its capture; None if the write failed (card full or failing)."""
+        event_id = None
+        try:
+            event_id = log_event(image_path=str(image_path) if image_path else None, **fields)
+            if image_path:
+                self.camera.store.link(image_path, event_id)
+        except (OSError, sqlite3.Error) as e:
+            log.error("Could not log event: %s", e)
+            self.storage.check_now()
+        return event_id
+
+    def _rapid_written(self, obs: Observation, result: dict):
+        """A batch result was stored: refresh the summary, and speak up about hazards."""
+        self.summariser.notify()
+        if result["hazard"]:
+            self.speaker.say(f"Hazard: {result['response']}")
+
+    def _idle(self) -> bool:
+        """Background work runs only between interactions, not during replies."""
+        return not self.busy and not self.speaker.playing
+
+    def _capture_frame(self):
+        self._wait_ready("camera")
+        return self.camera.capture_frame()
+
+    def _encode_frame(self, frame) -> str | None:
+        """JPEG for the vision call at the link profile's size and quality; None sends no image."""
+        profile = link_profiles.profile
+        if not profile.max_side:
+            return None
+        frame_b64 = self.camera.frame_to_base64(frame, max_side=profile.max_side, quality=profile.quality)
+        link_profiles.observe_image(profile, len(frame_b64))
+        return frame_b64
+
+    def _load_sites(self):
+        self.sites = SiteIndex.load()
+
+    def _tag_site(self):
+        """Which site the new fix is on: a grid lookup, microseconds even with thousands of roofs."""
+        site = self.sites.lookup(*self.gps.get_position())
+        if site is not self.site:
+            log.info("Site: %s", site.name if site else "none")
+            self.site = site
+
+    def _context(self) -> str:
+        lat, lon = self.gps.get_position()
+        gps = f"GPS: {lat}, {lon}" if lat else "GPS: no fix"
+        # With no fix, the last site seen still holds: GPS drops out on roofs more than people leave them
+        return f"{gps}\n{self.site.describe()}" if self.site else gps
+
+    def _barge_in(self):
+        """The user started talking: stop any reply that is still playing."""
+        if self.speaker.playing:
+            log.info("Barge-in — stopping playback")
+            self.speaker.cancel()
+
+    def _finish_turn(self, utt: Utterance, event_id: int, speech_end: float, speculation=None,
+                     profile: str = None):
+        """Once the reply has played (or been cut off), store the turn's timings."""
+        trace = utt.trace
+        if utt.first_audio_at:
+            trace.add("turn", utt.first_audio_at - speech_end)
+        if event_id is None:
+            return  # the event couldn't be stored
+        metadata = {"timings_ms": trace.as_metadata(), "link_profile": profile}
+        if utt.interrupted:
+            metadata["interrupted"] = True
+        if speculation:
+            metadata["speculation"] = "hit" if speculation.hit else "miss"
+        try:
+            update_metadata(event_id, metadata)
+            trace.record()
+            flush_counts()
+            link_profiles.save()
+        except Exception as e:
+            log.warning("Failed to record timings: %s", e)
+        log.debug("Timings (ms): %s", metadata)
+
     def _handle_command(self, transcript: str) -> bool:
         """Handle built-in voice commands. Returns True if handled."""
         lower = transcript.lower().strip()
 
+        if "rapid log" in lower:
+            self.rapid_mode = not {"off", "stop", "end"} & set(re.findall(r"\w+", lower))
+            if self.rapid_mode:
+                self.speaker.say("Rapid log on.", cache=True)
+            else:
+                self.rapid.flush()
+                self.speaker.say("Rapid log off.", cache=True)
+            return True
+
         if "generate report" in lower or "summarise today" in lower or "summary" in lower:
-            speak("Generating report...")
-            events = get_today_events()
-            if not events:
-                speak("No events logged today.")
+            # Read out the rolling summary now; the full report is written in the background
+            latest = get_summary()
+            count = get_stats()["total"]
+            if not count:
+                self.speaker.say("No events logged today.", cache=True)
                 return True
-            report = generate_report(events)
-            log_event(event_type="report", ai_response=report)
-            # Speak just the summary (first paragraph)
-            summary = report.split("\n\n")[0]
-            speak(summary)
-            speak("Full report has been saved.")
+            if latest:
+                self.speaker.say(latest["summary"])
+            else:
+                self.speaker.say(f"{count} events logged today. No summary yet.")
+            if self._report_thread and self._report_thread.is_alive():
+                self.speaker.say("The full report is still being written.", cache=True)
+            else:
+                self._report_thread = threading.Thread(
+                    target=self._write_report, name="report", daemon=True
+                )
+                self._report_thread.start()
+                self.speaker.say("Writing the full report in the background.", cache=True)
             return True
 
         if "shut down" in lower or "stop listening" in lower:
-            speak("Shutting down.")
+            self.speaker.cancel()
+            self.speaker.prompt("Shutting down.")
             self.running = False
             return True
 
         if "status" in lower:
             lat, lon = self.gps.get_position()
-            events = get_today_events()
+            stats = get_stats()
             gps_status = f"GPS fix at {lat:.4f}, {lon:.4f}" if lat else "No GPS fix"
-            speak(f"Airpiece active. {len(events)} events logged today. {gps_status}.")
+            if self.site:
+                gps_status += f", on {self.site.name}"
+            waiting = self.rapid.pending
+            backlog = f" {waiting} observations waiting for analysis." if waiting else ""
+            self.speaker.say(
+                f"Airpiece active. {stats['total']} events logged today. {gps_status}.{backlog}"
+            )
             return True
 
         return False
 
+    def _write_report(self):
+        """Generate and save the full report without blocking the interaction loop."""
+        events = get_today_events()
+        report = generate_report(events)
+        log_event(event_type="report", ai_response=report)
+        log.info("Full report saved (%d events)", len(events))
+
 
 def main():
-    app = Airpiece()
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL),
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    )
+    # A recorded session must replay deterministically, and speculative calls
+    # depend on timing, so speculation is off while recording
+    app = Airpiece(speculate=SPECULATIVE_VISION and not SESSION_RECORD, **hardware(HARDWARE))
+    log.info("Hardware backend: %s", HARDWARE)
+
+    recorder = None
+    if SESSION_RECORD:
+        from session import SessionRecorder
+
+        recorder = SessionRecorder.create()
+        recorder.attach(app)
+        log.info("Recording session to %s", recorder.path)
 
     # Graceful shutdown on SIGTERM
     signal.signal(signal.SIGTERM, lambda *_: app.stop())
 
-    app.run()
+    try:
+        app.run()
+    finally:
+        if recorder:
+            recorder.close()
 
 
 if __name__ == "__main__":
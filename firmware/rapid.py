@@ -0,0 +1,236 @@
+"""Rapid log: observations acknowledged at once, analysed in batches.
+
+Walking a roof and calling out "log this" every few seconds, a full vision
+round trip per observation keeps the user waiting on every one. In rapid-log
+mode the loop logs the event straight away with no response, plays a cached
+confirmation and queues the frame and note here. A worker sends the queue as
+one multi-image vision call once RAPID_BATCH_MAX observations have built up
+or the oldest has waited RAPID_BATCH_WAIT_SEC, and writes each item's result
+back to its event with logger.update_event, so the rewrite is synced and
+shown on the dashboard like a new row. With RAPID_BATCHES_IN_FLIGHT calls
+running at once, logging keeps pace with walking rather than with the API.
+
+Items a reply leaves out, or whose batch fails, go back on the queue and are
+marked failed after RAPID_MAX_ATTEMPTS calls. Batch and item counts go to the
+rapid_stats table, which the companion server exposes on /metrics.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from config import (
+    DB_PATH, RAPID_BATCH_MAX, RAPID_BATCH_WAIT_SEC, RAPID_BATCHES_IN_FLIGHT, RAPID_DEADLINE_SEC,
+    RAPID_MAX_ATTEMPTS, ensure_dirs,
+)
+from logger import update_event
+from tracing import Trace
+
+log = logging.getLogger(__name__)
+
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rapid_stats (
+            key TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    return conn
+
+
+@dataclass
+class Observation:
+    """One queued rapid-log observation; its event is already in the log."""
+
+    event_id: int
+    note: str
+    image_b64: str | None
+    context: str
+    queued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class BatchLogger:
+    """Queues observations and analyses them several to a vision call.
+
+    analyse_batch takes a list of (image_b64, note, context) and returns one
+    result dict (or None) per item; on_written is called with each
+    observation and its result once the result is stored.
+    """
+
+    def __init__(
+        self,
+        analyse_batch: Callable[..., list[dict | None]],
+        on_written: Callable[[Observation, dict], None] = lambda obs, result: None,
+        batch_max: int = RAPID_BATCH_MAX,
+        wait: float = RAPID_BATCH_WAIT_SEC,
+        in_flight: int = RAPID_BATCHES_IN_FLIGHT,
+        db_path=DB_PATH,
+    ):
+        self.analyse_batch = analyse_batch
+        self._on_written = on_written
+        self.batch_max = batch_max
+        self.wait = wait
+        self.in_flight = in_flight
+        self.db_path = db_path
+        self._queue: deque[Observation] = deque()
+        self._cond = threading.Condition()
+        self._sending = 0  # batches in flight
+        self._in_flight_items = 0
+        self._flush = False  # send what's queued without waiting for a full batch
+        self._backoff_until = 0.0  # after a failed batch, give the service a moment
+        self._stopping = False
+        self._pool = None
+        self._thread = None
+
+    @property
+    def pending(self) -> int:
+        """Observations queued or in flight."""
+        with self._cond:
+            return len(self._queue) + self._in_flight_items
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(self.in_flight, thread_name_prefix="rapid")
+        self._thread = threading.Thread(target=self._run, name="rapid", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = RAPID_DEADLINE_SEC):
+        """Send what's queued and wait (up to timeout) for the results to be written."""
+        if not self._thread:
+            return
+        with self._cond:
+            self._stopping = self._flush = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self.pending:
+            log.warning("Rapid log stopped with %d observations not analysed", self.pending)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, obs: Observation):
+        with self._cond:
+            self._queue.append(obs)
+            self._cond.notify_all()
+
+    def flush(self):
+        """Send whatever is queued now, e.g. when rapid-log mode is switched off."""
+        with self._cond:
+            self._flush = True
+            self._cond.notify_all()
+
+    # --- batching ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping and not self._queue and not self._sending:
+                        return
+                    timeout = self._until_ready()
+                    if timeout == 0:
+                        if self._sending < self.in_flight:
+                            break
+                        timeout = None  # due, but wait for a batch to come back
+                    self._cond.wait(timeout)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_max, len(self._queue)))]
+                if not self._queue:
+                    self._flush = False
+                self._sending += 1
+                self._in_flight_items += len(batch)
+            self._pool.submit(self._send, batch)
+
+    def _until_ready(self) -> float | None:
+        """Seconds until the next batch is due: 0 if now, None if the queue is empty."""
+        if not self._queue:
+            return None
+        now = time.monotonic()
+        if now < self._backoff_until and not self._stopping:
+            return self._backoff_until - now
+        if self._flush or len(self._queue) >= self.batch_max:
+            return 0
+        return max(0.0, self._queue[0].queued_at + self.wait - now)
+
+    def _send(self, batch: list[Observation]):
+        t0 = time.perf_counter()
+        usage = {}
+        try:
+            results = self.analyse_batch([(o.image_b64, o.note, o.context) for o in batch], usage=usage)
+        except Exception as e:
+            log.warning("Rapid-log batch of %d failed: %s", len(batch), e)
+            results = [None] * len(batch)
+        took = time.perf_counter() - t0
+
+        retry, counts = [], {"batches": 1, "items": len(batch), **usage}
+        for obs, result in zip(batch, results):
+            obs.attempts += 1
+            if result is None and obs.attempts < RAPID_MAX_ATTEMPTS and not self._stopping:
+                retry.append(obs)
+                counts["retried"] = counts.get("retried", 0) + 1
+                continue
+            outcome = "done" if result else "failed"
+            counts[outcome] = counts.get(outcome, 0) + 1
+            try:
+                self._write(obs, result, len(batch), took)
+            except Exception as e:
+                log.error("Failed to write rapid-log result for event %d: %s", obs.event_id, e)
+
+        trace = Trace()
+        trace.add("vision_batch", took)
+        try:
+            trace.record(self.db_path)
+            record_counts(counts, self.db_path)
+        except sqlite3.Error as e:
+            log.warning("Failed to record rapid-log stats: %s", e)
+        log.info("Rapid-log batch of %d in %.1f s: %d done, %d to retry",
+                 len(batch), took, counts.get("done", 0), len(retry))
+
+        with self._cond:
+            if retry:
+                self._queue.extendleft(reversed(retry))
+                if len(retry) == len(batch):
+                    self._backoff_until = time.monotonic() + self.wait
+            self._sending -= 1
+            self._in_flight_items -= len(batch)
+            self._cond.notify_all()
+
+    def _write(self, obs: Observation, result: dict | None, batch_size: int, took: float):
+        waited = time.monotonic() - obs.queued_at
+        if result is None:
+            update_event(obs.event_id, metadata={"rapid": {"status": "failed", "attempts": obs.attempts}})
+            return
+        update_event(obs.event_id, ai_response=result["response"], metadata={"rapid": {
+            "status": "done", "batch": batch_size, "hazard": result["hazard"],
+            "batch_ms": round(took * 1000, 1), "writeback_ms": round(waited * 1000, 1),
+        }})
+        trace = Trace()
+        trace.add("rapid_writeback", waited)
+        trace.record(self.db_path)
+        self._on_written(obs, result)
+
+
+def record_counts(counts: dict[str, int], db_path=DB_PATH):
+    conn = _connect(db_path)
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO rapid_stats (key, count) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET count = count + excluded.count
+            """,
+            counts.items(),
+        )
+    conn.close()
+
+
+def get_stats(db_path=DB_PATH) -> dict[str, int]:
+    """Cumulative batches, items (done, retried, failed) and input/output tokens."""
+    conn = _connect(db_path)
+    rows = conn.execute("SELECT key, count FROM rapid_stats").fetchall()
+    conn.close()
+    return dict(rows)
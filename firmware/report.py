@@ -0,0 +1,237 @@
+"""Survey report engine — map-reduce summarisation of a day's events.
+
+Events are split into time windows, each window is summarised concurrently,
+and the partial summaries are merged (hierarchically on busy days) into the
+final report. Chunk and merge summaries are cached in SQLite keyed by their
+content, so regenerating a report only sends new or changed windows to the LLM.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable
+
+from config import (
+    DB_PATH,
+    REPORT_CHUNK_MAX_EVENTS,
+    REPORT_CHUNK_MINUTES,
+    REPORT_DIRECT_MAX_EVENTS,
+    REPORT_MERGE_FAN_IN,
+    REPORT_WORKERS,
+    ensure_dirs,
+)
+
+log = logging.getLogger(__name__)
+
+# llm(system, prompt, max_tokens) -> text
+LLM = Callable[[str, str, int], str]
+
+REPORT_SYSTEM = "You are a technical report writer for green roof site surveys."
+
+REPORT_FORMAT = """Format: Summary, Key Findings (bulleted), Recommended Actions, Issues Noted.
+Keep it professional and suitable for a client handover."""
+
+CHUNK_PROMPT = """Summarise these logged site survey events into concise notes.
+Keep every species, defect, hazard and measurement mentioned, with its time.
+
+{events}"""
+
+MERGE_PROMPT = """Combine these partial survey notes, in time order, into one set of concise notes.
+Keep every species, defect, hazard and measurement mentioned, with its time.
+
+{parts}"""
+
+
+def format_event(e: dict) -> str:
+    return f"- [{e['timestamp']}] ({e['event_type']}) {e.get('transcript') or ''} → {e.get('ai_response') or ''}"
+
+
+def chunk_events(events: list[dict]) -> list[list[dict]]:
+    """Group events into fixed time windows, splitting any window that is too busy."""
+    window = REPORT_CHUNK_MINUTES * 60
+    chunks, current, current_key = [], [], None
+    for e in events:
+        ts = datetime.fromisoformat(e["timestamp"]).timestamp()
+        key = int(ts // window)
+        if current and (key != current_key or len(current) >= REPORT_CHUNK_MAX_EVENTS):
+            chunks.append(current)
+            current = []
+        current.append(e)
+        current_key = key
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_key(chunk: list[dict]) -> str:
+    """Content hash of a chunk — changes if any event in it is added or edited."""
+    h = hashlib.sha256()
+    for e in chunk:
+        h.update(format_event(e).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ChunkCache:
+    """Chunk summaries stored alongside the events in SQLite."""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        ensure_dirs()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_chunks (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        if not keys:
+            return {}
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            f"SELECT key, summary FROM report_chunks WHERE key IN ({','.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        conn.close()
+        return dict(rows)
+
+    def put(self, key: str, summary: str):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO report_chunks (key, summary, created) VALUES (?, ?, ?)",
+            (key, summary, datetime.now(timezone.utc).isoformat()),
+        )
+        conn.commit()
+        conn.close()
+
+
+class ReportEngine:
+    """Builds survey reports with a bounded prompt size regardless of how busy the day was."""
+
+    def __init__(self, llm: LLM, cache: ChunkCache = None, workers: int = REPORT_WORKERS):
+        self.llm = llm
+        self.cache = cache or ChunkCache()
+        self.workers = workers
+
+    def generate(self, events: list[dict]) -> str:
+        if len(events) <= REPORT_DIRECT_MAX_EVENTS:
+            notes = "\n".join(format_event(e) for e in events)
+            return self._final(notes, fallback=notes)
+
+        chunks = chunk_events(events)
+        keys = [_chunk_key(c) for c in chunks]
+        cached = self.cache.get_many(keys)
+        todo = [(k, c) for k, c in zip(keys, chunks) if k not in cached]
+        log.info("Report: %d events, %d chunks, %d cached", len(events), len(chunks), len(chunks) - len(todo))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            fresh = dict(zip((k for k, _ in todo), pool.map(self._summarise_chunk, todo)))
+            parts = [cached.get(k) or fresh[k] for k in keys]
+
+            # Merge partial summaries in groups until one prompt's worth remains
+            while len(parts) > REPORT_MERGE_FAN_IN:
+                groups = [
+                    parts[i:i + REPORT_MERGE_FAN_IN]
+                    for i in range(0, len(parts), REPORT_MERGE_FAN_IN)
+                ]
+                parts = list(pool.map(self._merge, groups))
+
+        notes = "\n\n".join(parts)
+        return self._final(notes, fallback=notes)
+
+    def _summarise_chunk(self, item: tuple[str, list[dict]]) -> str:
+        key, chunk = item
+        events = "\n".join(format_event(e) for e in chunk)
+        try:
+            summary = self.llm(REPORT_SYSTEM, CHUNK_PROMPT.format(events=events), 512)
+        except Exception as e:
+            log.error("Chunk summary failed: %s", e)
+            return events  # raw notes, not cached, so the next run retries
+        self.cache.put(key, summary)
+        return summary
+
+    def _merge(self, parts: list[str]) -> str:
+        joined = "\n\n".join(parts)
+        key = "merge:" + hashlib.sha256(joined.encode("utf-8")).hexdigest()
+        cached = self.cache.get_many([key])
+        if cached:
+            return cached[key]
+        try:
+            merged = self.llm(REPORT_SYSTEM, MERGE_PROMPT.format(parts=joined), 1024)
+        except Exception as e:
+            log.error("Summary merge failed: %s", e)
+            return joined
+        self.cache.put(key, merged)
+        return merged
+
+    def _final(self, notes: str, fallback: str) -> str:
+        prompt = f"""Generate a concise site survey report from these logged events:
+
+{notes}
+
+{REPORT_FORMAT}"""
+        try:
+            return self.llm(REPORT_SYSTEM, prompt, 2048)
+        except Exception as e:
+            log.error("Report generation failed: %s", e)
+            return f"Report generation failed ({e}). Logged notes:\n\n{fallback}"
+
+
+class StubLLM:
+    """Offline stand-in for the LLM — deterministic output, optional delay, call counting.
+
+    Every prompt is kept in prompts, so tests can tell chunk, merge and final calls apart.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.prompts: list[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, system: str, prompt: str, max_tokens: int) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+        time.sleep(self.delay)
+        lines = [l for l in prompt.splitlines() if l.startswith("- ")]
+        return f"Notes ({len(lines)} items):\n" + "\n".join(lines[:5])
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from datetime import timedelta
+
+    parser = argparse.ArgumentParser(description="Time report generation against a stub LLM")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--delay", type=float, default=0.5, help="stub LLM seconds per call")
+    args = parser.parse_args()
+
+    start = datetime(2025, 6, 1, 8, tzinfo=timezone.utc)
+    events = [
+        {
+            "timestamp": (start + timedelta(seconds=15 * i)).isoformat(),
+            "event_type": "observation",
+            "transcript": f"log this {i}",
+            "ai_response": f"Sedum patch {i}",
+        }
+        for i in range(args.events)
+    ]
+    with tempfile.NamedTemporaryFile(suffix=".db") as db:
+        engine = ReportEngine(StubLLM(args.delay), ChunkCache(db.name))
+        for run in ("cold", "warm"):
+            engine.llm.calls = 0
+            engine.llm.prompts.clear()
+            t0 = time.monotonic()
+            engine.generate(events)
+            print(f"{run}: {time.monotonic() - t0:.2f}s, {engine.llm.calls} LLM calls")
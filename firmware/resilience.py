@@ -0,0 +1,249 @@
+"""Deadlines, hedging and circuit breakers for cloud calls.
+
+Every outbound call goes through a Resilient guard for its service:
+
+  - deadline: the caller gets an answer (or the fallback) within a fixed time,
+    however long the request itself hangs on a bad cellular link
+  - hedging: if the first request is still running at the service's p95
+    latency, a duplicate is sent and whichever returns first wins; a request
+    that fails outright is retried the same way while time remains
+  - circuit breaker: after BREAKER_FAILURES failed calls in a row the service
+    is skipped entirely for BREAKER_COOLDOWN_SEC, going straight to the
+    fallback, then a single probe call decides whether to close it again
+
+Decisions are counted in memory and written to the cloud_calls table by
+flush_counts(); breaker state changes go to circuit_breakers straight away. The
+companion server exposes both on /metrics.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+from config import (
+    BREAKER_COOLDOWN_SEC, BREAKER_FAILURES, DB_PATH, HEDGE_MIN_SAMPLES, HEDGE_WINDOW, ensure_dirs,
+)
+
+log = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_counts: Counter = Counter()  # (service, decision) -> calls since the last flush
+_counts_lock = threading.Lock()
+
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cloud_calls (
+            service TEXT NOT NULL,
+            decision TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (service, decision)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS circuit_breakers (
+            service TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            changed_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+class ServiceUnavailable(Exception):
+    """The call and its fallback both failed, or there was no fallback."""
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures; half-open lets one probe through."""
+
+    def __init__(self, service: str, failures: int = BREAKER_FAILURES,
+                 cooldown: float = BREAKER_COOLDOWN_SEC, db_path=DB_PATH):
+        self.service = service
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.db_path = db_path
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set(HALF_OPEN)
+                return True  # this caller is the probe
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                log.info("%s recovered — circuit closed", self.service)
+                self._set(CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                log.warning("%s degraded — circuit open for %.0f s", self.service, self.cooldown)
+                self.opened_at = time.monotonic()
+                self._set(OPEN)
+                count(self.service, "breaker_open")
+
+    def _set(self, state: str):
+        self.state = state
+        try:
+            conn = _connect(self.db_path)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO circuit_breakers (service, state, changed_at) VALUES (?, ?, ?)",
+                    (self.service, state, time.time()),
+                )
+            conn.close()
+        except sqlite3.Error as e:
+            log.warning("Failed to store circuit state: %s", e)
+
+
+class Resilient:
+    """Deadline, hedging and a circuit breaker around one cloud service."""
+
+    def __init__(self, service: str, deadline: float, hedge: bool = True,
+                 breaker: CircuitBreaker = None, workers: int = 4):
+        self.service = service
+        self.deadline = deadline
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(service)
+        self.workers = workers
+        self._latencies: deque[float] = deque(maxlen=HEDGE_WINDOW)
+        # Lazily created; abandoned requests hold a worker until their client timeout
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    def hedge_after(self) -> float:
+        """p95 of recent successful calls; half the deadline until there are enough samples."""
+        samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.deadline / 2
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    def call(self, fn: Callable, *args, fallback: Callable = None, **kwargs):
+        """fn(*args, **kwargs) within the deadline, else fallback(*args, **kwargs).
+
+        Raises ServiceUnavailable if both fail (or there is no fallback).
+        """
+        if not self.breaker.allow():
+            count(self.service, "short_circuit")
+            return self._fallback(fallback, args, kwargs, "circuit open")
+        try:
+            result = self._hedged(fn, args, kwargs)
+        except Exception as e:
+            self.breaker.failure()
+            return self._fallback(fallback, args, kwargs, e)
+        self.breaker.success()
+        return result
+
+    def _hedged(self, fn: Callable, args: tuple, kwargs: dict):
+        started = time.monotonic()
+        deadline_at = started + self.deadline
+        hedge_at = started + self.hedge_after() if self.hedge else None
+        first = self._submit(fn, args, kwargs)
+        pending = {first}
+        attempts = 1
+        error = None
+
+        while True:
+            now = time.monotonic()
+            until = deadline_at if hedge_at is None or attempts > 1 else min(hedge_at, deadline_at)
+            done, pending = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, took = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self._latencies.append(took)
+                if future is first:
+                    count(self.service, "ok")
+                else:
+                    count(self.service, "retry_ok" if first.done() and first.exception() else "hedge_won")
+                return result
+
+            now = time.monotonic()
+            if now >= deadline_at:
+                count(self.service, "deadline")
+                raise TimeoutError(f"{self.service} took longer than {self.deadline:.1f} s")
+            if attempts == 1 and (not pending or (hedge_at is not None and now >= hedge_at)):
+                # First request failed, or is slower than usual: send a second one
+                count(self.service, "retry" if not pending else "hedge")
+                pending.add(self._submit(fn, args, kwargs))
+                attempts += 1
+            elif not pending:
+                count(self.service, "error")
+                raise error
+
+    def _submit(self, fn: Callable, args: tuple, kwargs: dict):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=f"cloud-{self.service}")
+        return self._pool.submit(_timed, fn, args, kwargs)
+
+    def _fallback(self, fallback: Callable | None, args: tuple, kwargs: dict, reason):
+        if fallback is None:
+            raise ServiceUnavailable(f"{self.service}: {reason}")
+        log.warning("%s unavailable (%s) — using fallback", self.service, reason)
+        try:
+            result = fallback(*args, **kwargs)
+        except Exception as e:
+            count(self.service, "fallback_failed")
+            raise ServiceUnavailable(f"{self.service}: {reason}; fallback failed: {e}") from e
+        count(self.service, "fallback")
+        return result
+
+
+def _timed(fn: Callable, args: tuple, kwargs: dict):
+    t0 = time.monotonic()
+    result = fn(*args, **kwargs)
+    return result, time.monotonic() - t0
+
+
+def count(service: str, decision: str):
+    with _counts_lock:
+        _counts[(service, decision)] += 1
+
+
+def flush_counts(db_path=DB_PATH):
+    """Add the decisions counted since the last flush to the cloud_calls table."""
+    with _counts_lock:
+        pending = list(_counts.items())
+        _counts.clear()
+    if not pending:
+        return
+    conn = _connect(db_path)
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO cloud_calls (service, decision, count) VALUES (?, ?, ?)
+            ON CONFLICT (service, decision) DO UPDATE SET count = count + excluded.count
+            """,
+            [(service, decision, n) for (service, decision), n in pending],
+        )
+    conn.close()
+
+
+def get_counts(db_path=DB_PATH) -> dict[tuple[str, str], int]:
+    """Cumulative {(service, decision): calls}, including anything not yet flushed."""
+    flush_counts(db_path)
+    conn = _connect(db_path)
+    rows = conn.execute("SELECT service, decision, count FROM cloud_calls ORDER BY service, decision").fetchall()
+    conn.close()
+    return {(service, decision): n for service, decision, n in rows}
@@ -0,0 +1,354 @@
+"""Session recording and deterministic replay.
+
+A session file holds the raw inputs of a run in the order they arrived:
+PCM audio chunks, camera frames (JPEG), NMEA lines, and the results (or
+failures) of the STT, vision and rapid-log batch calls. Records are appended
+as they happen,
+
+    [kind:u8][t:f64 seconds since start][length:u32][payload]
+
+and close() appends an index of (kind, t, offset) plus a fixed trailer, so a
+reader can jump straight to one stream. A file cut short by a crash has no
+trailer; the reader then rebuilds the index with one sequential scan.
+
+Replay devices read the same streams back through the AudioCapture, Camera
+and GPS interfaces, either paced by the recorded timestamps or as fast as
+the pipeline will take them.
+"""
+
+import io
+import json
+import logging
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from PIL import Image
+
+from audio import AudioCapture
+from camera import Camera
+from config import JPEG_QUALITY, SESSIONS_DIR
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"APSESS1\n"
+INDEX_MAGIC = b"APSIDX1\n"
+
+AUDIO, FRAME, NMEA, STT, VISION, VISION_BATCH = 1, 2, 3, 4, 5, 6
+
+_RECORD = struct.Struct("<BdI")
+_INDEX_ENTRY = struct.Struct("<BdQ")
+_TRAILER = struct.Struct("<QQ8s")  # index offset, entry count, INDEX_MAGIC
+
+
+class SessionEnded(Exception):
+    """A replayed stream has run out of records."""
+
+
+class ReplayedError(Exception):
+    """A call that failed when it was recorded fails again on replay."""
+
+
+def batch_key(items: list[tuple], **kwargs) -> list[str]:
+    """Rapid-log batches finish out of order; replay matches them by their notes."""
+    return [note for _, note, _ in items]
+
+
+class SessionRecorder:
+    """Append-only writer; safe to call from several threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "wb")
+        self._f.write(MAGIC)
+        self._index: list[tuple[int, float, int]] = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    @classmethod
+    def create(cls, root: Path = SESSIONS_DIR) -> "SessionRecorder":
+        name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".session"
+        return cls(root / name)
+
+    def record(self, kind: int, payload: bytes):
+        with self._lock:
+            if self._f.closed:
+                return
+            t = time.perf_counter() - self._t0
+            self._index.append((kind, t, self._f.tell()))
+            self._f.write(_RECORD.pack(kind, t, len(payload)))
+            self._f.write(payload)
+
+    def close(self):
+        with self._lock:
+            if self._f.closed:
+                return
+            index_offset = self._f.tell()
+            for entry in self._index:
+                self._f.write(_INDEX_ENTRY.pack(*entry))
+            self._f.write(_TRAILER.pack(index_offset, len(self._index), INDEX_MAGIC))
+            self._f.close()
+        log.info("Session saved to %s (%d records)", self.path, len(self._index))
+
+    # --- hooks into a running Airpiece ---
+
+    def attach(self, app):
+        """Record the app's hardware inputs and cloud results from now on."""
+        audio, camera, gps = app.audio, app.camera, app.gps
+
+        read_chunk = audio.read_chunk
+
+        def recorded_read_chunk() -> bytes:
+            chunk = read_chunk()
+            self.record(AUDIO, chunk)
+            return chunk
+
+        capture_frame = camera.capture_frame
+
+        def recorded_capture_frame() -> Image.Image:
+            frame = capture_frame()
+            buf = io.BytesIO()
+            frame.convert("RGB").save(buf, format="JPEG", quality=JPEG_QUALITY)
+            self.record(FRAME, buf.getvalue())
+            return frame
+
+        gps_start = gps.start
+
+        def recorded_gps_start():
+            gps_start()
+            if gps.serial_conn:
+                gps.serial_conn = _RecordingSerial(gps.serial_conn, self)
+
+        audio.read_chunk = recorded_read_chunk
+        camera.capture_frame = recorded_capture_frame
+        gps.start = recorded_gps_start
+        if gps.serial_conn:
+            gps.serial_conn = _RecordingSerial(gps.serial_conn, self)
+        app.transcribe = self._recorded_call(STT, app.transcribe)
+        app.analyse = self._recorded_call(VISION, app.analyse)
+        app.rapid.analyse_batch = self._recorded_call(VISION_BATCH, app.rapid.analyse_batch, key=batch_key)
+
+    def _recorded_call(self, kind: int, fn, key=None):
+        """Record each call's result (or failure), its reported usage and how long it took."""
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            record = {}
+            if key:
+                record["key"] = key(*args, **kwargs)
+            try:
+                record["result"] = fn(*args, **kwargs)
+                return record["result"]
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                record["sec"] = time.perf_counter() - t0
+                if kwargs.get("usage"):
+                    record["usage"] = kwargs["usage"]
+                self.record(kind, json.dumps(record).encode())
+        return wrapper
+
+
+class _RecordingSerial:
+    def __init__(self, conn, recorder: SessionRecorder):
+        self._conn = conn
+        self._recorder = recorder
+
+    def readline(self) -> bytes:
+        line = self._conn.readline()
+        if line:
+            self._recorder.record(NMEA, line)
+        return line
+
+    def close(self):
+        self._conn.close()
+
+
+class SessionReader:
+    """Random access to a session file's records by stream."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        if self._f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{self.path} is not a session file")
+        self.index = self._read_index() or self._scan()
+
+    def _read_index(self) -> list[tuple[int, float, int]]:
+        size = self.path.stat().st_size
+        if size < len(MAGIC) + _TRAILER.size:
+            return []
+        self._f.seek(size - _TRAILER.size)
+        offset, count, magic = _TRAILER.unpack(self._f.read(_TRAILER.size))
+        if magic != INDEX_MAGIC:
+            return []
+        self._f.seek(offset)
+        data = self._f.read(count * _INDEX_ENTRY.size)
+        return list(_INDEX_ENTRY.iter_unpack(data))
+
+    def _scan(self) -> list[tuple[int, float, int]]:
+        """Rebuild the index of a session that was never closed."""
+        log.warning("%s has no index (unclean shutdown?) — scanning", self.path)
+        index = []
+        self._f.seek(len(MAGIC))
+        while True:
+            offset = self._f.tell()
+            header = self._f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            kind, t, length = _RECORD.unpack(header)
+            if len(self._f.read(length)) < length:
+                break  # torn final record
+            index.append((kind, t, offset))
+        return index
+
+    def read(self, offset: int) -> tuple[int, float, bytes]:
+        self._f.seek(offset)
+        kind, t, length = _RECORD.unpack(self._f.read(_RECORD.size))
+        return kind, t, self._f.read(length)
+
+    def stream(self, kind: int):
+        """(t, payload) for every record of one kind, in order."""
+        for k, _, offset in self.index:
+            if k == kind:
+                _, t, payload = self.read(offset)
+                yield t, payload
+
+    def counts(self) -> dict[int, int]:
+        out: dict[int, int] = {}
+        for kind, _, _ in self.index:
+            out[kind] = out.get(kind, 0) + 1
+        return out
+
+    @property
+    def duration(self) -> float:
+        return self.index[-1][1] if self.index else 0.0
+
+    def close(self):
+        self._f.close()
+
+
+# --- Replay ---
+
+class ReplayClock:
+    """Shared time base: in realtime mode a record is released at its recorded offset."""
+
+    def __init__(self, realtime: bool):
+        self.realtime = realtime
+        self.t0 = time.perf_counter()
+
+    def wait_until(self, t: float):
+        if self.realtime:
+            delay = self.t0 + t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class ReplayAudio(AudioCapture):
+    """Recorded PCM chunks through the AudioCapture interface."""
+
+    def __init__(self, reader: SessionReader, clock: ReplayClock):
+        import webrtcvad
+        from config import VAD_AGGRESSIVENESS
+
+        self.vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+        self.stream = None
+        self.last_speech_at = None
+        self._chunks = reader.stream(AUDIO)
+        self._clock = clock
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def read_chunk(self) -> bytes:
+        try:
+            t, chunk = next(self._chunks)
+        except StopIteration:
+            raise SessionEnded from None
+        self._clock.wait_until(t)
+        return chunk
+
+
+class ReplayCamera(Camera):
+    """Recorded frames, returned in capture order."""
+
+    def __init__(self, reader: SessionReader, store=None):
+        super().__init__(store=store)
+        self._frames = reader.stream(FRAME)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def capture_frame(self) -> Image.Image:
+        try:
+            _, data = next(self._frames)
+        except StopIteration:
+            raise SessionEnded from None
+        return Image.open(io.BytesIO(data))
+
+
+class ReplaySerial:
+    """Recorded NMEA lines in place of the GPS UART."""
+
+    def __init__(self, reader: SessionReader, clock: ReplayClock):
+        self._lines = reader.stream(NMEA)
+        self._clock = clock
+
+    def readline(self) -> bytes:
+        try:
+            t, line = next(self._lines)
+        except StopIteration:
+            return b""  # like a serial timeout with nothing received
+        self._clock.wait_until(t)
+        return line
+
+    def close(self):
+        pass
+
+
+class ReplayService:
+    """Recorded STT or vision results, in call order. In realtime mode each
+    call also takes as long as it did when recorded.
+
+    With a key (the one the calls were recorded with), each call gets the
+    first unused result recorded for the same key instead, for calls that
+    run concurrently and so finish in a different order each run.
+    """
+
+    def __init__(self, reader: SessionReader, kind: int, clock: ReplayClock, key=None):
+        self._results = reader.stream(kind)
+        self._clock = clock
+        self._key = key
+        self._skipped: list[dict] = []  # read past while looking for another key
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            record = self._next(self._key(*args, **kwargs) if self._key else None)
+        if self._clock.realtime:
+            time.sleep(record["sec"])
+        if kwargs.get("usage") is not None:
+            kwargs["usage"].update(record.get("usage", {}))
+        if "error" in record:
+            raise ReplayedError(record["error"])
+        return record["result"]
+
+    def _next(self, key) -> dict:
+        for i, record in enumerate(self._skipped):
+            if record.get("key") == key:
+                return self._skipped.pop(i)
+        for _, payload in self._results:
+            record = json.loads(payload)
+            if key is None or record.get("key") == key:
+                return record
+            self._skipped.append(record)
+        raise SessionEnded
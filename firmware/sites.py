@@ -0,0 +1,214 @@
+"""Site registry — which roof or client site a GPS fix is on.
+
+Sites are roof outlines in a GeoJSON FeatureCollection at SITES_PATH, one
+feature per roof:
+
+    {"type": "Feature", "id": "acme-hq-roof-2",
+     "properties": {"name": "Acme HQ, roof 2", "client": "Acme", "notes": "Sedum blanket, 2019"},
+     "geometry": {"type": "Polygon", "coordinates": [[[-0.1271, 51.5072], ...]]}}
+
+The id is the feature's "id" (or properties["id"]) and is what events are
+tagged with. The name and remaining properties are the site's details,
+given to the vision call as context. Polygon and MultiPolygon geometries
+are supported, holes included.
+
+The index is a uniform grid of SITE_GRID_DEG cells. Each cell lists the
+sites whose bounding box touches it, so a lookup hashes the fix to one
+cell and tests only the few outlines there. A fix just outside every
+outline but within SITE_MARGIN_M of one gets the nearest, since at a roof
+edge GPS error is larger than the parapet. Nested outlines (a roof inside a
+site boundary) resolve to the smallest.
+"""
+
+import json
+import logging
+import math
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+
+from config import SITE_GRID_DEG, SITE_MARGIN_M, SITES_PATH
+
+log = logging.getLogger(__name__)
+
+METRES_PER_DEGREE = 111_320
+MAX_CELLS = 4096  # sites spanning more cells than this are checked on every lookup instead
+
+Ring = list[tuple[float, float]]  # (lon, lat) vertices, GeoJSON order
+
+
+@dataclass
+class Site:
+    id: str
+    name: str
+    details: dict = field(default_factory=dict)
+    polygons: list[list[Ring]] = field(default_factory=list)  # each: outer ring, then holes
+    bbox: tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0)  # min lon, min lat, max lon, max lat
+    area: float = 0.0  # square degrees; only compared between sites
+
+    def contains(self, lon: float, lat: float) -> bool:
+        return any(
+            _in_ring(lon, lat, rings[0]) and not any(_in_ring(lon, lat, hole) for hole in rings[1:])
+            for rings in self.polygons
+        )
+
+    def distance_m(self, lon: float, lat: float) -> float:
+        """Distance from the point to the nearest edge of the outline."""
+        kx = math.cos(math.radians(lat)) * METRES_PER_DEGREE
+        best = math.inf
+        for ring in chain.from_iterable(self.polygons):
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                best = min(best, _segment_distance(
+                    (x1 - lon) * kx, (y1 - lat) * METRES_PER_DEGREE,
+                    (x2 - lon) * kx, (y2 - lat) * METRES_PER_DEGREE,
+                ))
+        return best
+
+    def describe(self) -> str:
+        """The site as a line of context for the vision call."""
+        details = "; ".join(f"{k}: {v}" for k, v in self.details.items() if v not in (None, ""))
+        return f"Site: {self.name} ({self.id})" + (f". {details}" if details else "")
+
+
+def _in_ring(x: float, y: float, ring: Ring) -> bool:
+    """Ray casting: does a horizontal ray from the point cross the ring an odd number of times."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _segment_distance(x1: float, y1: float, x2: float, y2: float) -> float:
+    """Distance from the origin to the segment (x1, y1)-(x2, y2)."""
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, -(x1 * dx + y1 * dy) / length2))
+    return math.hypot(x1 + t * dx, y1 + t * dy)
+
+
+def _ring_area(ring: Ring) -> float:
+    return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))) / 2
+
+
+def site_from_feature(feature: dict) -> Site:
+    """Build a Site from a GeoJSON feature; raises ValueError if it isn't a usable polygon."""
+    properties = dict(feature.get("properties") or {})
+    site_id = feature.get("id", properties.pop("id", None))
+    properties.pop("id", None)
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") == "Polygon":
+        coordinates = [geometry["coordinates"]]
+    elif geometry.get("type") == "MultiPolygon":
+        coordinates = geometry["coordinates"]
+    else:
+        raise ValueError(f"site {site_id!r}: unsupported geometry {geometry.get('type')!r}")
+    if site_id is None:
+        raise ValueError("site without an id")
+
+    polygons = []
+    for rings in coordinates:
+        rings = [[(float(p[0]), float(p[1])) for p in ring] for ring in rings]
+        rings = [ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring for ring in rings]
+        if rings and len(rings[0]) >= 3:
+            polygons.append(rings)
+    if not polygons:
+        raise ValueError(f"site {site_id!r}: no polygon with at least three points")
+    xs = [x for rings in polygons for x, _ in rings[0]]
+    ys = [y for rings in polygons for _, y in rings[0]]
+    return Site(
+        id=str(site_id),
+        name=str(properties.pop("name", site_id)),
+        details=properties,
+        polygons=polygons,
+        bbox=(min(xs), min(ys), max(xs), max(ys)),
+        area=sum(_ring_area(rings[0]) - sum(_ring_area(h) for h in rings[1:]) for rings in polygons),
+    )
+
+
+class SiteIndex:
+    """Grid index over site outlines; lookup() tags a fix in microseconds."""
+
+    def __init__(self, sites: list[Site] = (), cell_deg: float = SITE_GRID_DEG,
+                 margin_m: float = SITE_MARGIN_M):
+        self.cell_deg = cell_deg
+        self.margin_m = margin_m
+        self.sites = {site.id: site for site in sites}
+        self._grid: dict[tuple[int, int], list[Site]] = {}
+        self._large: list[Site] = []
+        self._last: tuple[float, float, Site | None] | None = None
+        for site in self.sites.values():
+            min_x, min_y, max_x, max_y = self._cells(*site.bbox)
+            if (max_x - min_x + 1) * (max_y - min_y + 1) > MAX_CELLS:
+                self._large.append(site)
+                continue
+            for cx in range(min_x, max_x + 1):
+                for cy in range(min_y, max_y + 1):
+                    self._grid.setdefault((cx, cy), []).append(site)
+
+    @classmethod
+    def load(cls, path: Path = SITES_PATH, **kwargs) -> "SiteIndex":
+        """Index the registry at path; empty if there is none. Bad features are skipped."""
+        if not Path(path).exists():
+            log.info("No site registry at %s", path)
+            return cls(**kwargs)
+        sites = []
+        for feature in json.loads(Path(path).read_text()).get("features", []):
+            try:
+                sites.append(site_from_feature(feature))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                log.warning("Skipping site: %s", e)
+        index = cls(sites, **kwargs)
+        log.info("Loaded %d sites from %s", len(index), path)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.sites)
+
+    def get(self, site_id: str) -> Site | None:
+        return self.sites.get(site_id)
+
+    def _cells(self, min_x: float, min_y: float, max_x: float, max_y: float) -> tuple[int, int, int, int]:
+        c = self.cell_deg
+        return math.floor(min_x / c), math.floor(min_y / c), math.floor(max_x / c), math.floor(max_y / c)
+
+    def lookup(self, lat: float | None, lon: float | None) -> Site | None:
+        """The site the fix is on (or within the margin of), or None."""
+        if lat is None or lon is None or not self.sites:
+            return None
+        last = self._last
+        if last and last[0] == lat and last[1] == lon:
+            return last[2]
+        cell = (math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg))
+        best = None
+        for site in chain(self._grid.get(cell, ()), self._large):
+            min_x, min_y, max_x, max_y = site.bbox
+            if (min_x <= lon <= max_x and min_y <= lat <= max_y and site.contains(lon, lat)
+                    and (best is None or site.area < best.area)):
+                best = site
+        if best is None and self.margin_m:
+            best = self._nearest(lat, lon)
+        self._last = (lat, lon, best)
+        return best
+
+    def _nearest(self, lat: float, lon: float) -> Site | None:
+        dy = self.margin_m / METRES_PER_DEGREE
+        dx = dy / max(math.cos(math.radians(lat)), 0.01)
+        min_x, min_y, max_x, max_y = self._cells(lon - dx, lat - dy, lon + dx, lat + dy)
+        candidates = {
+            site.id: site
+            for cx in range(min_x, max_x + 1)
+            for cy in range(min_y, max_y + 1)
+            for site in self._grid.get((cx, cy), ())
+        }
+        candidates.update((site.id, site) for site in self._large)
+        best, best_m = None, self.margin_m
+        for site in candidates.values():
+            s_min_x, s_min_y, s_max_x, s_max_y = site.bbox
+            if s_min_x - dx <= lon <= s_max_x + dx and s_min_y - dy <= lat <= s_max_y + dy:
+                distance = site.distance_m(lon, lat)
+                if distance <= best_m:
+                    best, best_m = site, distance
+        return best
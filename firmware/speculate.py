@@ -0,0 +1,250 @@
+"""Speculative vision from interim transcripts.
+
+Deepgram is called once the utterance has ended, and the vision call only
+after that, so the silence timeout and STT time sit in front of the slowest
+stage. In speculative mode the audio recorded so far is transcribed every
+SPECULATE_PARTIAL_SEC while the user is still talking (and through the
+silence that ends the utterance). Once SPECULATE_AGREE interim transcripts
+in a row agree, a frame is taken and the vision call starts.
+
+When the final transcript arrives it either matches the speculated one, and
+the loop uses that result, or it doesn't, and the speculation is abandoned
+and the request reissued as usual. An HTTP call already in flight can't be
+recalled, so its tokens are spent anyway; they are counted per outcome in
+the speculation_stats table, which the companion server exposes on /metrics.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from PIL import Image
+
+from audio import frames_to_wav
+from config import (
+    CHUNK_SIZE, DB_PATH, SAMPLE_RATE, SPECULATE_AGREE, SPECULATE_PARTIAL_SEC, ensure_dirs,
+)
+
+log = logging.getLogger(__name__)
+
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS speculation_stats (
+            outcome TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    return conn
+
+
+def normalise(transcript: str) -> str:
+    """Lowercase words only, so punctuation and casing changes still count as agreement."""
+    return " ".join(re.findall(r"[\w']+", transcript.lower()))
+
+
+def estimate_tokens(frame: Image.Image | None, prompt: str, response: str) -> tuple[int, int]:
+    """Rough (input, output) tokens for a vision call whose usage wasn't reported.
+
+    Images cost about width x height / 750 after the API scales the long side to 1568 px.
+    """
+    image = 0
+    if frame is not None:
+        scale = min(1.0, 1568 / max(frame.size))
+        image = int(frame.width * scale * frame.height * scale / 750)
+    return image + len(prompt) // 4, len(response) // 4
+
+
+class Speculation:
+    """One early vision call, started from an interim transcript."""
+
+    def __init__(self, transcript: str):
+        self.transcript = transcript
+        self.text = normalise(transcript)
+        self.started_at = time.perf_counter()
+        self.prompt = ""
+        self.frame: Image.Image | None = None
+        self.usage: dict = {}
+        self.future: Future | None = None
+        self.hit = False
+        self.lead = 0.0  # seconds between starting the call and the final transcript
+
+    def result(self) -> str | None:
+        """Wait for the vision reply; None if the call failed."""
+        try:
+            return self.future.result()
+        except Exception as e:
+            log.warning("Speculative vision call failed: %s", e)
+            return None
+
+
+class Speculator:
+    """Runs interim transcriptions and the speculative vision call for each utterance.
+
+    Wire on_recording() to AudioCapture.on_recording, call reset() before
+    listening and resolve() with the final transcript.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[bytes], str],
+        analyse: Callable[..., str],
+        capture: Callable[[], Image.Image],
+        encode: Callable[[Image.Image], str],
+        context: Callable[[], str],
+        skip: Callable[[str], bool] = lambda transcript: False,
+    ):
+        self._transcribe = transcribe
+        self._analyse = analyse
+        self._capture = capture
+        self._encode = encode
+        self._context = context
+        self._skip = skip  # e.g. voice commands, which never need a vision call
+        self._every = max(1, int(SPECULATE_PARTIAL_SEC * SAMPLE_RATE / CHUNK_SIZE))
+        self._pool = None
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped per utterance so late interim results are ignored
+        self._partials: list[str] = []
+        self._next_partial = self._every
+        self._partial_running = False
+        self._current: Speculation | None = None
+
+    def start(self):
+        # Interim STT, the current speculation, and one abandoned call still draining
+        self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="speculate")
+
+    def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def reset(self):
+        """Start of a new utterance: forget interim transcripts, abandon any leftover call."""
+        with self._lock:
+            self._generation += 1
+            self._partials = []
+            self._next_partial = self._every
+            spec, self._current = self._current, None
+        if spec:
+            self._abandon(spec)
+
+    def on_recording(self, frames: list[bytes]):
+        """Audio thread: transcribe the utterance so far every SPECULATE_PARTIAL_SEC."""
+        if len(frames) < self._next_partial or self._partial_running or not self._pool:
+            return
+        self._next_partial = len(frames) + self._every
+        self._partial_running = True
+        self._pool.submit(self._interim, self._generation, frames_to_wav(frames))
+
+    def resolve(self, transcript: str) -> Speculation | None:
+        """Match the final transcript against the speculation, if one was started.
+
+        Returns the speculation with .hit set when its result can be used. A
+        miss is abandoned; the caller runs the vision call itself.
+        """
+        with self._lock:
+            self._generation += 1
+            spec, self._current = self._current, None
+        if spec is None:
+            return None
+        spec.lead = time.perf_counter() - spec.started_at
+        if transcript and normalise(transcript) == spec.text:
+            spec.hit = True
+            spec.future.add_done_callback(lambda f: self._record("hit", spec, f))
+            log.info("Speculation hit — vision started %.0f ms early", spec.lead * 1000)
+        else:
+            log.info("Speculation miss: guessed '%s', heard '%s'", spec.transcript, transcript)
+            self._abandon(spec)
+        return spec
+
+    # --- workers ---
+
+    def _interim(self, generation: int, wav: bytes):
+        try:
+            transcript = self._transcribe(wav)
+        except Exception as e:
+            log.debug("Interim transcription failed: %s", e)
+            transcript = ""
+        finally:
+            self._partial_running = False
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._partials.append(normalise(transcript or ""))
+            recent = self._partials[-SPECULATE_AGREE:]
+            text = recent[-1]
+            if len(recent) < SPECULATE_AGREE or not text or any(p != text for p in recent):
+                return
+            if self._current and self._current.text == text:
+                return
+            if self._skip(transcript):
+                return
+            previous, spec = self._current, Speculation(transcript)
+            self._current = spec
+            spec.future = self._pool.submit(self._vision, spec)
+        log.debug("Speculating on '%s'", transcript)
+        if previous:
+            self._abandon(previous)
+
+    def _vision(self, spec: Speculation) -> str:
+        spec.frame = self._capture()
+        frame_b64 = self._encode(spec.frame)
+        context = self._context()
+        spec.prompt = f"{context}\n\nUser says: {spec.transcript}" if context else spec.transcript
+        return self._analyse(frame_b64, spec.transcript, context, usage=spec.usage)
+
+    def _abandon(self, spec: Speculation):
+        if spec.future.cancel():
+            self._record("miss", spec, None)  # never started, nothing spent
+        else:
+            spec.future.add_done_callback(lambda f: self._record("miss", spec, f))
+
+    def _record(self, outcome: str, spec: Speculation, future: Future | None):
+        input_tokens = output_tokens = 0
+        if future is not None and not future.cancelled() and future.exception() is None:
+            if spec.usage:
+                input_tokens, output_tokens = spec.usage["input_tokens"], spec.usage["output_tokens"]
+            else:
+                input_tokens, output_tokens = estimate_tokens(spec.frame, spec.prompt, future.result())
+        try:
+            record_outcome(outcome, input_tokens, output_tokens)
+        except sqlite3.Error as e:
+            log.warning("Failed to record speculation outcome: %s", e)
+
+
+def record_outcome(outcome: str, input_tokens: int, output_tokens: int, db_path=DB_PATH):
+    conn = _connect(db_path)
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO speculation_stats (outcome, count, input_tokens, output_tokens)
+            VALUES (?, 1, ?, ?)
+            ON CONFLICT (outcome) DO UPDATE SET
+                count = count + 1,
+                input_tokens = input_tokens + excluded.input_tokens,
+                output_tokens = output_tokens + excluded.output_tokens
+            """,
+            (outcome, input_tokens, output_tokens),
+        )
+    conn.close()
+
+
+def get_stats(db_path=DB_PATH) -> dict[str, dict]:
+    """Cumulative {outcome: {"count", "input_tokens", "output_tokens"}} for hit and miss."""
+    conn = _connect(db_path)
+    rows = conn.execute(
+        "SELECT outcome, count, input_tokens, output_tokens FROM speculation_stats"
+    ).fetchall()
+    conn.close()
+    return {
+        outcome: {"count": count, "input_tokens": inp, "output_tokens": out}
+        for outcome, count, inp, out in rows
+    }
@@ -0,0 +1,225 @@
+"""SD-card storage manager — keeps captures within a byte budget.
+
+Runs as a low-priority background thread. Each pass:
+  1. recompresses synced captures older than RECOMPRESS_AFTER_DAYS (any synced
+     capture when over budget) to a smaller WebP,
+  2. if still over budget (or the card is nearly full), deletes captures that
+     have already been synced off the device, oldest first,
+  3. moves closed days out of the events table into the Parquet archive.
+Unsynced captures are never recompressed or deleted.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+from capture_store import _connect, write_atomic
+from config import (
+    DATA_DIR,
+    DB_PATH,
+    RECOMPRESS_AFTER_DAYS,
+    RECOMPRESS_FORMAT,
+    RECOMPRESS_MAX_SIDE,
+    RECOMPRESS_QUALITY,
+    STORAGE_BUDGET_BYTES,
+    STORAGE_CHECK_SEC,
+    STORAGE_MIN_FREE_BYTES,
+)
+
+log = logging.getLogger(__name__)
+
+
+def get_usage(db_path=DB_PATH) -> dict:
+    """Storage usage summary for the API and the manager's own decisions."""
+    conn = _connect(db_path)
+    total, count, compact, synced = conn.execute(
+        "SELECT COALESCE(SUM(bytes), 0), COUNT(*), "
+        "SUM(path NOT LIKE '%.jpg'), SUM(synced_at IS NOT NULL) "
+        "FROM captures WHERE deleted_at IS NULL"
+    ).fetchone()
+    conn.close()
+    disk = shutil.disk_usage(DATA_DIR)
+    db_bytes = sum(
+        p.stat().st_size for p in Path(db_path).parent.glob(Path(db_path).name + "*")
+    )
+    return {
+        "budget_bytes": STORAGE_BUDGET_BYTES,
+        "captures_bytes": total,
+        "captures_count": count,
+        "recompressed_count": compact or 0,
+        "synced_count": synced or 0,
+        "db_bytes": db_bytes,
+        "used_bytes": total + db_bytes,
+        "disk_free_bytes": disk.free,
+        "disk_total_bytes": disk.total,
+    }
+
+
+def _lower_thread_priority():
+    """Lowest CPU and idle-class I/O priority for the calling thread (Linux)."""
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError) as e:
+        log.debug("Could not lower CPU priority: %s", e)
+    try:
+        subprocess.run(["ionice", "-c", "3", "-p", str(tid)], check=True, capture_output=True)
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        log.debug("Could not set idle I/O class: %s", e)
+
+
+def recompress(src: Path) -> tuple[Path, int]:
+    """Downscale and re-encode one capture next to the original. Returns (path, bytes)."""
+    import io
+    from PIL import Image
+
+    with Image.open(src) as img:
+        img.draft("RGB", (RECOMPRESS_MAX_SIDE, RECOMPRESS_MAX_SIDE))
+        img = img.convert("RGB")
+        img.thumbnail((RECOMPRESS_MAX_SIDE, RECOMPRESS_MAX_SIDE))
+        buf = io.BytesIO()
+        img.save(buf, RECOMPRESS_FORMAT.upper(), quality=RECOMPRESS_QUALITY)
+    dst = src.with_suffix(f".{RECOMPRESS_FORMAT}")
+    write_atomic(dst, buf.getvalue())
+    return dst, len(buf.getvalue())
+
+
+class StorageManager:
+    """Background thread enforcing the capture storage budget."""
+
+    def __init__(
+        self,
+        is_idle: Callable[[], bool] = lambda: True,
+        budget: int = STORAGE_BUDGET_BYTES,
+        db_path=DB_PATH,
+    ):
+        self.is_idle = is_idle
+        self.budget = budget
+        self.db_path = db_path
+        self._stop = threading.Event()
+        self._kick = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="storage", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._kick.set()
+
+    def check_now(self):
+        """Ask for an immediate pass, e.g. after a failed write."""
+        self._kick.set()
+
+    def _run(self):
+        _lower_thread_priority()
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error("Storage pass failed: %s", e)
+            self._kick.wait(STORAGE_CHECK_SEC)
+            self._kick.clear()
+
+    def _yield_to_interaction(self) -> bool:
+        """Pause while the user is mid-interaction. Returns False if stopping."""
+        while not self.is_idle():
+            if self._stop.wait(0.5):
+                return False
+        return not self._stop.is_set()
+
+    def _bytes_to_free(self) -> int:
+        """How far over budget (or under the free-space floor) we are, in bytes."""
+        usage = get_usage(self.db_path)
+        return max(
+            usage["used_bytes"] - self.budget,
+            STORAGE_MIN_FREE_BYTES - usage["disk_free_bytes"],
+        )
+
+    def run_once(self):
+        """One full pass: recompress old captures, then prune synced ones if needed."""
+        urgent = self._bytes_to_free() > 0
+        cutoff = datetime.now(timezone.utc) - timedelta(days=RECOMPRESS_AFTER_DAYS)
+        conn = _connect(self.db_path)
+        # Only captures the server already has: an unsynced capture's events may be
+        # on the server pointing at its .jpg, which is what still has to be uploaded
+        # (however long the device has been offline). Under pressure, don't wait for
+        # synced captures to age.
+        rows = conn.execute(
+            "SELECT sha256, path, bytes FROM captures "
+            "WHERE deleted_at IS NULL AND synced_at IS NOT NULL AND path LIKE '%.jpg' "
+            "AND (created < ? OR ?) "
+            "ORDER BY created ASC",
+            (cutoff.isoformat(), urgent),
+        ).fetchall()
+        conn.close()
+
+        saved = 0
+        for digest, path, size in rows:
+            if not self._yield_to_interaction():
+                return
+            saved += self._recompress_one(digest, Path(path), size)
+        if rows:
+            log.info("Recompressed %d captures, saved %.1f MB", len(rows), saved / 1e6)
+
+        if self._bytes_to_free() > 0:
+            self._prune_synced()
+
+        # Keep the hot events table to today (and anything still unsynced).
+        # Imported here: pyarrow is slow to load and not needed until the first pass.
+        from archive import archive_closed_days
+
+        archived = archive_closed_days(self.db_path)
+        if archived:
+            log.info("Archived %d events from closed days", archived)
+
+    def _recompress_one(self, digest: str, src: Path, size: int) -> int:
+        try:
+            dst, new_size = recompress(src)
+        except (OSError, ValueError) as e:
+            log.warning("Could not recompress %s: %s", src, e)
+            return 0
+        conn = _connect(self.db_path)
+        conn.execute(
+            "UPDATE captures SET path = ?, bytes = ? WHERE sha256 = ?",
+            (str(dst), new_size, digest),
+        )
+        conn.execute("UPDATE events SET image_path = ? WHERE image_path = ?", (str(dst), str(src)))
+        conn.commit()
+        conn.close()
+        src.unlink(missing_ok=True)
+        return size - new_size
+
+    def _prune_synced(self):
+        needed = self._bytes_to_free()
+        conn = _connect(self.db_path)
+        rows = conn.execute(
+            "SELECT sha256, path, bytes FROM captures "
+            "WHERE deleted_at IS NULL AND synced_at IS NOT NULL ORDER BY created ASC"
+        ).fetchall()
+        conn.close()
+
+        deleted = 0
+        for digest, path, size in rows:
+            if needed <= 0 or not self._yield_to_interaction():
+                break
+            Path(path).unlink(missing_ok=True)
+            conn = _connect(self.db_path)
+            conn.execute(
+                "UPDATE captures SET deleted_at = ? WHERE sha256 = ?",
+                (datetime.now(timezone.utc).isoformat(), digest),
+            )
+            conn.commit()
+            conn.close()
+            needed -= size
+            deleted += 1
+        if deleted:
+            log.info("Pruned %d synced captures", deleted)
+        if needed > 0:
+            log.warning("Storage still over budget; remaining captures are not yet synced")
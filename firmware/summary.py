@@ -0,0 +1,141 @@
+"""Rolling survey summary — kept fresh in the background so it can be read out instantly."""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from config import DB_PATH, SUMMARY_DEBOUNCE_SEC, ensure_dirs
+from logger import get_events_since, get_today_events, today
+from report import LLM, format_event
+
+log = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM = """You keep a running spoken summary of a green roof site survey.
+It is read aloud through an earpiece, so write 2-4 plain sentences with no lists or markup."""
+
+UPDATE_PROMPT = """Current summary:
+{summary}
+
+New observations since then:
+{events}
+
+Rewrite the summary to include the new observations."""
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rolling_summary (
+            day TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_event_id INTEGER NOT NULL,
+            updated TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+def get_summary(day: str = None, db_path=DB_PATH) -> dict | None:
+    """Return the stored summary for a day (default today), or None."""
+    conn = _connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute(
+        "SELECT * FROM rolling_summary WHERE day = ?", (day or today(),)
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+class RollingSummariser:
+    """Folds new observations into the day's summary after each burst of logging.
+
+    notify() is cheap and called after every logged event; the update itself
+    runs on a background thread once no new events have arrived for the
+    debounce period and the device is idle.
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        is_idle: Callable[[], bool] = lambda: True,
+        debounce: float = SUMMARY_DEBOUNCE_SEC,
+        db_path=DB_PATH,
+    ):
+        self.llm = llm
+        self.is_idle = is_idle
+        self.debounce = debounce
+        self.db_path = db_path
+        self._last_notify = 0.0
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="summariser", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._dirty.set()
+
+    def notify(self):
+        """Signal that a new event was logged."""
+        self._last_notify = time.monotonic()
+        self._dirty.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                return
+            # Debounce: wait for a quiet spell, and don't compete with a live interaction
+            quiet = time.monotonic() - self._last_notify
+            if quiet < self.debounce or not self.is_idle():
+                self._stop.wait(max(self.debounce - quiet, 1.0))
+                continue
+            self._dirty.clear()
+            try:
+                self.update()
+            except Exception as e:
+                log.error("Rolling summary update failed: %s", e)
+
+    def update(self) -> str | None:
+        """Fold any events logged since the last update into today's summary."""
+        day = today()
+        current = get_summary(day, self.db_path)
+        if current:
+            batch = get_events_since(current["last_event_id"], limit=200)
+        else:
+            batch = get_today_events(limit=200)
+        events = [
+            e for e in batch
+            if e["timestamp"].startswith(day) and e["event_type"] != "report"
+        ]
+        if not events:
+            return current["summary"] if current else None
+        more = len(batch) == 200
+
+        summary = self.llm(
+            SUMMARY_SYSTEM,
+            UPDATE_PROMPT.format(
+                summary=current["summary"] if current else "(nothing yet)",
+                events="\n".join(format_event(e) for e in events),
+            ),
+            300,
+        )
+        conn = _connect(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO rolling_summary (day, summary, last_event_id, updated) "
+            "VALUES (?, ?, ?, ?)",
+            (day, summary, batch[-1]["id"], datetime.now(timezone.utc).isoformat()),
+        )
+        conn.commit()
+        conn.close()
+        log.info("Rolling summary updated through event %d", batch[-1]["id"])
+        if more:
+            self._dirty.set()  # more backlog to fold in
+        return summary
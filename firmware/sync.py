@@ -0,0 +1,231 @@
+"""Delta sync of events and captures from the device to the companion server.
+
+Events are pushed in batches above a high-water mark stored in SQLite, and
+events rewritten since (rapid-log results, say) above a second mark on their
+revision number; the server upserts, so sending a row twice is harmless.
+Captures are uploaded in chunks that the server appends to a partial file,
+so an interrupted upload resumes from the last byte the server holds. The
+server checks each completed file against its SHA-256 before accepting it.
+Everything runs on a background thread, only while the device is idle.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from capture_store import _connect as _captures_connect, relative_name
+from config import (
+    DB_PATH,
+    DEVICE_ID,
+    SYNC_BATCH_SIZE,
+    SYNC_CHUNK_BYTES,
+    SYNC_INTERVAL_SEC,
+    SYNC_TIMEOUT_SEC,
+    SYNC_TOKEN,
+    SYNC_URL,
+    ensure_dirs,
+)
+from logger import get_events_since, get_revised_since
+
+log = logging.getLogger(__name__)
+
+
+def _state_conn(db_path) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    )
+    return conn
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SyncClient:
+    """Pushes new events and unsynced captures to the server."""
+
+    def __init__(
+        self,
+        base_url: str = SYNC_URL,
+        device_id: str = DEVICE_ID,
+        is_idle: Callable[[], bool] = lambda: True,
+        db_path=DB_PATH,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.device_id = device_id
+        self.is_idle = is_idle
+        self.db_path = db_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- background loop ---
+
+    def start(self):
+        if not self.base_url:
+            log.info("SYNC_URL not set — sync disabled")
+            return
+        self._thread = threading.Thread(target=self._run, name="sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(SYNC_INTERVAL_SEC):
+            if not self.is_idle():
+                continue
+            try:
+                self.run_once()
+            except (urllib.error.URLError, OSError) as e:
+                log.info("Sync deferred, server unreachable: %s", e)
+            except Exception as e:
+                log.error("Sync failed: %s", e)
+
+    def run_once(self) -> dict:
+        """Push everything outstanding. Returns counts of what was sent."""
+        events = self.push_events()
+        captures = self.push_captures()
+        if events or captures:
+            log.info("Synced %d events, %d captures", events, captures)
+        return {"events": events, "captures": captures}
+
+    # --- high-water mark ---
+
+    def _get_state(self, key: str, default: str = None) -> str | None:
+        conn = _state_conn(self.db_path)
+        row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        conn.close()
+        return row[0] if row else default
+
+    def _set_state(self, key: str, value: str):
+        conn = _state_conn(self.db_path)
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value)
+        )
+        conn.commit()
+        conn.close()
+
+    # --- HTTP ---
+
+    def _request(self, method: str, path: str, body: bytes = None, headers: dict = None) -> dict:
+        req = urllib.request.Request(
+            f"{self.base_url}{path}", data=body, method=method, headers=headers or {}
+        )
+        if SYNC_TOKEN:
+            req.add_header("Authorization", f"Bearer {SYNC_TOKEN}")
+        with urllib.request.urlopen(req, timeout=SYNC_TIMEOUT_SEC) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    # --- events ---
+
+    def push_events(self) -> int:
+        sent = 0
+        hwm = int(self._get_state("events_hwm", "0"))
+        while not self._stop.is_set() and self.is_idle():
+            batch = get_events_since(hwm, limit=SYNC_BATCH_SIZE)
+            if not batch:
+                break
+            body = json.dumps({"device_id": self.device_id, "events": batch}).encode()
+            result = self._request(
+                "POST", "/api/ingest/events", body, {"Content-Type": "application/json"}
+            )
+            hwm = result["hwm"]
+            self._set_state("events_hwm", str(hwm))
+            sent += len(batch)
+
+        rev = int(self._get_state("revisions_hwm", "0"))
+        while not self._stop.is_set() and self.is_idle():
+            batch = get_revised_since(rev, limit=SYNC_BATCH_SIZE)
+            if not batch:
+                break
+            revs = [e.pop("rev") for e in batch]
+            body = json.dumps({"device_id": self.device_id, "events": batch}).encode()
+            self._request("POST", "/api/ingest/events", body, {"Content-Type": "application/json"})
+            rev = revs[-1]
+            self._set_state("revisions_hwm", str(rev))
+            sent += len(batch)
+        return sent
+
+    # --- captures ---
+
+    def push_captures(self) -> int:
+        conn = _captures_connect(self.db_path)
+        rows = conn.execute(
+            "SELECT sha256, path FROM captures "
+            "WHERE synced_at IS NULL AND deleted_at IS NULL ORDER BY created ASC"
+        ).fetchall()
+        conn.close()
+
+        sent = 0
+        for digest, path in rows:
+            if self._stop.is_set() or not self.is_idle():
+                break
+            path = Path(path)
+            if not path.exists():
+                continue
+            if self._upload(path):
+                conn = _captures_connect(self.db_path)
+                conn.execute(
+                    "UPDATE captures SET synced_at = ? WHERE sha256 = ?",
+                    (datetime.now(timezone.utc).isoformat(), digest),
+                )
+                conn.commit()
+                conn.close()
+                sent += 1
+        return sent
+
+    def _upload(self, path: Path) -> bool:
+        """Upload one file in resumable chunks. Returns True once the server has it."""
+        # Hash the bytes on disk: recompression may have replaced the original encoding
+        digest = file_sha256(path)
+        size = path.stat().st_size
+        url = (
+            f"/api/ingest/captures/{urllib.parse.quote(relative_name(path))}"
+            f"?device_id={urllib.parse.quote(self.device_id)}&sha256={digest}&size={size}"
+        )
+        status = self._request("GET", url)
+        offset = status.get("received", 0)
+
+        with open(path, "rb") as f:
+            while not status.get("complete"):
+                if self._stop.is_set() or not self.is_idle():
+                    return False  # resume from the server's offset next time
+                f.seek(offset)
+                chunk = f.read(SYNC_CHUNK_BYTES)
+                status = self._request(
+                    "PUT", url, chunk,
+                    {
+                        "Content-Type": "application/octet-stream",
+                        "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{size}",
+                    },
+                )
+                offset = status.get("received", offset + len(chunk))
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Push outstanding events and captures once")
+    parser.add_argument("--url", default=SYNC_URL or "http://localhost:8080")
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    counts = SyncClient(args.url).run_once()
+    print(f"{counts['events']} events, {counts['captures']} captures in {time.monotonic() - t0:.1f}s")
@@ -0,0 +1,98 @@
+"""Per-stage timing for the interaction loop.
+
+A Trace collects named spans for one turn (endpoint, STT, capture, vision,
+TTS, ...), plus "turn" from the end of speech to the first audio of the reply.
+When the turn ends the timings are attached to the logged event's
+metadata and folded into cumulative per-stage histograms, which the companion
+server exposes on /metrics.
+"""
+
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from config import DB_PATH, ensure_dirs
+
+log = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _connect(db_path=DB_PATH) -> sqlite3.Connection:
+    ensure_dirs()
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stage_timings (
+            stage TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0,
+            sum REAL NOT NULL DEFAULT 0,
+            buckets TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+class Trace:
+    """Timings for one interaction, in seconds, keyed by stage."""
+
+    def __init__(self):
+        self.spans: dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def add(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def as_metadata(self) -> dict:
+        """Millisecond timings for events.metadata."""
+        return {stage: round(sec * 1000, 1) for stage, sec in self.spans.items()}
+
+    def record(self, db_path=DB_PATH):
+        """Fold this trace into the cumulative stage histograms."""
+        if not self.spans:
+            return
+        conn = _connect(db_path)
+        # Read and write the buckets under one lock, so concurrent records (rapid-log
+        # batches, the speaker thread finishing a turn) can't lose an increment
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            for stage, seconds in self.spans.items():
+                row = conn.execute(
+                    "SELECT buckets FROM stage_timings WHERE stage = ?", (stage,)
+                ).fetchone()
+                counts = [int(c) for c in row[0].split(",")] if row else [0] * len(BUCKETS)
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        counts[i] += 1
+                conn.execute(
+                    """
+                    INSERT INTO stage_timings (stage, count, sum, buckets) VALUES (?, 1, ?, ?)
+                    ON CONFLICT (stage) DO UPDATE SET
+                        count = count + 1, sum = sum + excluded.sum, buckets = excluded.buckets
+                    """,
+                    (stage, seconds, ",".join(map(str, counts))),
+                )
+        conn.close()
+
+
+def get_histograms(db_path=DB_PATH) -> dict[str, dict]:
+    """Cumulative histogram per stage: {stage: {"count", "sum", "buckets": [(le, n), ...]}}."""
+    conn = _connect(db_path)
+    rows = conn.execute("SELECT stage, count, sum, buckets FROM stage_timings ORDER BY stage").fetchall()
+    conn.close()
+    return {
+        stage: {
+            "count": count,
+            "sum": total,
+            "buckets": list(zip(BUCKETS, (int(c) for c in buckets.split(",")))),
+        }
+        for stage, count, total, buckets in rows
+    }
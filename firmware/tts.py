@@ -1,18 +1,29 @@
 """Text-to-speech using Piper — runs locally on the Pi, outputs to Bluetooth earpiece."""
 
+import hashlib
 import io
+import os
+import queue
+import re
 import subprocess
 import logging
+import threading
+import time
 import wave
-from config import PIPER_MODEL, TTS_SPEED
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from typing import Callable
+
+from audio import rms
+from config import PIPER_MODEL, PLAYBACK_BLOCK_SEC, PLAYBACK_LEAD_SEC, TTS_CACHE_DIR, TTS_SPEED
+from tracing import Trace
 
 log = logging.getLogger(__name__)
 
 
-def speak(text: str):
-    """Convert text to speech and play through the default audio output (Bluetooth earpiece)."""
+def _synthesise(text: str) -> bytes | None:
+    """Render text to WAV bytes with Piper, or espeak if Piper isn't installed."""
     try:
-        # Piper outputs raw WAV to stdout
         result = subprocess.run(
             [
                 "piper",
@@ -24,36 +35,245 @@ def speak(text: str):
             capture_output=True,
             timeout=30,
         )
-
-        if result.returncode != 0:
-            log.error("Piper TTS failed: %s", result.stderr.decode())
-            return
-
-        # Play the WAV audio through aplay (ALSA)
-        subprocess.run(
-            ["aplay", "-q", "-"],
-            input=result.stdout,
+    except FileNotFoundError:
+        log.warning("Piper not installed — falling back to espeak")
+        result = subprocess.run(
+            ["espeak", "-v", "en-gb", "-s", "160", "--stdout", text],
+            capture_output=True,
             timeout=30,
         )
+    if result.returncode != 0:
+        log.error("TTS failed: %s", result.stderr.decode())
+        return None
+    return result.stdout
 
-    except FileNotFoundError:
-        log.warning("Piper not installed — falling back to espeak")
-        _speak_espeak(text)
-    except subprocess.TimeoutExpired:
-        log.error("TTS timed out")
 
+def _cached_wav(text: str, synthesise: Callable = _synthesise) -> bytes | None:
+    """WAV for a fixed phrase, rendered once and kept in TTS_CACHE_DIR."""
+    key = hashlib.sha1(f"{PIPER_MODEL}|{TTS_SPEED}|{text}".encode()).hexdigest()[:16]
+    path = TTS_CACHE_DIR / f"{key}.wav"
+    if path.exists():
+        return path.read_bytes()
+    wav = synthesise(text)
+    if wav is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(wav)
+        os.replace(tmp, path)
+    return wav
 
-def _speak_espeak(text: str):
-    """Fallback TTS using espeak (pre-installed on most Pi OS)."""
-    try:
-        subprocess.run(
-            ["espeak", "-v", "en-gb", "-s", "160", text],
-            timeout=30,
+
+# --- Interruptible playback ---
+
+def split_sentences(text: str) -> list[str]:
+    """Split a reply so the first sentence can play while the rest is synthesised."""
+    return [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s]
+
+
+class _Aplay:
+    """Raw PCM fed to aplay's stdin, so playback can be stopped between blocks."""
+
+    def __init__(self, rate: int, channels: int):
+        self.proc = subprocess.Popen(
+            ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(rate), "-c", str(channels), "-"],
+            stdin=subprocess.PIPE,
         )
-    except Exception as e:
-        log.error("espeak fallback failed: %s", e)
 
+    def write(self, data: bytes):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def close(self):
+        """Let buffered audio finish playing."""
+        self.proc.stdin.close()
+        self.proc.wait(timeout=30)
+
+    def kill(self):
+        """Stop immediately, dropping whatever ALSA still has buffered."""
+        self.proc.kill()
+        self.proc.wait()
+
+
+class Utterance:
+    """One queued reply. `interrupted` is set if barge-in cut it off."""
+
+    def __init__(self, text: str, trace: Trace, cache: bool, on_done: Callable | None):
+        self.sentences = [text] if cache else split_sentences(text)
+        self.trace = trace or Trace()
+        self.cache = cache
+        self.on_done = on_done
+        self.first_audio_at: float | None = None  # perf_counter when the first block was sent
+        self.cancelled = False
+        self.interrupted = False
+        self.done = threading.Event()
+
+
+class Speaker:
+    """Non-blocking TTS for full-duplex operation.
+
+    Replies are queued and played by a worker thread while the main loop goes
+    back to listening. Synthesis runs one sentence ahead of playback. PCM is
+    written to the output in short blocks, paced just ahead of real time, so
+    cancel() silences it within a block and reference_level() knows roughly
+    what is coming out of the earpiece (for echo suppression on the mic).
+    """
+
+    def __init__(self, synthesise: Callable = _synthesise, open_output: Callable = _Aplay):
+        self._synthesise = synthesise
+        self._open_output = open_output
+        self._queue: queue.Queue[Utterance | None] = queue.Queue()
+        self._synth = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._current: Utterance | None = None
+        self._output = None
+        self._levels: deque[tuple[float, float]] = deque(maxlen=64)  # (time written, rms)
+
+    def start(self):
+        self._synth = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-synth")
+        self._thread = threading.Thread(target=self._run, name="tts-play", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.cancel()
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._synth.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def playing(self) -> bool:
+        return self._current is not None or not self._queue.empty()
+
+    def say(self, text: str, trace: Trace = None, cache: bool = False,
+            on_done: Callable[[Utterance], None] = None) -> Utterance:
+        """Queue text to be spoken and return at once. cache=True for fixed phrases."""
+        utt = Utterance(text, trace, cache, on_done)
+        self._queue.put(utt)
+        return utt
+
+    def prompt(self, text: str):
+        """Speak a fixed phrase now, outside the queue, and wait for it (boot and shutdown)."""
+        try:
+            wav = _cached_wav(text, self._synthesise)
+            if wav is None:
+                return
+            with wave.open(io.BytesIO(wav)) as wf:
+                output = self._open_output(wf.getframerate(), wf.getnchannels())
+                output.write(wf.readframes(wf.getnframes()))
+            output.close()
+        except (OSError, subprocess.TimeoutExpired) as e:
+            log.error("Prompt playback failed: %s", e)
+
+    def cancel(self):
+        """Barge-in: stop the current reply now and drop everything queued."""
+        with self._lock:
+            if self._current:
+                self._current.cancelled = self._current.interrupted = True
+            if self._output:
+                self._output.kill()
+        while True:
+            try:
+                utt = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if utt is None:
+                self._queue.put(None)  # keep the stop sentinel
+                break
+            utt.cancelled = utt.interrupted = True
+            self._finish(utt)
+
+    def reference_level(self, window: float = 0.3) -> float:
+        """RMS of the loudest block played in the last `window` seconds (0 when silent)."""
+        if self._current is None:
+            return 0.0
+        cutoff = time.perf_counter() - window - PLAYBACK_LEAD_SEC
+        return max((level for t, level in list(self._levels) if t >= cutoff), default=0.0)
+
+    # --- worker ---
+
+    def _run(self):
+        while True:
+            utt = self._queue.get()
+            if utt is None:
+                return
+            self._current = utt
+            try:
+                if not utt.cancelled:
+                    self._speak(utt)
+            except Exception as e:
+                log.error("Playback failed: %s", e)
+            finally:
+                self._current = None
+                self._finish(utt)
+
+    def _render(self, sentence: str, cache: bool) -> bytes | None:
+        return _cached_wav(sentence, self._synthesise) if cache else self._synthesise(sentence)
+
+    def _speak(self, utt: Utterance):
+        futures = [self._synth.submit(self._render, s, utt.cache) for s in utt.sentences]
+        try:
+            for future in futures:
+                with utt.trace.span("tts_synth"):  # time spent waiting on synthesis
+                    try:
+                        wav = future.result()
+                    except CancelledError:
+                        return
+                if utt.cancelled:
+                    return
+                if wav:
+                    with utt.trace.span("tts_play"):
+                        self._play_pcm(wav, utt)
+                if utt.cancelled:
+                    return
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _play_pcm(self, wav: bytes, utt: Utterance):
+        with wave.open(io.BytesIO(wav)) as wf:
+            rate, channels = wf.getframerate(), wf.getnchannels()
+            pcm = wf.readframes(wf.getnframes())
+        bytes_per_sec = rate * channels * 2
+        block = int(bytes_per_sec * PLAYBACK_BLOCK_SEC) & ~1
+
+        output = self._open_output(rate, channels)
+        with self._lock:
+            if utt.cancelled:
+                output.kill()
+                return
+            self._output = output
+        started = time.perf_counter()
+        try:
+            for offset in range(0, len(pcm), block):
+                if utt.cancelled:
+                    return
+                # Stay only PLAYBACK_LEAD_SEC ahead of the earpiece
+                delay = started + offset / bytes_per_sec - PLAYBACK_LEAD_SEC - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                data = pcm[offset:offset + block]
+                output.write(data)
+                now = time.perf_counter()
+                if utt.first_audio_at is None:
+                    utt.first_audio_at = now
+                self._levels.append((now, rms(data)))
+        except OSError as e:
+            if not utt.cancelled:  # otherwise cancel() killed the output under us
+                log.error("Audio output failed: %s", e)
+        finally:
+            with self._lock:
+                self._output = None
+            if not utt.cancelled:
+                try:
+                    output.close()
+                except (OSError, subprocess.TimeoutExpired) as e:
+                    log.error("Audio output failed: %s", e)
 
-def speak_confirmation(action: str):
-    """Short confirmation beep/phrase."""
-    speak(action)
+    def _finish(self, utt: Utterance):
+        utt.done.set()
+        if utt.on_done:
+            try:
+                utt.on_done(utt)
+            except Exception as e:
+                log.error("Utterance callback failed: %s", e)
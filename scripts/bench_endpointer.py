@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Airpiece — endpointing benchmark: the hybrid endpointer against the old VAD loop.
+
+Runs both endpointers over the same audio and reports, per input:
+  - utterances found
+  - endpoint delay: time from the end of speech to the endpoint
+  - seconds of audio uploaded per utterance
+  - webrtcvad calls, and CPU time per second of audio
+
+"legacy" is the loop AudioCapture used before endpointer.py: webrtcvad on
+every 30 ms frame and a fixed SILENCE_TIMEOUT_SEC.
+
+Recorded site audio is the real test. Pass session files (AIRPIECE_RECORD=1
+on the device) or 16 kHz mono WAVs:
+
+    python3 scripts/bench_endpointer.py data/sessions/20250601T091500Z.session
+    python3 scripts/bench_endpointer.py roof_walk.wav --block 33
+
+Recorded audio has no ground truth, so speech end is taken as each method's
+own last voiced frame. Without inputs, synthetic scenes are generated:
+quiet, roof plant hum and gusty wind, each with utterances that contain a
+mid-sentence pause. Their true speech spans are known, so the report adds
+misses, false triggers and split utterances.
+
+--block feeds the hybrid endpointer that many frames per call, as a batch
+job over recorded audio would. The device feeds one frame at a time.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "firmware"))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from config import CHUNK_SIZE, SAMPLE_RATE, SILENCE_TIMEOUT_SEC, VAD_AGGRESSIVENESS  # noqa: E402
+from endpointer import Endpointer  # noqa: E402
+
+FRAME_SEC = CHUNK_SIZE / SAMPLE_RATE
+FRAME_BYTES = CHUNK_SIZE * 2
+
+
+# --- Inputs ---
+
+def load(path: Path) -> bytes:
+    """16-bit mono PCM at SAMPLE_RATE from a WAV or a recorded session."""
+    with open(path, "rb") as f:
+        is_wav = f.read(4) == b"RIFF"
+    if is_wav:
+        with wave.open(str(path)) as wf:
+            if (wf.getframerate(), wf.getnchannels(), wf.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+                sys.exit(f"{path}: need {SAMPLE_RATE} Hz mono 16-bit WAV")
+            return wf.readframes(wf.getnframes())
+    from session import AUDIO, SessionReader
+
+    reader = SessionReader(path)
+    pcm = b"".join(chunk for _, chunk in reader.stream(AUDIO))
+    reader.close()
+    return pcm
+
+
+def background(scene: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    t = np.arange(n) / SAMPLE_RATE
+    if scene == "quiet":
+        return rng.normal(0, 20, n)
+    if scene == "plant":  # fan and compressor hum with broadband hiss
+        hum = sum(np.sin(2 * np.pi * f * t) / k for k, f in enumerate((50, 100, 150, 300), 1))
+        return 250 * hum + rng.normal(0, 250, n)
+    if scene == "wind":  # low-passed noise with slow gusts
+        rumble = np.convolve(rng.normal(0, 1, n), np.ones(40) / 40, mode="same")
+        gusts = 0.3 + 0.7 * (0.5 + 0.5 * np.sin(2 * np.pi * 0.13 * t + rng.uniform(0, 6)))
+        return 2400 * rumble * gusts + rng.normal(0, 60, n)
+    raise ValueError(scene)
+
+
+def synthetic(scene: str, utterances: int, seed: int) -> tuple[bytes, list[tuple[float, float]]]:
+    """A scene with utterances in it, and the (start, end) of each in seconds."""
+    from bench_stubs import voiced_speech
+
+    rng = np.random.default_rng(seed)
+    parts, truth, t = [np.zeros(int(SAMPLE_RATE * 2.0))], [], 2.0
+    for _ in range(utterances):
+        first, second = rng.uniform(0.5, 1.8), rng.uniform(0.4, 1.5)
+        pause = rng.uniform(0.2, 0.6)  # mid-sentence: must not end the utterance
+        pitch = rng.uniform(100, 220)
+        speech = np.concatenate([
+            voiced_speech(first, pitch), np.zeros(int(SAMPLE_RATE * pause)), voiced_speech(second, pitch),
+        ]).astype(np.float64) * rng.uniform(0.4, 1.0)
+        truth.append((t, t + len(speech) / SAMPLE_RATE))
+        gap = rng.uniform(2.5, 4.5)
+        parts += [speech, np.zeros(int(SAMPLE_RATE * gap))]
+        t += (len(speech) + int(SAMPLE_RATE * gap)) / SAMPLE_RATE
+    signal = np.concatenate(parts)
+    signal += background(scene, len(signal), rng)
+    pcm = np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+    return pcm[: len(pcm) // FRAME_BYTES * FRAME_BYTES], truth
+
+
+# --- Endpointers ---
+# Each returns a list of segments: (start, speech end, endpoint, uploaded seconds)
+
+def run_legacy(pcm: bytes, vad) -> tuple[list[tuple], dict]:
+    """The pre-endpointer loop: VAD on every frame, fixed timeout, whole tail uploaded."""
+    max_silent = int(SILENCE_TIMEOUT_SEC / FRAME_SEC)
+    segments, frames, silent, recording, start, last_voiced = [], 0, 0, False, 0, 0
+    calls = 0
+    for i in range(len(pcm) // FRAME_BYTES):
+        calls += 1
+        if vad.is_speech(pcm[i * FRAME_BYTES:(i + 1) * FRAME_BYTES], SAMPLE_RATE):
+            if not recording:
+                recording, start, frames = True, i, 0
+            frames += 1
+            silent, last_voiced = 0, i
+        elif recording:
+            frames += 1
+            silent += 1
+            if silent >= max_silent:
+                if frames >= 10:
+                    segments.append((start * FRAME_SEC, (last_voiced + 1) * FRAME_SEC,
+                                     (i + 1) * FRAME_SEC, frames * FRAME_SEC))
+                recording = False
+    return segments, {"vad_calls": calls}
+
+
+def run_hybrid(pcm: bytes, vad, block: int) -> tuple[list[tuple], dict]:
+    endpointer = Endpointer(lambda frame: vad.is_speech(frame, SAMPLE_RATE))
+    segments, step = [], block * FRAME_BYTES
+    for offset in range(0, len(pcm), step):
+        ended = endpointer.feed(pcm[offset:offset + step])
+        while ended:
+            end = endpointer.stats["frames"]
+            speech_end = end - endpointer.silent_run
+            start = end - len(endpointer.frames)
+            frames = endpointer.take()
+            if frames:
+                segments.append((start * FRAME_SEC, speech_end * FRAME_SEC, end * FRAME_SEC,
+                                 len(frames) * FRAME_SEC))
+            ended = endpointer.feed(b"")  # frames after the endpoint, carried over
+    return segments, {"vad_calls": endpointer.stats["vad_calls"], "floor_db": endpointer.floor_db,
+                      "timeout_sec": endpointer.timeout_sec}
+
+
+def score(segments: list[tuple], truth: list[tuple[float, float]] | None) -> dict:
+    out = {"utterances": len(segments)}
+    if segments:
+        out["upload_sec"] = statistics.fmean(s[3] for s in segments)
+    if truth is None:
+        delays = [endpoint - speech_end for _, speech_end, endpoint, _ in segments]
+    else:
+        delays, matched = [], [[] for _ in truth]
+        out["false"] = 0
+        for seg in segments:
+            hit = [i for i, (a, b) in enumerate(truth) if seg[0] < b and seg[1] > a]
+            if not hit:
+                out["false"] += 1
+            for i in hit:
+                matched[i].append(seg)
+        out["missed"] = sum(1 for m in matched if not m)
+        out["split"] = sum(1 for m in matched if len(m) > 1)
+        delays = [m[-1][2] - end for (_, end), m in zip(truth, matched) if m]
+        out["clipped_onsets"] = sum(1 for (start, _), m in zip(truth, matched) if m and m[0][0] > start + 0.06)
+    if delays:
+        out["delay_mean_ms"] = statistics.fmean(delays) * 1000
+        out["delay_max_ms"] = max(delays) * 1000
+    return out
+
+
+def bench(name: str, pcm: bytes, truth, block: int, repeat: int) -> dict:
+    import webrtcvad
+
+    seconds = len(pcm) / 2 / SAMPLE_RATE
+    result = {"input": name, "seconds": seconds}
+    for method, run in (("legacy", run_legacy), ("hybrid", lambda p, v: run_hybrid(p, v, block))):
+        cpu = []
+        for _ in range(repeat):
+            vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+            t0 = time.process_time()
+            segments, info = run(pcm, vad)
+            cpu.append(time.process_time() - t0)
+        result[method] = {
+            **score(segments, truth), **info,
+            "vad_calls_per_sec": info["vad_calls"] / seconds,
+            "cpu_ms_per_audio_sec": min(cpu) / seconds * 1000,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpointing benchmark: hybrid vs per-frame VAD")
+    parser.add_argument("inputs", nargs="*", type=Path, help="session files or 16 kHz mono WAVs")
+    parser.add_argument("--scenes", default="quiet,plant,wind", help="synthetic scenes when no inputs")
+    parser.add_argument("--utterances", type=int, default=12, help="per synthetic scene")
+    parser.add_argument("--block", type=int, default=1, help="frames per feed() call")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method; CPU time is the best")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.inputs:
+        runs = [(str(path), load(path), None) for path in args.inputs]
+    else:
+        runs = [(scene, *synthetic(scene, args.utterances, args.seed)) for scene in args.scenes.split(",")]
+    results = [bench(name, pcm, truth, args.block, args.repeat) for name, pcm, truth in runs]
+
+    columns = ["utterances", "missed", "false", "split", "clipped_onsets", "delay_mean_ms", "delay_max_ms",
+               "upload_sec", "vad_calls_per_sec", "cpu_ms_per_audio_sec"]
+    for r in results:
+        print(f"\n{r['input']}  ({r['seconds']:.0f} s of audio)")
+        hybrid = r["hybrid"]
+        if hybrid.get("floor_db") is not None:
+            print(f"  noise floor {hybrid['floor_db']:.0f} dBFS -> silence timeout {hybrid['timeout_sec']:.2f} s")
+        print(f"  {'':<22}{'legacy':>10}{'hybrid':>10}")
+        for column in columns:
+            if column in r["legacy"] or column in hybrid:
+                cells = [r[m].get(column) for m in ("legacy", "hybrid")]
+                print(f"  {column:<22}" + "".join(
+                    f"{c:>10.1f}" if isinstance(c, float) else f"{'-' if c is None else c:>10}" for c in cells
+                ))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"config": vars(args) | {"inputs": [str(p) for p in args.inputs]},
+                                               "results": results}, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
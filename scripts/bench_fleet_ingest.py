@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Airpiece — fleet ingest throughput benchmark.
+
+Simulates several hard hats pushing event batches at once, either straight
+into a FleetStore in a temp directory or over HTTP to a running server.
+
+Usage:
+    python3 scripts/bench_fleet_ingest.py --devices 8 --batches 50
+    python3 scripts/bench_fleet_ingest.py --url http://localhost:8080
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "firmware"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "server"))
+from fleet import FleetStore
+
+
+def make_batch(device: int, start_seq: int, size: int) -> list[dict]:
+    t0 = datetime.now(timezone.utc)
+    return [
+        {
+            "id": seq,
+            "timestamp": (t0 + timedelta(milliseconds=seq)).isoformat(),
+            "event_type": "observation",
+            "transcript": f"log this, device {device} item {seq}",
+            "ai_response": "Sedum album, healthy coverage.",
+            "image_path": None,
+            "latitude": 51.5 + device * 1e-4 + seq * 1e-7,
+            "longitude": -0.12 + seq * 1e-7,
+            "metadata": None,
+        }
+        for seq in range(start_seq, start_seq + size)
+    ]
+
+
+def run_device(device: int, args, store: FleetStore | None, latencies: list[float]):
+    device_id = f"hat-{device:02d}"
+    for b in range(args.batches):
+        batch = make_batch(device, b * args.batch_size + 1, args.batch_size)
+        t0 = time.perf_counter()
+        if store:
+            store.ingest(device_id, batch)
+        else:
+            req = urllib.request.Request(
+                f"{args.url.rstrip('/')}/api/ingest/events",
+                data=json.dumps({"device_id": device_id, "events": batch}).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            urllib.request.urlopen(req, timeout=30).read()
+        latencies.append(time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet ingest throughput benchmark")
+    parser.add_argument("--devices", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=50, help="batches per device")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--url", help="benchmark a running server instead of the store directly")
+    args = parser.parse_args()
+
+    tmp = None
+    store = None
+    if not args.url:
+        tmp = tempfile.TemporaryDirectory()
+        store = FleetStore(Path(tmp.name))
+
+    latencies: list[float] = []
+    threads = [
+        threading.Thread(target=run_device, args=(d, args, store, latencies))
+        for d in range(args.devices)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    total = args.devices * args.batches * args.batch_size
+    latencies.sort()
+    print(f"{args.devices} devices x {args.batches} batches x {args.batch_size} events")
+    print(f"  {total} events in {elapsed:.2f}s — {total / elapsed:,.0f} events/s")
+    print(f"  batch latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+    if store:
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        t0 = time.perf_counter()
+        timeline = store.timeline(day, limit=500)
+        t1 = time.perf_counter()
+        nearby = store.nearby(day, 51.5, -0.12, radius_m=25)
+        t2 = time.perf_counter()
+        print(f"  timeline(500) {(t1 - t0) * 1000:.1f} ms -> {len(timeline)} events, "
+              f"nearby(25 m) {(t2 - t1) * 1000:.1f} ms -> {len(nearby)} events")
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
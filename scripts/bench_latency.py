@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Airpiece — end-to-end interaction latency benchmark.
+
+Runs the real Airpiece loop against mock hardware (synthetic speech, mock
+camera, fake GPS serial) and local stub servers for Deepgram and Anthropic,
+then reports per-stage and total latency percentiles. Total latency is
+measured from the end of the user's speech to the first audio of the reply.
+
+Usage:
+    python3 scripts/bench_latency.py --turns 20
+    python3 scripts/bench_latency.py --vision-latency 3 --up-kbps 500 --json run.json
+    python3 scripts/bench_latency.py --speculate --final-change-rate 0.2
+    python3 scripts/bench_latency.py --turns 30 --stall-rate 0.1 --fail-rate 0.05
+    python3 scripts/bench_latency.py --link-schedule 20000:4,1000:4,300:4,20000:4
+    python3 scripts/bench_latency.py --rapid --turns 20 --gap 2
+
+--link-schedule simulates walking between coverage: each kbps:turns segment
+sets the stubs' upload bandwidth for that many turns (overriding --turns and
+--up-kbps), and a per-turn table shows the quality profile the device chose.
+
+--rapid runs every turn in rapid-log mode: total is then the time to the
+"Logged." acknowledgement, and the batched results written back to the
+events are reported separately (write-back latency, batch sizes, calls).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+STAGES = ["endpoint", "gps", "stt", "frame", "encode", "capture", "vision", "log", "tts", "total"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+def summarise(turns: list[dict]) -> dict:
+    out = {}
+    for stage in STAGES:
+        values = [t[stage] for t in turns if stage in t]
+        if values:
+            out[stage] = {
+                "n": len(values),
+                "mean": statistics.fmean(values),
+                "p50": percentile(values, 0.50),
+                "p90": percentile(values, 0.90),
+                "p99": percentile(values, 0.99),
+                "max": max(values),
+            }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark with stubbed services")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--utterance", type=float, default=1.5, help="seconds of speech per turn")
+    parser.add_argument("--gap", type=float, default=2.5, help="seconds of silence between turns (more than the silence timeout)")
+    parser.add_argument("--fast", action="store_true", help="don't pace audio in real time")
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--vision-latency", type=float, default=1.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rtt", type=float, default=0.05)
+    parser.add_argument("--up-kbps", type=float, default=0, help="uplink bandwidth, 0 = unlimited")
+    parser.add_argument("--down-kbps", type=float, default=0)
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="chance a cloud request hangs for --stall seconds")
+    parser.add_argument("--stall", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="chance a cloud request gets a 503")
+    parser.add_argument("--link-schedule", help="upload kbps per run of turns, e.g. 20000:4,300:4")
+    parser.add_argument("--tts-latency", type=float, default=0.4, help="simulated synthesis time per sentence")
+    parser.add_argument("--gps-line-delay", type=float, default=0.1, help="seconds per NMEA sentence")
+    parser.add_argument("--speculate", action="store_true",
+                        help="start vision from interim transcripts (speculative mode)")
+    parser.add_argument("--final-change-rate", type=float, default=0.0,
+                        help="chance the final transcript differs from the interim ones")
+    parser.add_argument("--rapid", action="store_true",
+                        help="rapid-log mode: acknowledge at once, batch the vision calls")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    schedule = []  # upload kbps for each turn
+    if args.link_schedule:
+        for segment in args.link_schedule.split(","):
+            kbps, n = segment.split(":")
+            schedule += [float(kbps)] * int(n)
+        args.turns = len(schedule)
+
+    data_dir = tempfile.TemporaryDirectory(prefix="airpiece-bench-")
+    os.environ.update({
+        "AIRPIECE_DATA_DIR": data_dir.name,
+        "ANTHROPIC_API_KEY": "stub",
+        "DEEPGRAM_API_KEY": "stub",
+        "SYNC_URL": "",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    sys.path.insert(0, str(ROOT / "firmware"))
+    sys.path.insert(0, str(ROOT / "scripts"))
+    from bench_stubs import (
+        FakeSerial, LinkProfile, MockCamera, NullOutput, SourceExhausted, StubCloud, SyntheticAudio,
+        silent_wav,
+    )
+
+    link = dict(jitter=args.jitter, rtt=args.rtt, up_kbps=args.up_kbps, down_kbps=args.down_kbps,
+                stall_rate=args.stall_rate, stall=args.stall, fail_rate=args.fail_rate)
+    cloud = StubCloud(
+        stt=LinkProfile(latency=args.stt_latency, **link),
+        vision=LinkProfile(latency=args.vision_latency, **link),
+        final_change_rate=args.final_change_rate,
+    ).start()
+    # config is already loaded (bench_stubs imports firmware); point it at the stubs
+    # before ai.py reads the endpoints
+    import config
+    config.ANTHROPIC_BASE_URL = config.DEEPGRAM_URL = cloud.url
+
+    import main as airpiece
+    from gps import GPS
+    from link import controller as link_profiles
+    from logger import get_today_events
+    from rapid import get_stats as rapid_stats
+    from resilience import get_counts as cloud_call_counts
+    from speculate import get_stats as speculation_stats
+    from tts import Speaker
+
+    def fake_synthesise(text: str) -> bytes:
+        time.sleep(args.tts_latency)
+        return silent_wav(0.5)
+
+    audio = SyntheticAudio([args.utterance] * args.turns, gap=args.gap, realtime=not args.fast)
+    gps = GPS()
+    gps.start = lambda: None
+    gps.serial_conn = FakeSerial(line_delay=args.gps_line_delay)
+    app = airpiece.Airpiece(
+        audio=audio, camera=MockCamera(), gps=gps,
+        speaker=Speaker(synthesise=fake_synthesise, open_output=NullOutput),
+        speculate=args.speculate,
+    )
+    app.rapid_mode = args.rapid
+
+    turns: list[dict] = []
+    per_turn: list[dict] = []  # link schedule rows
+    current: dict = {}
+    heard = 0
+
+    def timed(stage, fn):
+        def wrapper(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                current[stage] = current.get(stage, 0.0) + time.perf_counter() - t0
+        return wrapper
+
+    listen = audio.listen_for_speech
+
+    def listen_and_start_turn():
+        nonlocal current, heard
+        current = {}  # a fresh dict per turn; replies finish on the speaker thread
+        if schedule:
+            kbps = schedule[min(heard, len(schedule) - 1)]
+            cloud.stt.up_kbps = cloud.vision.up_kbps = kbps
+            current["_link"] = {"link_kbps": kbps, "bytes_up": sum(cloud.bytes_up.values())}
+        result = listen()
+        if result is not None:
+            heard += 1
+            current["_speech_end"] = audio.speech_end
+            current["endpoint"] = time.perf_counter() - audio.speech_end
+        return result
+
+    read_chunk = audio.read_chunk
+
+    def read_chunk_until_replies_done():
+        try:
+            return read_chunk()
+        except SourceExhausted:
+            while app.speaker.playing:  # let the last reply reach the earpiece
+                time.sleep(0.01)
+            raise
+
+    say = app.speaker.say
+
+    def timed_say(text, trace=None, cache=False, on_done=None):
+        turn = current
+
+        def done(utt):
+            if on_done:
+                on_done(utt)
+            if utt.first_audio_at and "_speech_end" in turn and "total" not in turn:
+                turn["tts"] = utt.trace.spans.get("tts_synth", 0.0)
+                turn["total"] = utt.first_audio_at - turn["_speech_end"]
+                turns.append({k: v for k, v in turn.items() if not k.startswith("_")})
+                if "_link" in turn:
+                    row = turn["_link"]
+                    per_turn.append({
+                        "link_kbps": row["link_kbps"],
+                        "profile": turn["_profile"],
+                        "up_kb": (turn["_bytes_up"] - row["bytes_up"]) / 1000,
+                        "total": turn["total"],
+                    })
+
+        turn["_profile"] = link_profiles.profile.name
+        turn["_bytes_up"] = sum(cloud.bytes_up.values())
+        return say(text, trace=trace, cache=cache, on_done=done)
+
+    audio.listen_for_speech = listen_and_start_turn
+    audio.read_chunk = read_chunk_until_replies_done
+    app.speaker.say = timed_say
+    gps.update = timed("gps", gps.update)
+    app._capture_frame = timed("frame", app._capture_frame)
+    app.camera.frame_to_base64 = timed("encode", app.camera.frame_to_base64)
+    app.camera.capture_and_save = timed("capture", app.camera.capture_and_save)
+    app.transcribe = timed("stt", app.transcribe)
+    app.analyse = timed("vision", app.analyse)
+    airpiece.log_event = timed("log", airpiece.log_event)
+    app.speaker.prompt = lambda text: None  # boot/shutdown prompts aren't replies
+
+    started = time.perf_counter()
+    try:
+        app.run()
+    except SourceExhausted:
+        pass
+    finally:
+        cloud.stop()
+    wall = time.perf_counter() - started
+
+    results = {
+        "config": vars(args),
+        "host": {"platform": platform.platform(), "machine": platform.machine(),
+                 "python": platform.python_version()},
+        "turns": len(turns),
+        "wall_sec": wall,
+        "requests": cloud.requests,
+        "bytes_up": cloud.bytes_up,
+        "stages": summarise(turns),
+    }
+    if schedule:
+        results["per_turn"] = per_turn
+    if args.speculate:
+        results["speculation"] = speculation_stats()
+    if args.rapid:
+        written = [
+            m["rapid"] for m in (json.loads(e["metadata"] or "{}") for e in get_today_events())
+            if "rapid" in m
+        ]
+        writeback = [r["writeback_ms"] / 1000 for r in written if r["status"] == "done"]
+        results["rapid"] = rapid_stats() | {
+            "observations": len(written),
+            "pending": sum(r["status"] == "pending" for r in written),
+            "writeback_mean": statistics.fmean(writeback) if writeback else None,
+            "writeback_p90": percentile(writeback, 0.90) if writeback else None,
+        }
+    results["cloud_calls"] = {f"{service}/{decision}": n for (service, decision), n in cloud_call_counts().items()}
+
+    print(f"{len(turns)} turns in {wall:.1f}s  (requests: {cloud.requests})")
+    print(f"{'stage':<10}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}   (ms)")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<10}" + "".join(f"{s[k] * 1000:9.0f}" for k in ("mean", "p50", "p90", "p99", "max")))
+    if schedule:
+        print(f"\n{'turn':>4}{'link kbps':>11}  {'profile':<8}{'upload KB':>10}{'total ms':>10}")
+        for i, row in enumerate(per_turn, 1):
+            print(f"{i:>4}{row['link_kbps']:>11.0f}  {row['profile']:<8}{row['up_kb']:>10.0f}"
+                  f"{row['total'] * 1000:>10.0f}")
+    print("cloud calls: " + ", ".join(f"{k} {n}" for k, n in results["cloud_calls"].items()))
+    if args.rapid:
+        r = results["rapid"]
+        batches = r.get("batches", 0)
+        print(f"rapid log: {r.get('done', 0)}/{r['observations']} written back in {batches} batches "
+              f"({r.get('items', 0) / batches if batches else 0:.1f} per call), "
+              f"{r.get('failed', 0)} failed, {r['pending']} pending")
+        if r["writeback_mean"] is not None:
+            print(f"write-back after logging: mean {r['writeback_mean']:.1f}s, "
+                  f"p90 {r['writeback_p90']:.1f}s")
+    if args.speculate:
+        hit = results["speculation"].get("hit", {"count": 0})
+        miss = results["speculation"].get("miss", {"count": 0, "input_tokens": 0, "output_tokens": 0})
+        started = hit["count"] + miss["count"]
+        print(f"speculation: {hit['count']}/{started} hits, wasted tokens "
+              f"{miss['input_tokens']} in / {miss['output_tokens']} out")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"Wrote {args.json}")
+    data_dir.cleanup()
+    return 0 if turns else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
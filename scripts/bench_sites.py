@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Airpiece — site index benchmark: fix-to-site lookups against thousands of roofs.
+
+Generates registries of irregular roof outlines (10-80 m across, with some
+courtyard holes and nested site boundaries) scattered over a city-sized
+area. It builds the grid index and times lookups for a walk of fixes, half
+on roofs, half near roof edges and the rest anywhere. Every answer is
+checked against a linear scan over all sites.
+
+    python3 scripts/bench_sites.py
+    python3 scripts/bench_sites.py --sites 1000,10000,50000 --lookups 20000
+    python3 scripts/bench_sites.py --geojson data/sites.geojson
+
+--geojson benchmarks a real registry instead, with fixes drawn around its
+own outlines.
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "firmware"))
+
+from config import SITE_GRID_DEG, SITE_MARGIN_M  # noqa: E402
+from sites import METRES_PER_DEGREE, SiteIndex, site_from_feature  # noqa: E402
+
+CENTRE = (51.5072, -0.1276)  # lat, lon
+SPAN_KM = 25
+
+
+def roof(rng: random.Random, lat: float, lon: float, radius_m: float, hole: bool) -> list:
+    """An irregular polygon around a point, optionally with a courtyard."""
+    def ring(r: float, n: int) -> list:
+        points = []
+        for i in range(n):
+            a = 2 * math.pi * i / n + rng.uniform(-0.2, 0.2)
+            d = r * rng.uniform(0.7, 1.0)
+            points.append([lon + d * math.cos(a) / (METRES_PER_DEGREE * math.cos(math.radians(lat))),
+                           lat + d * math.sin(a) / METRES_PER_DEGREE])
+        return points + [points[0]]
+
+    rings = [ring(radius_m, rng.randint(4, 12))]
+    if hole:
+        rings.append(ring(radius_m * 0.3, 4))
+    return rings
+
+
+def registry(n: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    features = []
+    for i in range(n):
+        lat = CENTRE[0] + rng.uniform(-0.5, 0.5) * SPAN_KM * 1000 / METRES_PER_DEGREE
+        lon = CENTRE[1] + rng.uniform(-0.5, 0.5) * SPAN_KM * 1000 / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+        radius = rng.uniform(5, 40)
+        features.append({
+            "type": "Feature", "id": f"roof-{i}",
+            "properties": {"name": f"Roof {i}", "client": f"Client {i % 97}", "system": "sedum"},
+            "geometry": {"type": "Polygon", "coordinates": roof(rng, lat, lon, radius, rng.random() < 0.1)},
+        })
+        if rng.random() < 0.05:  # a site boundary around the roof, larger and less specific
+            features.append({
+                "type": "Feature", "id": f"site-{i}", "properties": {"name": f"Site {i}"},
+                "geometry": {"type": "Polygon", "coordinates": roof(rng, lat, lon, radius * 4, False)},
+            })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def fixes(index: SiteIndex, n: int, seed: int) -> list[tuple[float, float]]:
+    """Half on roofs, a quarter within a few metres of an edge, a quarter anywhere."""
+    rng = random.Random(seed)
+    sites = list(index.sites.values())
+    min_lat = min(s.bbox[1] for s in sites)
+    max_lat = max(s.bbox[3] for s in sites)
+    min_lon = min(s.bbox[0] for s in sites)
+    max_lon = max(s.bbox[2] for s in sites)
+    out = []
+    for i in range(n):
+        site = rng.choice(sites)
+        ring = site.polygons[0][0]
+        if i % 4 < 2:
+            (x1, y1), (x2, y2), (x3, y3) = ring[0], ring[len(ring) // 3], ring[2 * len(ring) // 3]
+            out.append(((y1 + y2 + y3) / 3, (x1 + x2 + x3) / 3))
+        elif i % 4 == 2:
+            x, y = rng.choice(ring)
+            jitter = SITE_MARGIN_M * 1.5 / METRES_PER_DEGREE
+            out.append((y + rng.uniform(-jitter, jitter), x + rng.uniform(-jitter, jitter)))
+        else:
+            out.append((rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)))
+    return out
+
+
+def linear(index: SiteIndex, lat: float, lon: float):
+    """Reference answer: every site checked, same rules as the index."""
+    inside = [s for s in index.sites.values() if s.contains(lon, lat)]
+    if inside:
+        return min(inside, key=lambda s: s.area)
+    near = [(s.distance_m(lon, lat), s) for s in index.sites.values()]
+    near = [(d, s) for d, s in near if d <= index.margin_m]
+    return min(near, key=lambda ds: ds[0])[1] if near else None
+
+
+def bench(label: str, data: dict, lookups: int, check: int, seed: int, cell: float) -> dict:
+    t0 = time.perf_counter()
+    sites = [site_from_feature(f) for f in data["features"]]
+    parsed = time.perf_counter()
+    index = SiteIndex(sites, cell_deg=cell)
+    built = time.perf_counter()
+    points = fixes(index, lookups, seed)
+
+    took, tagged = [], 0
+    for lat, lon in points:
+        index._last = None  # every fix is new; the repeated-fix cache would flatter the numbers
+        t = time.perf_counter_ns()
+        site = index.lookup(lat, lon)
+        took.append(time.perf_counter_ns() - t)
+        tagged += site is not None
+    took.sort()
+
+    mismatches, linear_ns = 0, []
+    for lat, lon in points[:check]:
+        index._last = None
+        t = time.perf_counter_ns()
+        expected = linear(index, lat, lon)
+        linear_ns.append(time.perf_counter_ns() - t)
+        got = index.lookup(lat, lon)
+        # Equidistant candidates in the margin can legitimately tie
+        if got is not expected and not (got and expected and got.area == expected.area):
+            mismatches += 1
+
+    cells = len(index._grid)
+    result = {
+        "registry": label, "sites": len(index), "cells": cells,
+        "per_cell": statistics.fmean(len(v) for v in index._grid.values()) if cells else 0,
+        "load_ms": (parsed - t0) * 1000, "build_ms": (built - parsed) * 1000,
+        "lookups": lookups, "tagged_pct": tagged / lookups * 100,
+        "lookup_us": {"mean": statistics.fmean(took) / 1000, "p50": took[len(took) // 2] / 1000,
+                      "p99": took[int(len(took) * 0.99)] / 1000, "max": took[-1] / 1000},
+        "linear_us": statistics.fmean(linear_ns) / 1000 if linear_ns else None,
+        "checked": len(points[:check]), "mismatches": mismatches,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Site index lookup benchmark")
+    parser.add_argument("--sites", default="1000,5000,20000", help="synthetic registry sizes")
+    parser.add_argument("--geojson", type=Path, help="benchmark this registry instead")
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--check", type=int, default=300, help="lookups verified against a linear scan")
+    parser.add_argument("--cell", type=float, default=SITE_GRID_DEG, help="grid cell size in degrees")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.geojson:
+        runs = [(str(args.geojson), json.loads(args.geojson.read_text()))]
+    else:
+        runs = [(f"synthetic {n}", registry(int(n), args.seed)) for n in args.sites.split(",")]
+
+    results = []
+    print(f"{'registry':<18}{'sites':>7}{'build ms':>10}{'per cell':>9}{'tagged':>8}"
+          f"{'p50 us':>8}{'p99 us':>8}{'max us':>8}{'linear us':>11}{'wrong':>7}")
+    for label, data in runs:
+        r = bench(label, data, args.lookups, args.check, args.seed, args.cell)
+        results.append(r)
+        lu = r["lookup_us"]
+        print(f"{label:<18}{r['sites']:>7}{r['build_ms']:>10.0f}{r['per_cell']:>9.1f}{r['tagged_pct']:>7.0f}%"
+              f"{lu['p50']:>8.1f}{lu['p99']:>8.1f}{lu['max']:>8.0f}{r['linear_us'] or 0:>11.0f}"
+              f"{r['mismatches']:>4}/{r['checked']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"config": {**vars(args), "geojson": str(args.geojson)},
+                                               "results": results}, indent=2))
+        print(f"\nWrote {args.json}")
+    return 1 if any(r["mismatches"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
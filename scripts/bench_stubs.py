@@ -0,0 +1,340 @@
+"""Mock hardware and local cloud stubs for Airpiece benchmarks.
+
+Nothing here talks to real devices or real APIs:
+  - StubCloud serves Deepgram's /v1/listen and Anthropic's /v1/messages on
+    localhost, with configurable latency, jitter and link bandwidth; its
+    transcripts follow the audio sent, so interim transcripts of a partial
+    utterance are a prefix of the final one
+  - SyntheticAudio plays scripted voiced utterances through the AudioCapture API
+  - MockCamera returns full-resolution frames without picamera2
+  - FakeSerial feeds NMEA sentences to GPS at a configurable rate
+  - NullOutput stands in for aplay behind tts.Speaker
+
+Import after setting AIRPIECE_DATA_DIR etc., since firmware modules read
+configuration at import time.
+"""
+
+import io
+import json
+import random
+import threading
+import time
+import wave
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from audio import AudioCapture
+from camera import Camera
+from config import CHUNK_SIZE, ENDPOINT_TAIL_SEC, SAMPLE_RATE
+
+
+class SourceExhausted(Exception):
+    """The synthetic audio script has finished — ends a benchmark run."""
+
+
+# --- Cloud stubs ---
+
+@dataclass
+class LinkProfile:
+    """Simulated service: server think time plus a link of limited bandwidth."""
+
+    latency: float = 0.3  # seconds of server processing
+    jitter: float = 0.1  # +/- uniform jitter on latency
+    up_kbps: float = 0  # upload bandwidth, 0 = unlimited
+    down_kbps: float = 0  # download bandwidth, 0 = unlimited
+    rtt: float = 0.05  # round trip added to every request
+    stall_rate: float = 0.0  # chance a request hangs for `stall` seconds (flaky cellular)
+    stall: float = 20.0
+    fail_rate: float = 0.0  # chance a request gets a 503
+
+    def delay(self, up_bytes: int, down_bytes: int) -> float:
+        d = self.rtt + max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if random.random() < self.stall_rate:
+            d += self.stall
+        if self.up_kbps:
+            d += up_bytes * 8 / (self.up_kbps * 1000)
+        if self.down_kbps:
+            d += down_bytes * 8 / (self.down_kbps * 1000)
+        return d
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # clients abandoning hedged or timed-out requests is expected
+
+
+@dataclass
+class StubCloud:
+    """Local HTTP server standing in for Deepgram and Anthropic."""
+
+    stt: LinkProfile = field(default_factory=lambda: LinkProfile(latency=0.3))
+    vision: LinkProfile = field(default_factory=lambda: LinkProfile(latency=1.5, jitter=0.4))
+    transcripts: list[str] = field(default_factory=lambda: [
+        "what plant is this",
+        "log this patch of sedum with some bare areas",
+        "is that drainage outlet blocked",
+    ])
+    reply: str = "That looks like Sedum album, white stonecrop, with about 80 percent cover."
+    words_per_sec: float = 2.5  # how much of a transcript each second of speech yields
+    final_change_rate: float = 0.0  # chance the final transcript differs from the interim ones
+
+    def __post_init__(self):
+        self.requests = {"stt": 0, "vision": 0}
+        self.bytes_up = {"stt": 0, "vision": 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubCloud":
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith("/v1/listen"):
+                    payload = cloud._stt_response(body)
+                    service = "stt"
+                elif self.path.startswith("/v1/messages"):
+                    payload = cloud._vision_response(json.loads(body))
+                    service = "vision"
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(payload).encode()
+                with cloud._lock:
+                    cloud.requests[service] += 1
+                    cloud.bytes_up[service] += len(body)
+                profile = cloud.stt if service == "stt" else cloud.vision
+                time.sleep(profile.delay(len(body), len(data)))
+                if random.random() < profile.fail_rate:
+                    self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = _QuietServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+    def _stt_response(self, wav: bytes) -> dict:
+        if not wav.startswith(b"RIFF"):  # FLAC or Opus: no decoder here, so the whole first sentence
+            return self._transcript(self.transcripts[0])
+        with wave.open(io.BytesIO(wav)) as wf:
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        # The sentence is picked by the opening audio, and one word is released
+        # per 1/words_per_sec of speech heard so far
+        text = self.transcripts[zlib.crc32(pcm[:SAMPLE_RATE // 2].tobytes()) % len(self.transcripts)]
+        blocks = pcm[: len(pcm) // CHUNK_SIZE * CHUNK_SIZE].reshape(-1, CHUNK_SIZE).astype(np.float64)
+        voiced = np.sqrt((blocks ** 2).mean(axis=1)) > 500
+        speech_sec = voiced.sum() * CHUNK_SIZE / SAMPLE_RATE
+        words = text.split()[: max(0, round(speech_sec * self.words_per_sec))]
+        trailing = np.argmax(voiced[::-1]) * CHUNK_SIZE / SAMPLE_RATE if voiced.any() else 0
+        final = abs(trailing - ENDPOINT_TAIL_SEC) < 1.5 * CHUNK_SIZE / SAMPLE_RATE
+        if final and random.random() < self.final_change_rate:
+            words.append("again")  # endpointed audio ends in exactly the trimmed tail
+        return self._transcript(" ".join(words))
+
+    @staticmethod
+    def _transcript(text: str) -> dict:
+        return {"results": {"channels": [{"alternatives": [{"transcript": text, "confidence": 0.98}]}]}}
+
+    def _vision_response(self, request: dict) -> dict:
+        parts = [
+            part for m in request.get("messages", [])
+            if isinstance(m.get("content"), list) for part in m["content"]
+        ]
+        images = sum(1 for part in parts if part.get("type") == "image")
+        items = sum(1 for part in parts if part.get("text", "").startswith("Item "))
+        text = self.reply
+        if items:  # rapid-log batch: one JSON result per numbered item
+            text = json.dumps([{"item": i, "response": self.reply, "hazard": False}
+                               for i in range(1, items + 1)])
+        return {
+            "id": f"msg_stub_{random.getrandbits(32):08x}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 100 + 1500 * images, "output_tokens": len(text) // 4},
+        }
+
+
+# --- Mock hardware ---
+
+def voiced_speech(seconds: float, pitch: float = 130.0) -> np.ndarray:
+    """Harmonic-rich, syllable-modulated tone that webrtcvad classifies as speech."""
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f0 = pitch + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 15))
+    signal *= 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return (signal / np.abs(signal).max() * 8000).astype(np.int16)
+
+
+class SyntheticAudio(AudioCapture):
+    """Plays a script of utterances separated by silence, chunk by chunk.
+
+    In realtime mode each chunk takes its real 30 ms, so endpointing delay is
+    measured as on the device; otherwise chunks are returned as fast as read.
+    """
+
+    def __init__(self, utterances: list[float], gap: float = 2.5, realtime: bool = True,
+                 noise: float = 20.0):
+        import webrtcvad
+        from config import VAD_AGGRESSIVENESS
+
+        self.vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+        self.stream = None
+        self.realtime = realtime
+        self.speech_end: float | None = None  # wall time the last utterance ended
+        self.last_speech_at: float | None = None
+
+        # Pre-render the whole session as (chunk, is_last_speech_chunk) pairs
+        self._chunks: list[tuple[bytes, bool]] = []
+        rng = np.random.default_rng(0)
+        for seconds in utterances:
+            self._add(rng.normal(0, noise, int(SAMPLE_RATE * 0.5)).astype(np.int16), False)
+            self._add(voiced_speech(seconds), True)
+            self._add(rng.normal(0, noise, int(SAMPLE_RATE * gap)).astype(np.int16), False)
+        self._pos = 0
+        self._next_due = None
+
+    def _add(self, samples: np.ndarray, speech: bool):
+        n = len(samples) // CHUNK_SIZE
+        for i in range(n):
+            chunk = samples[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE].tobytes()
+            self._chunks.append((chunk, speech and i == n - 1))
+
+    def start(self):
+        self._next_due = time.perf_counter()
+
+    def stop(self):
+        pass
+
+    def read_chunk(self) -> bytes:
+        if self._pos >= len(self._chunks):
+            raise SourceExhausted
+        chunk, last_speech = self._chunks[self._pos]
+        self._pos += 1
+        if self.realtime:
+            self._next_due += CHUNK_SIZE / SAMPLE_RATE
+            delay = self._next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_due = time.perf_counter()  # caller fell behind; don't burst
+        if last_speech:
+            self.speech_end = time.perf_counter()
+        return chunk
+
+
+class MockCamera(Camera):
+    """Full-resolution frames without picamera2. Each frame differs slightly,
+    so content-addressed storage can't deduplicate them away."""
+
+    def __init__(self, resolution: tuple[int, int] = None, store=None):
+        super().__init__(store=store)
+        from PIL import Image
+        from config import CAMERA_RESOLUTION
+
+        w, h = resolution or CAMERA_RESOLUTION
+        # Textured base image so JPEG encode cost resembles a real scene
+        base = np.random.default_rng(1).integers(0, 255, (h // 8, w // 8, 3), dtype=np.uint8)
+        self._base = Image.fromarray(base).resize((w, h), Image.Resampling.BILINEAR)
+        self._n = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def capture_frame(self):
+        frame = self._base.copy()
+        self._n += 1
+        frame.putpixel((self._n % frame.width, 0), (self._n % 255, 0, 0))
+        return frame
+
+
+def nmea_gga(lat: float, lon: float) -> str:
+    def dm(value: float, width: int) -> str:
+        deg = int(abs(value))
+        return f"{deg:0{width}d}{(abs(value) - deg) * 60:07.4f}"
+
+    body = (
+        f"GPGGA,{time.strftime('%H%M%S', time.gmtime())}.00,"
+        f"{dm(lat, 2)},{'N' if lat >= 0 else 'S'},{dm(lon, 3)},{'E' if lon >= 0 else 'W'},"
+        "1,08,0.9,35.0,M,47.0,M,,"
+    )
+    checksum = 0
+    for ch in body:
+        checksum ^= ord(ch)
+    return f"${body}*{checksum:02X}"
+
+
+class FakeSerial:
+    """Serial port stand-in emitting one NMEA sentence per `line_delay` seconds."""
+
+    def __init__(self, lat: float = 51.5074, lon: float = -0.1278, line_delay: float = 0.1):
+        self.lat, self.lon = lat, lon
+        self.line_delay = line_delay
+        self.lines_read = 0
+
+    def readline(self) -> bytes:
+        time.sleep(self.line_delay)
+        self.lines_read += 1
+        if self.lines_read % 2:
+            return b"$GPGSV,3,1,11,03,03,111,00,04,15,270,00,06,01,010,00,13,06,292,00*74\r\n"
+        return (nmea_gga(self.lat, self.lon) + "\r\n").encode("ascii")
+
+    def close(self):
+        pass
+
+
+def silent_wav(seconds: float, rate: int = 22050) -> bytes:
+    """A WAV of silence, shaped like Piper's output."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(b"\0\0" * int(rate * seconds))
+    return buf.getvalue()
+
+
+class NullOutput:
+    """Audio output that discards PCM (the Speaker still paces it in real time)."""
+
+    def __init__(self, rate: int, channels: int):
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        self.bytes_written += len(data)
+
+    def close(self):
+        pass
+
+    def kill(self):
+        pass
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Airpiece — migrate flat captures into the content-addressed store.
+
+Moves every image directly under data/captures/ to its sharded
+content-hash path, indexes it, and rewrites events.image_path to match.
+Identical images collapse into one file. Safe to re-run.
+
+Usage: python3 scripts/migrate_captures.py [--dry-run]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "firmware"))
+from capture_store import CaptureStore, _connect, shard_path
+from config import CAPTURES_DIR, DB_PATH
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def migrate(dry_run: bool = False) -> dict:
+    CaptureStore()  # make sure the index tables exist
+    counts = {"moved": 0, "duplicates": 0, "events": 0}
+    conn = _connect(DB_PATH)
+
+    for old in sorted(p for p in CAPTURES_DIR.iterdir() if p.is_file()):
+        if old.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        data = old.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        ext = old.suffix.lower().lstrip(".").replace("jpeg", "jpg")
+        new = shard_path(digest, ext)
+        duplicate = new.exists()
+        label = old.stem.split("_", 2)[2] if old.stem.count("_") >= 2 else None
+
+        event_ids = [
+            row[0] for row in conn.execute(
+                "SELECT id FROM events WHERE image_path = ? OR image_path LIKE ?",
+                (str(old), f"%/{old.name}"),
+            )
+        ]
+        print(f"{old.name} -> {new.relative_to(CAPTURES_DIR)}"
+              f"{' (duplicate)' if duplicate else ''}, {len(event_ids)} event(s)")
+        counts["duplicates" if duplicate else "moved"] += 1
+        counts["events"] += len(event_ids)
+        if dry_run:
+            continue
+
+        if duplicate:
+            old.unlink()
+        else:
+            new.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(old, new)  # same filesystem, so this is an atomic rename
+        conn.execute(
+            "INSERT OR IGNORE INTO captures (sha256, path, bytes, label, created) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (digest, str(new), len(data), label, datetime.now(timezone.utc).isoformat()),
+        )
+        for event_id in event_ids:
+            conn.execute("UPDATE events SET image_path = ? WHERE id = ?", (str(new), event_id))
+            conn.execute(
+                "INSERT OR IGNORE INTO capture_events (sha256, event_id) VALUES (?, ?)",
+                (digest, event_id),
+            )
+        conn.commit()
+
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true", help="show what would move")
+    args = parser.parse_args()
+
+    counts = migrate(dry_run=args.dry_run)
+    print(f"\n{counts['moved']} moved, {counts['duplicates']} duplicates removed, "
+          f"{counts['events']} event(s) relinked{' (dry run)' if args.dry_run else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Airpiece — import-time and startup profile.
+
+Reports where boot time goes: the slowest imports pulled in by `import main`
+(from python -X importtime, in a fresh interpreter), then a timed
+Airpiece.start() on mock hardware showing when each component became ready
+and when the loop started listening.
+
+Usage:
+    python3 scripts/profile_startup.py
+    python3 scripts/profile_startup.py --camera-delay 1.5 --top 25
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def import_profile(module: str, env: dict) -> list[tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) for every import in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / "firmware", env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile Airpiece imports and startup")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--camera-delay", type=float, default=1.0,
+                        help="simulated camera bring-up time, seconds")
+    parser.add_argument("--gps-delay", type=float, default=0.3,
+                        help="simulated GPS serial open time, seconds")
+    args = parser.parse_args()
+
+    data_dir = tempfile.TemporaryDirectory(prefix="airpiece-profile-")
+    env = {**os.environ, "AIRPIECE_DATA_DIR": data_dir.name, "SYNC_URL": "", "AIRPIECE_RECORD": ""}
+    os.environ.update(env)
+
+    rows = import_profile("main", env)
+    total = next((cum for name, _, cum, _ in rows if name == "main"), 0)
+    print(f"import main: {total / 1000:.0f} ms")
+    print(f"  {'module':<40}{'cumulative':>12}{'self':>10}   (ms)")
+    # Direct imports of firmware modules and the heaviest third-party packages
+    top_level = [r for r in rows if r[3] <= 1 and r[0] != "main"]
+    for name, self_us, cum, _ in sorted(top_level, key=lambda r: -r[2])[:args.top]:
+        print(f"  {name:<40}{cum / 1000:12.1f}{self_us / 1000:10.1f}")
+
+    sys.path.insert(0, str(ROOT / "firmware"))
+    sys.path.insert(0, str(ROOT / "scripts"))
+    t0 = time.perf_counter()
+    import main as airpiece
+    from bench_stubs import FakeSerial, MockCamera, SyntheticAudio
+    from gps import GPS
+    print(f"\nin-process import: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    camera = MockCamera()
+    camera.start = lambda: time.sleep(args.camera_delay)
+    gps = GPS()
+
+    def open_gps():
+        time.sleep(args.gps_delay)
+        gps.serial_conn = FakeSerial()
+
+    gps.start = open_gps
+    app = airpiece.Airpiece(audio=SyntheticAudio([]), camera=camera, gps=gps)
+    app.speaker.prompt = lambda text: None
+
+    app.start()
+    for ready in app._ready.values():
+        ready.wait(30)
+    print("startup (ms since start):")
+    for name, t in sorted(app.startup.items(), key=lambda kv: kv[1]["ready_ms"]):
+        took = f"  took {t['took_ms']:.0f}" if "took_ms" in t else ""
+        print(f"  {name:<10} ready at {t['ready_ms']:6.0f}{took}")
+    app.stop()
+    data_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Airpiece — replay a recorded session through the real pipeline.
+
+Record on the device with AIRPIECE_RECORD=1 (sessions land in data/sessions/),
+copy the file off, then:
+
+    python3 scripts/replay_session.py data/sessions/20250601T091500Z.session
+    python3 scripts/replay_session.py SESSION --realtime --json replay.json
+
+Audio, frames and NMEA are fed back through AudioCapture, Camera and GPS;
+STT, vision and rapid-log batch calls return the recorded results, so no network is needed and
+every run sees the same inputs. By default records are released as fast as
+the pipeline consumes them; --realtime paces them (and the cloud calls) as
+recorded. Replay writes to a throwaway data directory, never the live one.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Airpiece session")
+    parser.add_argument("session", type=Path)
+    parser.add_argument("--realtime", action="store_true", help="pace inputs as recorded")
+    parser.add_argument("--speak", action="store_true", help="play replies through TTS")
+    parser.add_argument("--json", help="write observations and stage timings to this file")
+    args = parser.parse_args()
+
+    data_dir = tempfile.TemporaryDirectory(prefix="airpiece-replay-")
+    os.environ.update({"AIRPIECE_DATA_DIR": data_dir.name, "SYNC_URL": "", "AIRPIECE_RECORD": ""})
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(ROOT / "firmware"))
+
+    import main as airpiece
+    from gps import GPS
+    from logger import get_today_events
+    from session import (
+        STT, VISION, VISION_BATCH, ReplayAudio, ReplayCamera, ReplayClock, ReplaySerial, ReplayService,
+        SessionEnded, SessionReader, batch_key,
+    )
+    from tracing import get_histograms
+    from tts import Speaker
+
+    reader = SessionReader(args.session)
+    clock = ReplayClock(realtime=args.realtime)
+    gps = GPS()
+    gps.start = lambda: None
+    gps.serial_conn = ReplaySerial(reader, clock)
+    app = airpiece.Airpiece(
+        audio=ReplayAudio(reader, clock),
+        camera=ReplayCamera(reader),
+        gps=gps,
+        transcribe=ReplayService(reader, STT, clock),
+        analyse=ReplayService(reader, VISION, clock),
+        analyse_batch=ReplayService(reader, VISION_BATCH, clock, key=batch_key),
+        speaker=None if args.speak else Speaker(synthesise=lambda text: None),
+        speculate=False,
+    )
+    # Background LLM work would need the network and isn't part of the recording
+    app.summariser.notify = lambda: None
+    app._write_report = lambda: None
+
+    print(f"{args.session}: {reader.duration:.1f}s recorded, records {reader.counts()}")
+    started = time.perf_counter()
+    try:
+        app.run()
+    except SessionEnded:
+        pass
+    wall = time.perf_counter() - started
+
+    events = [
+        {k: e[k] for k in ("event_type", "transcript", "ai_response", "latitude", "longitude")}
+        | {"timings_ms": json.loads(e["metadata"] or "{}").get("timings_ms")}
+        for e in get_today_events()
+    ]
+    stages = {
+        stage: {"count": h["count"], "mean_ms": h["sum"] / h["count"] * 1000}
+        for stage, h in get_histograms().items()
+    }
+
+    print(f"Replayed in {wall:.1f}s ({reader.duration / wall if wall else 0:.1f}x), "
+          f"{len(events)} events")
+    for stage, s in stages.items():
+        print(f"  {stage:<10}{s['mean_ms']:9.0f} ms  (n={s['count']})")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(
+            {"session": str(args.session), "wall_sec": wall, "events": events, "stages": stages},
+            indent=2,
+        ))
+        print(f"Wrote {args.json}")
+    reader.close()
+    data_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -86,4 +86,5 @@ echo "  1. Edit .env and add your ANTHROPIC_API_KEY"
 echo "  2. Reboot: sudo reboot"
 echo "  3. Wire up hardware (see docs/WIRING.md)"
 echo "  4. Test hardware: python3 scripts/test_hardware.py"
+echo "     then record a baseline: python3 scripts/test_hardware.py --bench"
 echo "  5. Run: python3 firmware/main.py"
@@ -1,11 +1,42 @@
 #!/usr/bin/env python3
-"""Airpiece — Hardware connectivity test.
+"""Airpiece — Hardware connectivity test and throughput benchmark.
 
-Run this after wiring everything up to verify each component works.
+Run this after wiring everything up to verify each component works:
+
+    python3 scripts/test_hardware.py
+
+--bench measures what the latency budget depends on, for each new unit or
+OS image:
+  - camera: sustained FPS, and capture-to-JPEG time at each resolution
+  - microphone: overflow rate while every core is busy
+  - GPS: sentence rate and parse cost
+  - TTS: Piper's real-time factor
+  - SQLite: event insert throughput
+
+Results are checked against BUDGET and saved as JSON under data/hw_bench/.
+They are compared with the previous run, or with --baseline.
+
+    python3 scripts/test_hardware.py --bench
+    python3 scripts/test_hardware.py --bench --only camera,tts --baseline pi5-reference.json
+
+The exit status is non-zero when a check fails or a metric is over budget.
 """
 
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
 import sys
+import tempfile
 import time
+import wave
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
 
 
 def test_camera():
@@ -52,9 +83,8 @@ def test_microphone():
         pa.terminate()
 
         # Check if we got non-silent audio
-        import struct
-        samples = struct.unpack(f"<{len(b''.join(frames))//2}h", b"".join(frames))
-        max_amp = max(abs(s) for s in samples)
+        import numpy as np
+        max_amp = int(np.abs(np.frombuffer(b"".join(frames), dtype=np.int16).astype(np.int32)).max())
         print(f"  OK — recorded {len(frames)} chunks, max amplitude: {max_amp}")
         if max_amp < 100:
             print("  WARNING — very low amplitude, mic may not be connected")
@@ -129,6 +159,17 @@ def test_tts():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Airpiece hardware test")
+    parser.add_argument("--bench", action="store_true", help="measure throughput against the latency budget")
+    parser.add_argument("--only", help=f"comma-separated benchmarks (default all: {','.join(BENCHMARKS)})")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each sustained measurement")
+    parser.add_argument("--baseline", type=Path, help="compare with this run (default: the previous one)")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    parser.add_argument("--no-save", action="store_true", help="don't add this run to data/hw_bench/")
+    args = parser.parse_args()
+    if args.bench:
+        return run_bench(args)
+
     print("=" * 40)
     print("  Airpiece Hardware Test")
     print("=" * 40)
@@ -157,5 +198,295 @@ def main():
     return 0 if failed == 0 else 1
 
 
+
+# --- Throughput benchmark (--bench) ---
+
+BENCH_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+# metric -> (comparison, limit) a unit must meet. At the capture resolution,
+# capture + JPEG is paid on every vision turn, and the first sentence's
+# synthesis time is paid before every reply is heard.
+BUDGET = {
+    "camera.1920x1080.fps": (">=", 10.0),
+    "camera.1920x1080.capture_jpeg_ms": ("<=", 200.0),
+    "mic.overflow_pct": ("<=", 0.5),
+    "gps.sentences_per_sec": (">=", 4.0),
+    "gps.parse_us": ("<=", 500.0),
+    "tts.rtf": ("<=", 0.5),
+    "tts.first_sentence_ms": ("<=", 800.0),
+    "sqlite.inserts_per_sec": (">=", 100.0),
+    "sqlite.insert_p99_ms": ("<=", 50.0),
+}
+REGRESSION_PCT = 10  # change against the baseline worth flagging
+
+TTS_SENTENCES = [
+    "Logged.",
+    "That's white stonecrop, Sedum album, in flower.",
+    "The membrane at the north parapet is lifting along about a metre of the upstand; "
+    "worth photographing before it rains.",
+]
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith(("fps", "per_sec"))
+
+
+def _burn(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(10_000))
+
+
+def bench_camera(seconds: float) -> dict:
+    """Sustained capture rate, and capture + JPEG + base64 as the vision path does it."""
+    from picamera2 import Picamera2
+    from camera import Camera
+
+    picam = Picamera2()
+    camera = Camera()
+    camera.camera = picam
+    out = {}
+    try:
+        for width, height in BENCH_RESOLUTIONS:
+            # The same configuration as Camera.start(), at each size
+            picam.configure(picam.create_still_configuration(main={"size": (width, height)}))
+            picam.start()
+            time.sleep(1)  # exposure and white balance settle
+            frames, t0 = 0, time.perf_counter()
+            while time.perf_counter() - t0 < seconds:
+                picam.capture_array()
+                frames += 1
+            fps = frames / (time.perf_counter() - t0)
+            encode = []
+            for _ in range(10):
+                t = time.perf_counter()
+                camera.frame_to_base64()
+                encode.append(time.perf_counter() - t)
+            picam.stop()
+            out[f"camera.{width}x{height}.fps"] = fps
+            out[f"camera.{width}x{height}.capture_jpeg_ms"] = statistics.median(encode) * 1000
+            print(f"  {width}x{height}: {fps:.1f} fps, capture+JPEG {statistics.median(encode) * 1000:.0f} ms")
+    finally:
+        picam.close()
+    return out
+
+
+def bench_microphone(seconds: float) -> dict:
+    """Overflowed reads while every core is busy, and the background level."""
+    import pyaudio
+    from config import CHANNELS, CHUNK_SIZE, SAMPLE_RATE
+    from endpointer import frame_levels
+
+    stop = multiprocessing.Event()
+    hogs = [multiprocessing.Process(target=_burn, args=(stop,), daemon=True) for _ in range(os.cpu_count() or 1)]
+    pa = pyaudio.PyAudio()
+    stream = pa.open(format=pyaudio.paInt16, channels=CHANNELS, rate=SAMPLE_RATE, input=True,
+                     frames_per_buffer=CHUNK_SIZE)
+    reads = overflows = 0
+    pcm = []
+    for hog in hogs:
+        hog.start()
+    try:
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            reads += 1
+            try:
+                pcm.append(stream.read(CHUNK_SIZE, exception_on_overflow=True))
+            except OSError:
+                overflows += 1
+    finally:
+        stop.set()
+        for hog in hogs:
+            hog.join()
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
+    levels = frame_levels(b"".join(pcm))
+    out = {"mic.overflow_pct": overflows / reads * 100,
+           "mic.noise_floor_db": float(sorted(levels)[len(levels) // 10]) if len(levels) else 0.0}
+    print(f"  {reads} reads under load on {len(hogs)} cores, {overflows} overflowed; "
+          f"background {out['mic.noise_floor_db']:.0f} dBFS")
+    return out
+
+
+def bench_gps(seconds: float) -> dict:
+    import pynmea2
+    import serial
+    from config import GPS_BAUD_RATE, GPS_SERIAL_PORT
+
+    ser = serial.Serial(GPS_SERIAL_PORT, GPS_BAUD_RATE, timeout=1)
+    lines = []
+    t0 = time.perf_counter()
+    try:
+        while time.perf_counter() - t0 < seconds:
+            line = ser.readline().decode("ascii", errors="replace").strip()
+            if line.startswith("$"):
+                lines.append(line)
+    finally:
+        ser.close()
+    elapsed = time.perf_counter() - t0
+    if not lines:
+        raise RuntimeError("no NMEA data received")
+    bad, t = 0, time.perf_counter()
+    for line in lines * max(1, 1000 // len(lines)):
+        try:
+            pynmea2.parse(line)
+        except pynmea2.ParseError:
+            bad += 1
+    parsed = len(lines) * max(1, 1000 // len(lines))
+    out = {"gps.sentences_per_sec": len(lines) / elapsed,
+           "gps.parse_us": (time.perf_counter() - t) / parsed * 1e6,
+           "gps.bad_pct": bad / parsed * 100}
+    print(f"  {len(lines)} sentences in {elapsed:.1f} s, parse {out['gps.parse_us']:.0f} us each")
+    return out
+
+
+def bench_tts(seconds: float) -> dict:
+    """Synthesis time over audio length; the first sentence is what a reply waits for."""
+    import shutil
+    from tts import _synthesise
+
+    took, audio = [], []
+    for text in TTS_SENTENCES:
+        t = time.perf_counter()
+        wav = _synthesise(text)
+        took.append(time.perf_counter() - t)
+        if wav is None:
+            raise RuntimeError("synthesis failed")
+        with wave.open(io.BytesIO(wav)) as wf:
+            audio.append(wf.getnframes() / wf.getframerate())
+    engine = "piper" if shutil.which("piper") else "espeak"
+    out = {"tts.rtf": sum(took) / sum(audio), "tts.first_sentence_ms": took[1] * 1000}
+    print(f"  {engine}: {sum(audio):.1f} s of speech in {sum(took):.1f} s (RTF {out['tts.rtf']:.2f})")
+    return out
+
+
+def bench_sqlite(seconds: float) -> dict:
+    """log_event() as the loop calls it: a connection and a commit per event."""
+    from logger import log_event
+
+    log_event("bench", transcript="warm-up")  # schema creation isn't part of it
+    took = []
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds / 2 or len(took) < 50:
+        t = time.perf_counter()
+        log_event("bench", transcript="log this: sedum plug failing near the drain outlet",
+                  ai_response="Bare patch about half a metre across beside the outlet.",
+                  latitude=51.5, longitude=-0.12, metadata={"bench": True})
+        took.append(time.perf_counter() - t)
+    took.sort()
+    out = {"sqlite.inserts_per_sec": len(took) / sum(took),
+           "sqlite.insert_p99_ms": took[min(len(took) - 1, int(len(took) * 0.99))] * 1000}
+    print(f"  {len(took)} inserts, {out['sqlite.inserts_per_sec']:.0f}/s, p99 {out['sqlite.insert_p99_ms']:.1f} ms")
+    return out
+
+
+BENCHMARKS = {
+    "camera": bench_camera,
+    "mic": bench_microphone,
+    "gps": bench_gps,
+    "tts": bench_tts,
+    "sqlite": bench_sqlite,
+}
+
+
+def _host() -> dict:
+    host = {"platform": platform.platform(), "machine": platform.machine(),
+            "python": platform.python_version(), "cpus": os.cpu_count()}
+    try:
+        host["model"] = Path("/proc/device-tree/model").read_text().strip("\x00\n")
+    except OSError:
+        pass
+    try:
+        for line in Path("/etc/os-release").read_text().splitlines():
+            if line.startswith("PRETTY_NAME="):
+                host["os"] = line.split("=", 1)[1].strip('"')
+    except OSError:
+        pass
+    return host
+
+
+def run_bench(args) -> int:
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+        return 2
+
+    # Results go to the real data directory, but the benchmark's own writes
+    # (events, captures) go to a scratch one on the same filesystem
+    data_dir = Path(os.getenv("AIRPIECE_DATA_DIR", ROOT / "data"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    scratch = tempfile.TemporaryDirectory(prefix=".hw-bench-", dir=data_dir)
+    os.environ["AIRPIECE_DATA_DIR"] = scratch.name
+    sys.path.insert(0, str(ROOT / "firmware"))
+    from config import DEVICE_ID
+
+    print("=" * 40)
+    print("  Airpiece Hardware Benchmark")
+    print("=" * 40)
+    metrics, skipped = {}, {}
+    for name in names:
+        print(f"\n[{name}]")
+        try:
+            metrics.update(BENCHMARKS[name](args.seconds))
+        except ImportError as e:
+            skipped[name] = f"not installed: {e.name}"
+            print(f"  SKIP — {skipped[name]}")
+        except Exception as e:
+            skipped[name] = str(e)
+            print(f"  FAIL — {e}")
+    scratch.cleanup()
+
+    history = data_dir / "hw_bench"
+    baseline_path = args.baseline
+    if baseline_path is None and history.exists():
+        previous = sorted(history.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        baseline_path = previous[-1] if previous else None
+    baseline = json.loads(baseline_path.read_text())["metrics"] if baseline_path else {}
+
+    over_budget = []
+    print("\n" + "=" * 40)
+    print(f"  Results{f' (vs {baseline_path.name})' if baseline_path else ''}")
+    print("=" * 40)
+    print(f"  {'metric':<34}{'value':>10}  {'budget':<10}{'':<7}{'change':>8}")
+    for metric, value in metrics.items():
+        budget, status = "", ""
+        if metric in BUDGET:
+            op, limit = BUDGET[metric]
+            ok = value >= limit if op == ">=" else value <= limit
+            budget, status = f"{op} {limit:g}", "ok" if ok else "OVER"
+            if not ok:
+                over_budget.append(metric)
+        change = ""
+        if baseline.get(metric):
+            pct = (value - baseline[metric]) / abs(baseline[metric]) * 100
+            worse = -pct if higher_is_better(metric) else pct
+            change = f"{pct:+.0f}%" + (" !" if worse > REGRESSION_PCT else "")
+        print(f"  {metric:<34}{value:>10.2f}  {budget:<10}{status:<7}{change:>8}")
+    for name in sorted(BUDGET.keys() - metrics.keys()):
+        if name.split(".")[0] in names and name.split(".")[0] not in skipped:
+            print(f"  {name:<34}{'-':>10}  (not measured)")
+
+    result = {
+        "device_id": DEVICE_ID,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": _host(),
+        "config": {"only": names, "seconds": args.seconds},
+        "metrics": metrics,
+        "skipped": skipped,
+        "over_budget": over_budget,
+        "baseline": str(baseline_path) if baseline_path else None,
+    }
+    if not args.no_save:
+        history.mkdir(exist_ok=True)
+        path = history / f"{DEVICE_ID}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+        path.write_text(json.dumps(result, indent=2))
+        print(f"\nSaved {path}")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+    print(f"\n{len(over_budget)} metric(s) over budget, {len(skipped)} benchmark(s) not run.")
+    return 1 if over_budget or skipped else 0
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -1,74 +1,236 @@
 """Airpiece companion server — view logs, reports, and captured images."""
 
+import asyncio
 import json
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from pathlib import Path
 
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent / "firmware"))
-from logger import get_events, get_today_events
-from config import CAPTURES_DIR, DATA_DIR
+from logger import (
+    get_events,
+    get_events_since,
+    get_latest_event,
+    get_latest_revision,
+    get_stats,
+    get_today_events,
+    today,
+)
+import archive
+from capture_store import relative_name
+from storage import get_usage
+from config import ARCHIVE_INTERVAL_SEC, CAPTURES_DIR, DATA_DIR, SYNC_TOKEN, ensure_dirs
 
-app = FastAPI(title="Airpiece")
+from feed import EventFeed
+from fleet import FleetStore
+from images import FORMATS, VariantCache, pick_format
+from ingest import UploadError, append_chunk, upload_status
+from metrics import Metrics, cache_metrics, device_metrics
+
+variants = VariantCache()
+feed = EventFeed()
+fleet = FleetStore()
+
+SSE_KEEPALIVE_SEC = 15
+
+
+async def archive_loop():
+    """Periodically move closed fleet days into the columnar archive."""
+    while True:
+        try:
+            await asyncio.to_thread(fleet.archive_closed_days, today())
+        except Exception as e:
+            log.error("Fleet archive failed: %s", e)
+        await asyncio.sleep(ARCHIVE_INTERVAL_SEC)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await feed.start()
+    archiver = asyncio.create_task(archive_loop())
+    yield
+    archiver.cancel()
+    await feed.stop()
+    variants.shutdown()
+
+
+app = FastAPI(title="Airpiece", lifespan=lifespan)
+log = logging.getLogger("airpiece.server")
 
 # Serve captured images
-if CAPTURES_DIR.exists():
-    app.mount("/captures", StaticFiles(directory=str(CAPTURES_DIR)), name="captures")
+ensure_dirs()
+app.mount("/captures", StaticFiles(directory=str(CAPTURES_DIR)), name="captures")
+
+
+ROW_CACHE_SIZE = 5000  # rendered <tr> fragments kept in memory
+DEFAULT_PAGE_SIZE = 100
+
+templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
+
+# event id (or (device, seq) for fleet rows) -> (fingerprint of displayed fields, row HTML)
+_row_cache: OrderedDict[int | tuple, tuple[tuple, str]] = OrderedDict()
+row_cache_stats = {"hits": 0, "misses": 0}
+
+
+def render_row(e: dict, device: bool = False) -> str:
+    """Render one event row, reusing the cached fragment if nothing changed."""
+    key = (e["device_id"], e["seq"]) if device else e["id"]
+    fingerprint = (
+        e["timestamp"], e["event_type"], e.get("transcript"), e.get("ai_response"),
+        e.get("image_path"), e.get("latitude"), e.get("longitude"), e.get("site_id"),
+    )
+    cached = _row_cache.get(key)
+    if cached and cached[0] == fingerprint:
+        _row_cache.move_to_end(key)
+        row_cache_stats["hits"] += 1
+        return cached[1]
+    row_cache_stats["misses"] += 1
+
+    image = relative_name(e["image_path"]) if e.get("image_path") else None
+    html = templates.get_template("_row.html").render(e=e, image=image, device=device)
+    _row_cache[key] = (fingerprint, html)
+    if len(_row_cache) > ROW_CACHE_SIZE:
+        _row_cache.popitem(last=False)
+    return html
 
 
 @app.get("/", response_class=HTMLResponse)
-async def dashboard():
-    events = get_today_events()
-    rows = ""
-    for e in events:
-        img = ""
-        if e.get("image_path"):
-            fname = Path(e["image_path"]).name
-            img = f'<img src="/captures/{fname}" style="max-width:200px;border-radius:4px">'
-        gps = ""
-        if e.get("latitude"):
-            gps = f'{e["latitude"]:.5f}, {e["longitude"]:.5f}'
-        rows += f"""
-        <tr>
-            <td style="white-space:nowrap">{e['timestamp'][:19]}</td>
-            <td><span class="badge">{e['event_type']}</span></td>
-            <td>{e.get('transcript', '') or ''}</td>
-            <td>{e.get('ai_response', '') or ''}</td>
-            <td>{img}</td>
-            <td>{gps}</td>
-        </tr>"""
-
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Airpiece Dashboard</title>
-        <style>
-            body {{ font-family: -apple-system, sans-serif; margin: 2rem; background: #0a0a0a; color: #e0e0e0; }}
-            h1 {{ color: #4ade80; }}
-            table {{ border-collapse: collapse; width: 100%; }}
-            th, td {{ padding: 0.75rem; border-bottom: 1px solid #222; text-align: left; vertical-align: top; }}
-            th {{ color: #888; font-weight: 500; text-transform: uppercase; font-size: 0.75rem; }}
-            .badge {{ background: #1a3a2a; color: #4ade80; padding: 2px 8px; border-radius: 4px; font-size: 0.8rem; }}
-            img {{ border: 1px solid #333; }}
-            .count {{ color: #888; margin-bottom: 1rem; }}
-        </style>
-    </head>
-    <body>
-        <h1>Airpiece</h1>
-        <p class="count">{len(events)} events today</p>
-        <table>
-            <thead>
-                <tr><th>Time</th><th>Type</th><th>Transcript</th><th>AI Response</th><th>Image</th><th>GPS</th></tr>
-            </thead>
-            <tbody>{rows}</tbody>
-        </table>
-    </body>
-    </html>
-    """
+async def dashboard(request: Request, page: int = 1, per_page: int = DEFAULT_PAGE_SIZE):
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 1000)
+
+    # Validators come from the newest event and the newest rewrite of an older
+    # one (rapid-log results), so an idle day costs two indexed lookups
+    latest = get_latest_event()
+    revision = get_latest_revision()
+    etag = (
+        f'W/"{today()}-{latest["id"] if latest else 0}-{revision["rev"] if revision else 0}'
+        f'-{page}-{per_page}"'
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if latest:
+        modified = datetime.fromisoformat(latest["timestamp"])
+        if revision:
+            modified = max(modified, datetime.fromisoformat(revision["revised_at"]))
+        headers["Last-Modified"] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    since = request.headers.get("if-modified-since")
+    if since and latest and "if-none-match" not in request.headers:
+        try:
+            if modified.replace(microsecond=0) <= parsedate_to_datetime(since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    total = get_stats()["total"]
+    pages = max((total + per_page - 1) // per_page, 1)
+    events = get_today_events(limit=per_page, offset=(page - 1) * per_page)
+    rows = Markup("".join(render_row(e) for e in events))
+
+    return templates.TemplateResponse(
+        request,
+        "dashboard.html",
+        {
+            "rows": rows, "total": total, "page": page, "pages": pages, "per_page": per_page,
+            "last_id": latest["id"] if latest else 0,
+        },
+        headers=headers,
+    )
+
+
+@app.get("/thumbs/{variant}/{name:path}")
+async def capture_variant(request: Request, variant: str, name: str):
+    """Downscaled capture for the dashboard; full-size originals stay under /captures."""
+    fmt = pick_format(request.headers.get("accept"))
+    path = await variants.get(variant, name, fmt)
+    if path is None:
+        raise HTTPException(status_code=404)
+    return FileResponse(
+        path,
+        media_type=FORMATS[fmt],
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"},
+    )
+
+
+@app.get("/api/stream")
+async def api_stream(request: Request, since: int = None):
+    """Server-Sent Events feed of new and rewritten events, each with its pre-rendered dashboard row."""
+    resume = request.headers.get("last-event-id")
+    last_sent = int(resume) if resume and resume.isdigit() else since
+    sub = feed.subscribe()
+
+    def message(e: dict) -> str:
+        data = json.dumps({"event": e, "row": render_row(e)})
+        return f"id: {e['id']}\nevent: event\ndata: {data}\n\n"
+
+    def update(e: dict) -> str:
+        # No id: Last-Event-ID tracks new rows only; rewrites missed while
+        # disconnected show up on the next page load
+        data = json.dumps({"event": e, "row": render_row(e)})
+        return f"event: update\ndata: {data}\n\n"
+
+    async def stream():
+        nonlocal last_sent
+        try:
+            yield "retry: 2000\n\n"
+            # Catch up from where the client left off, a page at a time until
+            # drained (however long it was away), then follow the shared tail
+            while last_sent is not None:
+                page = await asyncio.to_thread(get_events_since, last_sent)
+                if not page:
+                    break
+                for e in page:
+                    last_sent = e["id"]
+                    yield message(e)
+            while not (sub.lagged and sub.queue.empty()):
+                try:
+                    kind, e = await asyncio.wait_for(sub.queue.get(), SSE_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if kind == "update":
+                    yield update(e)
+                    continue
+                if last_sent is not None and e["id"] <= last_sent:
+                    continue
+                last_sent = e["id"]
+                yield message(e)
+        finally:
+            feed.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape: stage latency histograms, cache hit rates and queue depths."""
+    m = Metrics()
+    await asyncio.to_thread(device_metrics, m)
+    cache_metrics(m, "row_cache", "Rendered dashboard row cache",
+                  row_cache_stats["hits"], row_cache_stats["misses"])
+    m.gauge("airpiece_row_cache_entries", "Rendered rows held in memory", [({}, len(_row_cache))])
+    cache_metrics(m, "variant_cache", "Image variant cache", variants.hits, variants.misses)
+    m.gauge("airpiece_variant_cache_bytes", "Image variants on disk", [({}, variants.size_bytes)])
+    m.gauge("airpiece_feed_subscribers", "Connected live-feed clients", [({}, len(feed.subscribers))])
+    m.gauge("airpiece_feed_queue_depth", "Deepest live-feed subscriber queue", [({}, feed.queue_depth)])
+    m.counter("airpiece_feed_dropped_total", "Lagging feed subscribers cut off", [({}, feed.dropped)])
+    return PlainTextResponse(m.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/api/events")
@@ -76,6 +238,146 @@ async def api_events(event_type: str = None, limit: int = 100):
     return get_events(event_type=event_type, limit=limit)
 
 
+@app.get("/api/stats")
+async def api_stats(day: str = None):
+    """Per-day counts by type, time span, GPS coverage and capture bytes."""
+    return get_stats(day)
+
+
+@app.get("/api/storage")
+async def api_storage():
+    """Capture and database usage against the SD-card budget."""
+    return get_usage()
+
+
+def require_sync_token(request: Request):
+    if SYNC_TOKEN and request.headers.get("authorization") != f"Bearer {SYNC_TOKEN}":
+        raise HTTPException(status_code=401)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _event_problem(e) -> str | None:
+    """Why a synced event can't be stored, or None. The fleet store partitions on timestamp[:10]."""
+    if not isinstance(e, dict):
+        return "not an object"
+    if not isinstance(e.get("id"), int) or isinstance(e["id"], bool):
+        return "id must be an integer"
+    if not isinstance(e.get("event_type"), str) or not e["event_type"]:
+        return "event_type is required"
+    timestamp = e.get("timestamp")
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return "timestamp must be ISO 8601"
+    if timestamp[:10] != parsed.date().isoformat():
+        return "timestamp must start with a YYYY-MM-DD date"
+    for field in ("latitude", "longitude"):
+        if e.get(field) is not None and not _is_number(e[field]):
+            return f"{field} must be a number"
+    return None
+
+
+@app.post("/api/ingest/events", dependencies=[Depends(require_sync_token)])
+async def api_ingest_events(request: Request):
+    """Idempotent upsert of a batch of device events; returns the new high-water mark.
+
+    Each event's id is its sequence number on the sending device.
+    """
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="body must be JSON")
+    device_id = payload.get("device_id") if isinstance(payload, dict) else None
+    if not isinstance(device_id, str) or not device_id:
+        raise HTTPException(status_code=400, detail="device_id is required")
+    events = payload.get("events", [])
+    if not isinstance(events, list):
+        raise HTTPException(status_code=400, detail="events must be a list")
+    for i, e in enumerate(events):
+        problem = _event_problem(e)
+        if problem:
+            raise HTTPException(status_code=400, detail=f"events[{i}]: {problem}")
+    hwm = await asyncio.to_thread(fleet.ingest, device_id, events)
+    return {"accepted": len(events), "hwm": hwm}
+
+
+@app.get("/api/ingest/captures/{rel:path}", dependencies=[Depends(require_sync_token)])
+async def api_capture_status(rel: str, device_id: str, sha256: str, size: int):
+    try:
+        return await asyncio.to_thread(upload_status, rel, device_id, sha256, size)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.put("/api/ingest/captures/{rel:path}", dependencies=[Depends(require_sync_token)])
+async def api_capture_chunk(request: Request, rel: str, device_id: str, sha256: str, size: int):
+    """Append one chunk of a resumable capture upload."""
+    data = await request.body()
+    try:
+        return await asyncio.to_thread(
+            append_chunk, rel, device_id, sha256, size,
+            request.headers.get("content-range"), data,
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/fleet", response_class=HTMLResponse)
+async def fleet_dashboard(request: Request, day: str = None):
+    """Whole-crew timeline for a day, merged across devices."""
+    day = day or today()
+    events = await asyncio.to_thread(fleet.timeline, day, "", 1000)
+    rows = Markup("".join(render_row(e, device=True) for e in events))
+    return templates.TemplateResponse(
+        request,
+        "fleet.html",
+        {"rows": rows, "day": day, "counts": await asyncio.to_thread(fleet.counts, day)},
+    )
+
+
+@app.get("/api/fleet/timeline")
+async def api_fleet_timeline(day: str = None, since: str = "", limit: int = 500):
+    return await asyncio.to_thread(fleet.timeline, day or today(), since, min(limit, 5000))
+
+
+@app.get("/api/fleet/nearby")
+async def api_fleet_nearby(lat: float, lon: float, radius_m: float = 50, day: str = None):
+    """Observations from any crew near a point."""
+    return await asyncio.to_thread(fleet.nearby, day or today(), lat, lon, radius_m)
+
+
+@app.get("/api/analytics/counts")
+async def api_analytics_counts(
+    start: str, end: str, by: str = "event_type", event_type: list[str] = Query(None)
+):
+    """Archived event counts over a date range, grouped by one column."""
+    if by not in ("date", "event_type", "device_id"):
+        raise HTTPException(status_code=400, detail="by must be date, event_type or device_id")
+    try:
+        return await asyncio.to_thread(archive.counts, by, start, end, event_type)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@app.get("/api/analytics/events")
+async def api_analytics_events(
+    start: str, end: str,
+    columns: list[str] = Query(["timestamp", "device_id", "transcript", "ai_response"]),
+    event_type: list[str] = Query(None),
+):
+    """Archived events over a date range — only the requested columns are read."""
+    allowed = set(archive.COLUMNS) | {"date", "event_type"}
+    if not set(columns) <= allowed:
+        raise HTTPException(status_code=400, detail=f"columns must be from {sorted(allowed)}")
+    try:
+        return await asyncio.to_thread(archive.query, columns, start, end, event_type)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
 @app.get("/api/today")
 async def api_today():
     return get_today_events()
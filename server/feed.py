@@ -0,0 +1,93 @@
+"""Live change feed — tails new and rewritten events once and fans them out to every subscriber."""
+
+import asyncio
+import logging
+
+from config import FEED_POLL_SEC, FEED_QUEUE_SIZE
+from logger import get_events_since, get_latest_event, get_latest_revision, get_revised_since
+
+log = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One connected client. Its queue is bounded so a slow reader can't hold memory.
+
+    Items are ("event", event) for a new row and ("update", event) for a rewritten one.
+    """
+
+    def __init__(self):
+        self.queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.lagged = False
+
+
+class EventFeed:
+    """Polls the events table by rowid, and rewrites by revision, only while someone is listening."""
+
+    def __init__(self, poll_sec: float = FEED_POLL_SEC):
+        self.poll_sec = poll_sec
+        self.last_id = 0
+        self.last_rev = 0
+        self.subscribers: set[Subscriber] = set()
+        self.dropped = 0
+        self._task = None
+        self._wake = asyncio.Event()
+
+    async def start(self):
+        latest = await asyncio.to_thread(get_latest_event)
+        self.last_id = latest["id"] if latest else 0
+        revision = await asyncio.to_thread(get_latest_revision)
+        self.last_rev = revision["rev"] if revision else 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber()
+        self.subscribers.add(sub)
+        self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    @property
+    def queue_depth(self) -> int:
+        return max((s.queue.qsize() for s in self.subscribers), default=0)
+
+    async def _run(self):
+        while True:
+            if not self.subscribers:
+                self._wake.clear()
+                await self._wake.wait()
+            try:
+                events = await asyncio.to_thread(get_events_since, self.last_id)
+                revised = await asyncio.to_thread(get_revised_since, self.last_rev)
+            except Exception as e:
+                log.error("Feed tail query failed: %s", e)
+                events, revised = [], []
+            if events:
+                self.last_id = events[-1]["id"]
+                self._publish("event", events)
+            if revised:
+                self.last_rev = revised[-1]["rev"]
+                self._publish("update", revised)
+            await asyncio.sleep(self.poll_sec)
+
+    def _publish(self, kind: str, events: list[dict]):
+        for sub in list(self.subscribers):
+            for event in events:
+                try:
+                    sub.queue.put_nowait((kind, event))
+                except asyncio.QueueFull:
+                    # Backpressure: cut the client loose; it resumes via Last-Event-ID
+                    sub.lagged = True
+                    self.unsubscribe(sub)
+                    self.dropped += 1
+                    log.info("Dropped lagging feed subscriber")
+                    break
@@ -0,0 +1,185 @@
+"""Fleet event store — events from many devices, partitioned by device and day.
+
+Each (device, day) pair gets its own SQLite file under data/fleet/<device>/<day>.db,
+so devices never contend for the same write lock and a day's data can be
+archived or dropped as a unit. Within a partition, an event's primary key is
+its sequence number on the device (the device's own events.id), which makes
+re-sent batches idempotent. Cross-device queries fan out over the day's
+partitions, each answered from an index, and merge the results.
+"""
+
+import heapq
+import logging
+import math
+import re
+import sqlite3
+from pathlib import Path
+
+from config import ARCHIVE_DIR, DATA_DIR
+
+log = logging.getLogger(__name__)
+
+FLEET_DIR = DATA_DIR / "fleet"
+
+FIELDS = (
+    "timestamp", "event_type", "transcript", "ai_response",
+    "image_path", "latitude", "longitude", "metadata", "site_id",
+)
+
+METRES_PER_DEGREE = 111_320
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+class FleetStore:
+    """Partitioned storage and indexed cross-device queries."""
+
+    def __init__(self, root: Path = FLEET_DIR):
+        self.root = root
+        self._initialised: set[Path] = set()
+
+    def _path(self, device_id: str, day: str) -> Path:
+        return self.root / _safe(device_id) / f"{_safe(day)}.db"
+
+    def _connect(self, path: Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=5)
+        if path not in self._initialised:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    seq INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    transcript TEXT,
+                    ai_response TEXT,
+                    image_path TEXT,
+                    latitude REAL,
+                    longitude REAL,
+                    metadata TEXT,
+                    site_id TEXT
+                )
+            """)
+            if "site_id" not in {row[1] for row in conn.execute("PRAGMA table_info(events)")}:
+                conn.execute("ALTER TABLE events ADD COLUMN site_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON events (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_position ON events (latitude, longitude)")
+            self._initialised.add(path)
+        return conn
+
+    def devices(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def partitions(self, day: str) -> list[tuple[str, Path]]:
+        """(device_id, path) for every device with data on a day."""
+        return [
+            (device, path)
+            for device in self.devices()
+            if (path := self.root / device / f"{_safe(day)}.db").exists()
+        ]
+
+    # --- writes ---
+
+    def ingest(self, device_id: str, events: list[dict]) -> int:
+        """Upsert a batch from one device. Returns the highest sequence number stored."""
+        by_day: dict[str, list[dict]] = {}
+        for e in events:
+            by_day.setdefault(e["timestamp"][:10], []).append(e)
+
+        for day, batch in by_day.items():
+            path = self._path(device_id, day)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect(path)
+            with conn:
+                conn.executemany(
+                    f"""
+                    INSERT INTO events (seq, {", ".join(FIELDS)})
+                    VALUES (?, {", ".join("?" * len(FIELDS))})
+                    ON CONFLICT (seq) DO UPDATE SET
+                        {", ".join(f"{f} = excluded.{f}" for f in FIELDS)}
+                    """,
+                    [(e["id"], *(e.get(f) for f in FIELDS)) for e in batch],
+                )
+            conn.close()
+        return max((e["id"] for e in events), default=0)
+
+    # --- cross-device queries ---
+
+    def _query(self, path: Path, device_id: str, sql: str, params: tuple) -> list[dict]:
+        conn = self._connect(path)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(sql, params).fetchall()
+        conn.close()
+        return [{"device_id": device_id, **dict(row)} for row in rows]
+
+    def timeline(self, day: str, since: str = "", limit: int = 500) -> list[dict]:
+        """All crews' events for a day in time order, merged from per-device indexes."""
+        per_device = [
+            self._query(
+                path, device,
+                "SELECT * FROM events WHERE timestamp > ? ORDER BY timestamp LIMIT ?",
+                (since, limit),
+            )
+            for device, path in self.partitions(day)
+        ]
+        merged = heapq.merge(*per_device, key=lambda e: e["timestamp"])
+        return [e for _, e in zip(range(limit), merged)]
+
+    def nearby(self, day: str, lat: float, lon: float, radius_m: float = 50) -> list[dict]:
+        """Events from any device within radius_m of a point, nearest first."""
+        dlat = radius_m / METRES_PER_DEGREE
+        dlon = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        found = []
+        for device, path in self.partitions(day):
+            # Bounding box from the position index, then exact distance
+            for e in self._query(
+                path, device,
+                "SELECT * FROM events WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?",
+                (lat - dlat, lat + dlat, lon - dlon, lon + dlon),
+            ):
+                e["distance_m"] = haversine_m(lat, lon, e["latitude"], e["longitude"])
+                if e["distance_m"] <= radius_m:
+                    found.append(e)
+        return sorted(found, key=lambda e: e["distance_m"])
+
+    def archive_closed_days(self, before_day: str, archive_root: Path = ARCHIVE_DIR) -> int:
+        """Move every partition older than before_day into the Parquet archive.
+
+        Events for a day that arrive after it was archived (a late sync) are
+        merged into the archived day on the next pass.
+        """
+        from archive import HAS_PYARROW, write_day
+
+        if not HAS_PYARROW:
+            return 0
+        archived = 0
+        for device in self.devices():
+            for path in sorted((self.root / device).glob("*.db")):
+                day = path.stem
+                if day >= before_day:
+                    continue
+                rows = self._query(path, device, "SELECT * FROM events ORDER BY seq", ())
+                write_day(rows, day, f"fleet-{device}", archive_root)
+                self._initialised.discard(path)
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{path}{suffix}").unlink(missing_ok=True)
+                archived += len(rows)
+                log.info("Archived %d events for %s on %s", len(rows), device, day)
+        return archived
+
+    def counts(self, day: str) -> dict[str, int]:
+        """Events per device for a day."""
+        return {
+            device: self._query(path, device, "SELECT COUNT(*) AS n FROM events", ())[0]["n"]
+            for device, path in self.partitions(day)
+        }
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6_371_000 * math.asin(math.sqrt(a))
@@ -0,0 +1,113 @@
+"""Image derivatives — thumbnails and medium-size variants of captures, cached on disk."""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from config import CAPTURES_DIR, IMAGE_VARIANTS, IMAGE_WORKERS, THUMBS_DIR, THUMB_CACHE_MAX_BYTES
+
+log = logging.getLogger(__name__)
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def _render_variant(src: str, dst: str, max_side: int, quality: int, fmt: str):
+    """Decode, downscale and re-encode one capture. Runs in a worker process."""
+    from PIL import Image
+
+    with Image.open(src) as img:
+        # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale — much cheaper than a full decode
+        img.draft("RGB", (max_side, max_side))
+        img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        tmp = f"{dst}.tmp{os.getpid()}"
+        img.save(tmp, fmt.upper(), quality=quality)
+    os.replace(tmp, dst)
+
+
+class VariantCache:
+    """Generates image variants on demand and keeps them in a size-bounded LRU on disk."""
+
+    def __init__(self, root: Path = THUMBS_DIR, max_bytes: int = THUMB_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+        self._pending: dict[Path, asyncio.Future] = {}
+        self._entries: OrderedDict[Path, int] = OrderedDict()
+        self._total = 0
+        self._load()
+
+    def _load(self):
+        """Index existing variants, oldest first, so eviction survives restarts."""
+        files = [p for p in self.root.rglob("*") if p.is_file() and ".tmp" not in p.name]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path] = size
+            self._total += size
+
+    def source_path(self, name: str) -> Path | None:
+        """Resolve a capture name, refusing anything outside the captures directory."""
+        path = (CAPTURES_DIR / name).resolve()
+        if CAPTURES_DIR.resolve() not in path.parents or not path.is_file():
+            return None
+        return path
+
+    async def get(self, variant: str, name: str, fmt: str) -> Path | None:
+        """Return the path of a cached variant, rendering it first if needed."""
+        src = self.source_path(name)
+        if src is None or variant not in IMAGE_VARIANTS:
+            return None
+
+        dst = self.root / variant / f"{name}.{fmt}"
+        if dst in self._entries and dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+            self.hits += 1
+            self._entries.move_to_end(dst)
+            return dst
+
+        self.misses += 1
+        # Coalesce concurrent requests for the same variant into one render
+        if dst not in self._pending:
+            self._pending[dst] = asyncio.ensure_future(self._render(src, dst, variant, fmt))
+        try:
+            await asyncio.shield(self._pending[dst])
+        finally:
+            self._pending.pop(dst, None)
+        return dst
+
+    async def _render(self, src: Path, dst: Path, variant: str, fmt: str):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        max_side, quality = IMAGE_VARIANTS[variant]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._pool, _render_variant, str(src), str(dst), max_side, quality, fmt
+        )
+        self._add(dst, dst.stat().st_size)
+
+    def _add(self, path: Path, size: int):
+        self._total += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            old, old_size = self._entries.popitem(last=False)
+            old.unlink(missing_ok=True)
+            self._total -= old_size
+            log.debug("Evicted variant %s", old)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._total
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def pick_format(accept: str) -> str:
+    """Serve WebP to browsers that advertise it, JPEG otherwise."""
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
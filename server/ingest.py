@@ -0,0 +1,99 @@
+"""Ingest side of device sync — resumable capture uploads.
+
+A capture arrives as a series of PUTs with Content-Range. Bytes are appended
+to a partial file named by the upload's SHA-256; the partial file's size is
+the resume offset. Once every byte is in, the hash is verified and the file
+is moved into place under the same relative path it had on the device, so
+the events' image_path keeps pointing at it.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+from capture_store import _connect
+from config import CAPTURES_DIR, DATA_DIR, DB_PATH
+
+log = logging.getLogger(__name__)
+
+INCOMING_DIR = DATA_DIR / "incoming"
+
+_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class UploadError(ValueError):
+    """Rejected upload — bad path, range or hash."""
+
+
+def _target(rel: str) -> Path:
+    path = (CAPTURES_DIR / rel).resolve()
+    if CAPTURES_DIR.resolve() not in path.parents:
+        raise UploadError(f"invalid capture path: {rel}")
+    return path
+
+
+def _partial(device_id: str, sha256: str) -> Path:
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise UploadError("invalid sha256")
+    safe_device = re.sub(r"[^A-Za-z0-9_.-]", "_", device_id)
+    return INCOMING_DIR / safe_device / f"{sha256}.part"
+
+
+def upload_status(rel: str, device_id: str, sha256: str, size: int) -> dict:
+    """How much of an upload the server already holds."""
+    target = _target(rel)
+    if target.exists() and target.stat().st_size == size:
+        return {"received": size, "complete": True}
+    partial = _partial(device_id, sha256)
+    return {"received": partial.stat().st_size if partial.exists() else 0, "complete": False}
+
+
+def append_chunk(
+    rel: str, device_id: str, sha256: str, size: int, content_range: str, data: bytes
+) -> dict:
+    """Append one chunk at the offset given by Content-Range; finish when complete."""
+    target = _target(rel)
+    match = _RANGE.fullmatch(content_range or "")
+    if not match:
+        raise UploadError("missing or malformed Content-Range")
+    start, end, total = map(int, match.groups())
+    if total != size or end - start + 1 != len(data):
+        raise UploadError("Content-Range does not match upload")
+
+    partial = _partial(device_id, sha256)
+    partial.parent.mkdir(parents=True, exist_ok=True)
+    have = partial.stat().st_size if partial.exists() else 0
+    if start != have:
+        # Out-of-order or repeated chunk — tell the client where to resume
+        return {"received": have, "complete": False}
+
+    with open(partial, "ab") as f:
+        f.write(data)
+    have += len(data)
+    if have < size:
+        return {"received": have, "complete": False}
+
+    h = hashlib.sha256()
+    with open(partial, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    if h.hexdigest() != sha256:
+        partial.unlink()
+        raise UploadError("sha256 mismatch, upload discarded")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(partial, target)
+    conn = _connect(DB_PATH)
+    conn.execute(
+        "INSERT OR REPLACE INTO captures (sha256, path, bytes, created, synced_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (target.stem, str(target), size, datetime.now(timezone.utc).isoformat(),
+         datetime.now(timezone.utc).isoformat()),
+    )
+    conn.commit()
+    conn.close()
+    log.info("Received capture %s from %s", rel, device_id)
+    return {"received": size, "complete": True}
@@ -0,0 +1,140 @@
+"""Prometheus text exposition for /metrics.
+
+Hand-rolled rather than pulling in prometheus_client: every value is either
+a counter the server already keeps in memory or a cheap query on the device
+database, read at scrape time.
+"""
+
+import sqlite3
+
+from config import DB_PATH, SYNC_URL
+from tracing import get_histograms
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = (
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metrics:
+    """Collects one scrape's worth of exposition text."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def _header(self, name: str, kind: str, help: str):
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def gauge(self, name: str, help: str, samples: list[tuple[dict, float]]):
+        self._header(name, "gauge", help)
+        self.lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+
+    def counter(self, name: str, help: str, samples: list[tuple[dict, float]]):
+        self._header(name, "counter", help)
+        self.lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+
+    def histogram(self, name: str, help: str, series: list[tuple[dict, dict]]):
+        """series: (labels, {"buckets": [(le, cumulative count)], "sum", "count"})."""
+        self._header(name, "histogram", help)
+        for labels, h in series:
+            for le, n in h["buckets"]:
+                self.lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {n}")
+            self.lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h['count']}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {h['sum']}")
+            self.lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def device_metrics(m: Metrics, db_path=DB_PATH):
+    """Stage latency, backlogs, cloud calls, link quality, speculation and rapid log from the device database."""
+    m.histogram(
+        "airpiece_stage_seconds",
+        "Interaction stage latency",
+        [({"stage": stage}, h) for stage, h in get_histograms(db_path).items()],
+    )
+
+    conn = sqlite3.connect(db_path)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    if SYNC_URL and "sync_state" in tables:
+        row = conn.execute("SELECT value FROM sync_state WHERE key = 'events_hwm'").fetchone()
+        hwm = int(row[0]) if row else 0
+        pending = conn.execute("SELECT COUNT(*) FROM events WHERE id > ?", (hwm,)).fetchone()[0]
+        m.gauge("airpiece_sync_pending_events", "Events not yet pushed to the server",
+                [({}, pending)])
+        if "event_revisions" in tables:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'revisions_hwm'").fetchone()
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM event_revisions WHERE rev > ?", (int(row[0]) if row else 0,)
+            ).fetchone()[0]
+            m.gauge("airpiece_sync_pending_revisions", "Rewritten events not yet pushed again",
+                    [({}, pending)])
+    if SYNC_URL and "captures" in tables:
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM captures WHERE synced_at IS NULL AND deleted_at IS NULL"
+        ).fetchone()[0]
+        m.gauge("airpiece_sync_pending_captures", "Captures not yet uploaded", [({}, pending)])
+    if "report_chunks" in tables:
+        cached = conn.execute("SELECT COUNT(*) FROM report_chunks").fetchone()[0]
+        m.gauge("airpiece_report_cache_entries", "Cached report chunk summaries", [({}, cached)])
+    if "cloud_calls" in tables:
+        rows = conn.execute(
+            "SELECT service, decision, count FROM cloud_calls ORDER BY service, decision"
+        ).fetchall()
+        m.counter("airpiece_cloud_calls_total",
+                  "Cloud call outcomes and resilience decisions (hedge, retry, deadline, fallback...)",
+                  [({"service": service, "decision": decision}, n) for service, decision, n in rows])
+    if "circuit_breakers" in tables:
+        rows = conn.execute("SELECT service, state FROM circuit_breakers ORDER BY service").fetchall()
+        m.gauge("airpiece_circuit_open", "1 while a service's circuit breaker is open or probing",
+                [({"service": service}, int(state != "closed")) for service, state in rows])
+    if "link_state" in tables:
+        state = dict(conn.execute("SELECT key, value FROM link_state").fetchall())
+        if "upload_kbps" in state:
+            m.gauge("airpiece_link_upload_kbps", "Estimated upload throughput", [({}, state["upload_kbps"])])
+            m.gauge("airpiece_link_overhead_seconds", "Estimated round trip plus server time per request",
+                    [({"service": k[len("overhead_"):]}, v) for k, v in sorted(state.items())
+                     if k.startswith("overhead_")])
+        if "profile" in state:
+            m.gauge("airpiece_link_profile", "Quality profile in use (1 for the current one)",
+                    [({"profile": state["profile"]}, 1)])
+    if "speculation_stats" in tables:
+        rows = conn.execute(
+            "SELECT outcome, count, input_tokens, output_tokens FROM speculation_stats ORDER BY outcome"
+        ).fetchall()
+        m.counter("airpiece_speculation_total", "Speculative vision calls by outcome",
+                  [({"outcome": outcome}, n) for outcome, n, _, _ in rows])
+        # Tokens on "miss" calls were spent for nothing
+        m.counter("airpiece_speculation_tokens_total", "Tokens used by speculative vision calls",
+                  [({"outcome": outcome, "kind": kind}, n)
+                   for outcome, _, inp, out in rows for kind, n in (("input", inp), ("output", out))])
+        counts = {outcome: n for outcome, n, _, _ in rows}
+        total = sum(counts.values())
+        m.gauge("airpiece_speculation_hit_ratio", "Share of speculative vision calls used",
+                [({}, round(counts.get("hit", 0) / total, 4) if total else 0.0)])
+    if "rapid_stats" in tables:
+        stats = dict(conn.execute("SELECT key, count FROM rapid_stats").fetchall())
+        m.counter("airpiece_rapid_batches_total", "Rapid-log batch vision calls",
+                  [({}, stats.get("batches", 0))])
+        m.counter("airpiece_rapid_items_total", "Rapid-log observations by batch outcome",
+                  [({"outcome": k}, stats.get(k, 0)) for k in ("done", "retried", "failed")])
+        m.counter("airpiece_rapid_tokens_total", "Tokens used by rapid-log batch calls",
+                  [({"kind": kind}, stats.get(f"{kind}_tokens", 0)) for kind in ("input", "output")])
+    conn.close()
+
+
+def cache_metrics(m: Metrics, name: str, help: str, hits: int, misses: int):
+    """Hit/miss counters plus hit ratio for one cache."""
+    m.counter(f"airpiece_{name}_hits_total", f"{help} hits", [({}, hits)])
+    m.counter(f"airpiece_{name}_misses_total", f"{help} misses", [({}, misses)])
+    total = hits + misses
+    m.gauge(f"airpiece_{name}_hit_ratio", f"{help} hit ratio since start",
+            [({}, round(hits / total, 4) if total else 0.0)])
@@ -0,0 +1,19 @@
+"""Test setup: firmware, server and script modules on the path, all data in a temporary directory.
+
+The environment is set before config is first imported, so nothing here
+touches data/ or talks to a sync server.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+os.environ["AIRPIECE_DATA_DIR"] = tempfile.mkdtemp(prefix="airpiece-test-")
+os.environ["SYNC_URL"] = ""
+os.environ["DEVICE_ID"] = "test-device"
+
+for directory in ("firmware", "server", "scripts"):
+    sys.path.insert(0, str(ROOT / directory))
@@ -0,0 +1,94 @@
+"""Parquet archive of closed days: late rows and revisions must not lose data."""
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import archive  # noqa: E402
+from fleet import FleetStore  # noqa: E402
+
+DAY = "2025-06-01"
+
+
+def event(seq: int, hour: int, transcript: str) -> dict:
+    return {
+        "id": seq, "timestamp": f"{DAY}T{hour:02d}:00:00+00:00", "event_type": "observation",
+        "transcript": transcript, "ai_response": None, "image_path": None,
+        "latitude": None, "longitude": None, "metadata": None, "site_id": None,
+    }
+
+
+def archived(root) -> list[tuple]:
+    rows = archive.query(["device_id", "seq", "transcript"], DAY, DAY, root=root)
+    return sorted((r["device_id"], r["seq"], r["transcript"]) for r in rows)
+
+
+def test_late_rows_are_merged_into_an_archived_day(tmp_path):
+    fleet, root = FleetStore(tmp_path / "fleet"), tmp_path / "archive"
+    fleet.ingest("crew-1", [event(1, 9, "gutter blocked"), event(2, 10, "membrane split")])
+    fleet.ingest("crew-2", [event(1, 9, "sedum patchy")])
+    assert fleet.archive_closed_days("2025-06-02", root) == 3
+    assert fleet.partitions(DAY) == []
+
+    # A late sync for the archived day: one new event, one re-sent revision
+    fleet.ingest("crew-1", [event(3, 16, "flashing loose"), event(2, 10, "membrane split at upstand")])
+    assert fleet.archive_closed_days("2025-06-02", root) == 2
+
+    assert archived(root) == [
+        ("crew-1", 1, "gutter blocked"),
+        ("crew-1", 2, "membrane split at upstand"),
+        ("crew-1", 3, "flashing loose"),
+        ("crew-2", 1, "sedum patchy"),
+    ]
+
+
+def test_archiving_the_same_rows_twice_is_idempotent(tmp_path):
+    root = tmp_path / "archive"
+    rows = [{**event(1, 9, "gutter blocked"), "device_id": "crew-1", "seq": 1}]
+    archive.write_day(rows, DAY, "crew-1", root)
+    archive.write_day(rows, DAY, "crew-1", root)
+    assert archived(root) == [("crew-1", 1, "gutter blocked")]
+
+
+def device_db(path, revised_rev: int, events_hwm: int, revisions_hwm: int):
+    from logger import _connect
+
+    conn = _connect(path)
+    conn.executemany(
+        "INSERT INTO events (id, timestamp, event_type, transcript) VALUES (?, ?, 'observation', ?)",
+        [(1, f"{DAY}T09:00:00+00:00", "gutter blocked"), (2, f"{DAY}T10:00:00+00:00", "membrane split")],
+    )
+    conn.execute(
+        "INSERT INTO event_revisions (event_id, rev, revised_at) VALUES (2, ?, ?)",
+        (revised_rev, f"{DAY}T10:05:00+00:00"),
+    )
+    conn.execute("CREATE TABLE sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.executemany(
+        "INSERT INTO sync_state (key, value) VALUES (?, ?)",
+        [("events_hwm", str(events_hwm)), ("revisions_hwm", str(revisions_hwm))],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_a_day_with_an_unsynced_revision_stays_on_the_device(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "SYNC_URL", "http://office-pc:8080")
+    root = tmp_path / "archive"
+    device_db(tmp_path / "pending.db", revised_rev=5, events_hwm=2, revisions_hwm=4)
+    assert archive.archive_closed_days(tmp_path / "pending.db", root) == 0
+
+    device_db(tmp_path / "synced.db", revised_rev=5, events_hwm=2, revisions_hwm=5)
+    assert archive.archive_closed_days(tmp_path / "synced.db", root) == 2
+    assert [p.name for p in root.rglob("*.parquet")] == ["device-test-device.parquet"]
+
+
+def test_device_and_fleet_archives_do_not_overwrite_each_other(tmp_path):
+    root = tmp_path / "archive"
+    device_db(tmp_path / "airpiece.db", revised_rev=1, events_hwm=2, revisions_hwm=1)
+    archive.archive_closed_days(tmp_path / "airpiece.db", root)
+    fleet = FleetStore(tmp_path / "fleet")
+    fleet.ingest("test-device", [event(1, 9, "gutter blocked")])
+    fleet.archive_closed_days("2025-06-02", root)
+    assert sorted(p.name for p in root.rglob("*.parquet")) == [
+        "device-test-device.parquet", "fleet-test-device.parquet",
+    ]
@@ -0,0 +1,50 @@
+"""Event ingest endpoint: malformed batches are rejected with a 400, not a 500."""
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app as server  # noqa: E402
+from fleet import FleetStore  # noqa: E402
+
+EVENT = {"id": 7, "timestamp": "2025-06-01T09:00:00+00:00", "event_type": "observation"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "fleet", FleetStore(tmp_path / "fleet"))
+    return TestClient(server.app)
+
+
+def test_a_batch_is_stored(client):
+    event = {**EVENT, "latitude": 51.5, "longitude": -0.12}
+    r = client.post("/api/ingest/events", json={"device_id": "crew-1", "events": [event]})
+    assert r.status_code == 200
+    assert r.json() == {"accepted": 1, "hwm": 7}
+
+
+@pytest.mark.parametrize("body", [
+    {"events": [EVENT]},
+    {"device_id": "", "events": [EVENT]},
+    {"device_id": 3, "events": [EVENT]},
+    {"device_id": "crew-1", "events": {"id": 7}},
+    {"device_id": "crew-1", "events": [{"timestamp": EVENT["timestamp"]}]},
+    {"device_id": "crew-1", "events": [{"id": 7}]},
+    {"device_id": "crew-1", "events": [{k: v for k, v in EVENT.items() if k != "event_type"}]},
+    {"device_id": "crew-1", "events": [{**EVENT, "event_type": ""}]},
+    {"device_id": "crew-1", "events": [{**EVENT, "timestamp": "../../etc"}]},
+    {"device_id": "crew-1", "events": [{**EVENT, "timestamp": "20250601T090000"}]},
+    {"device_id": "crew-1", "events": [{**EVENT, "latitude": "abc"}]},
+    {"device_id": "crew-1", "events": [{**EVENT, "longitude": True}]},
+    ["crew-1"],
+])
+def test_malformed_batches_are_a_400(client, body):
+    assert client.post("/api/ingest/events", json=body).status_code == 400
+    assert server.fleet.devices() == []  # nothing stored, no junk partitions
+
+
+def test_a_body_that_is_not_json_is_a_400(client):
+    r = client.post("/api/ingest/events", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert r.status_code == 400
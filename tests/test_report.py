@@ -0,0 +1,93 @@
+"""Report engine: map-reduce over cached chunk summaries, against StubLLM."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from report import CHUNK_PROMPT, MERGE_PROMPT, ChunkCache, ReportEngine, StubLLM, chunk_events
+
+START = datetime(2025, 6, 1, 8, tzinfo=timezone.utc)
+
+
+def day(n: int, spacing_sec: int = 30) -> list[dict]:
+    return [
+        {
+            "timestamp": (START + timedelta(seconds=spacing_sec * i)).isoformat(),
+            "event_type": "observation",
+            "transcript": f"log this {i}",
+            "ai_response": f"Sedum patch {i}",
+        }
+        for i in range(n)
+    ]
+
+
+def calls(llm: StubLLM) -> dict[str, int]:
+    kinds = {"chunk": 0, "merge": 0, "final": 0}
+    for prompt in llm.prompts:
+        if prompt.startswith(CHUNK_PROMPT.split("\n")[0]):
+            kinds["chunk"] += 1
+        elif prompt.startswith(MERGE_PROMPT.split("\n")[0]):
+            kinds["merge"] += 1
+        else:
+            kinds["final"] += 1
+    return kinds
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return ReportEngine(StubLLM(), ChunkCache(tmp_path / "airpiece.db"))
+
+
+def test_small_day_is_a_single_call(engine):
+    engine.generate(day(10))
+    assert calls(engine.llm) == {"chunk": 0, "merge": 0, "final": 1}
+
+
+def test_cold_run_summarises_every_chunk(engine):
+    events = day(600)  # ten 30-minute windows: two merge groups
+    chunks = chunk_events(events)
+    assert len(chunks) == 10
+    engine.generate(events)
+    assert calls(engine.llm) == {"chunk": 10, "merge": 2, "final": 1}
+
+
+def test_unchanged_day_is_served_from_the_cache(engine):
+    events = day(600)
+    engine.generate(events)
+    engine.llm.prompts.clear()
+    engine.generate(events)
+    assert calls(engine.llm) == {"chunk": 0, "merge": 0, "final": 1}
+
+
+def test_only_changed_chunks_are_summarised_again(engine):
+    events = day(600)
+    engine.generate(events)
+    engine.llm.prompts.clear()
+
+    events[61]["ai_response"] = "Sedum patch, bare area around the outlet"  # second chunk
+    events.extend(day(630)[600:])  # a new window at the end
+    engine.generate(events)
+
+    kinds = calls(engine.llm)
+    assert kinds["chunk"] == 2
+    assert kinds["merge"] == 2  # both merge groups now hold a changed summary
+    assert kinds["final"] == 1
+    summarised = [p for p in engine.llm.prompts if p.startswith(CHUNK_PROMPT.split("\n")[0])]
+    assert any("bare area around the outlet" in p for p in summarised)
+
+
+def test_a_failed_chunk_is_not_cached(engine):
+    events = day(600)
+    llm = engine.llm
+
+    def flaky(system, prompt, max_tokens):
+        if "log this 100 " in prompt and prompt.startswith(CHUNK_PROMPT.split("\n")[0]):
+            raise TimeoutError("stub timeout")
+        return llm(system, prompt, max_tokens)
+
+    engine.llm = flaky
+    engine.generate(events)
+    engine.llm = llm
+    llm.prompts.clear()
+    engine.generate(events)
+    assert calls(llm)["chunk"] == 1
@@ -0,0 +1,53 @@
+"""Session record and replay of cloud calls, rapid-log batches included."""
+
+import pytest
+
+pytest.importorskip("webrtcvad")
+
+from bench_stubs import MockCamera, NullOutput, SyntheticAudio, silent_wav  # noqa: E402
+from session import (  # noqa: E402
+    VISION_BATCH, ReplayClock, ReplayedError, ReplayService, SessionReader, SessionRecorder, batch_key,
+)
+from tts import Speaker  # noqa: E402
+
+import main as airpiece  # noqa: E402
+
+
+def batch(items, usage=None):
+    if any(note == "offline" for _, note, _ in items):
+        raise ConnectionError("no signal")
+    if usage is not None:
+        usage.update(input_tokens=100 * len(items), output_tokens=20 * len(items))
+    return [{"response": f"analysed {note}", "hazard": False} for _, note, _ in items]
+
+
+def items(*notes):
+    return [(None, note, "GPS: no fix") for note in notes]
+
+
+def test_rapid_log_batches_are_recorded_and_replayed_out_of_order(tmp_path):
+    app = airpiece.Airpiece(
+        audio=SyntheticAudio([]), camera=MockCamera(resolution=(320, 240)),
+        speaker=Speaker(synthesise=lambda text: silent_wav(0.1), open_output=NullOutput),
+        speculate=False, analyse_batch=batch,
+    )
+    recorder = SessionRecorder(tmp_path / "rapid.session")
+    recorder.attach(app)
+
+    recorded_usage = {}
+    first = app.rapid.analyse_batch(items("gutter blocked", "sedum patchy"), usage=recorded_usage)
+    second = app.rapid.analyse_batch(items("flashing loose"), usage={})
+    with pytest.raises(ConnectionError):
+        app.rapid.analyse_batch(items("offline"), usage={})
+    recorder.close()
+
+    reader = SessionReader(tmp_path / "rapid.session")
+    replay = ReplayService(reader, VISION_BATCH, ReplayClock(realtime=False), key=batch_key)
+    # Batches run concurrently, so on replay they can come back in another order
+    assert replay(items("flashing loose"), usage={}) == second
+    usage = {}
+    assert replay(items("gutter blocked", "sedum patchy"), usage=usage) == first
+    assert usage == recorded_usage == {"input_tokens": 200, "output_tokens": 40}
+    with pytest.raises(ReplayedError, match="no signal"):
+        replay(items("offline"), usage={})
+    reader.close()
@@ -0,0 +1,154 @@
+"""Speculative vision: hit, miss and abandoned speculations against stubbed STT and vision."""
+
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("webrtcvad")
+
+from bench_stubs import MockCamera, NullOutput, SyntheticAudio, silent_wav  # noqa: E402
+from config import CHUNK_SIZE  # noqa: E402
+from speculate import Speculation, _connect, get_stats  # noqa: E402
+from tracing import Trace  # noqa: E402
+from tts import Speaker  # noqa: E402
+
+import main as airpiece  # noqa: E402
+
+SILENCE = bytes(CHUNK_SIZE * 2)
+
+
+class Services:
+    """STT that returns a scripted transcript, and a vision call that counts what it was asked."""
+
+    def __init__(self, interim: str):
+        self.interim = interim
+        self.asked: list[str] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def transcribe(self, wav: bytes) -> str:
+        return self.interim
+
+    def analyse(self, frame_b64, transcript: str, context: str, usage: dict = None) -> str:
+        self.asked.append(transcript)
+        self.release.wait(5)
+        if usage is not None:
+            usage.update(input_tokens=1000, output_tokens=50)
+        return f"reply to {transcript}"
+
+
+@pytest.fixture
+def make_app():
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM speculation_stats")
+    conn.close()
+    apps = []
+
+    def make(services: Services):
+        app = airpiece.Airpiece(
+            audio=SyntheticAudio([]), camera=MockCamera(resolution=(320, 240)),
+            transcribe=services.transcribe, analyse=services.analyse,
+            speaker=Speaker(synthesise=lambda text: silent_wav(0.1), open_output=NullOutput),
+            speculate=True,
+        )
+        app.speculator.start()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.speculator.stop()
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def speculate(app) -> Speculation:
+    """Feed the recording until interim transcripts agree and a speculative call starts."""
+    speculator, frames = app.speculator, []
+    app.speculator.reset()
+    while speculator._current is None:
+        frames += [SILENCE] * speculator._every
+        wait_for(lambda: not speculator._partial_running)
+        speculator.on_recording(list(frames))
+        wait_for(lambda: not speculator._partial_running)
+    return speculator._current
+
+
+def outcomes() -> dict:
+    return get_stats()
+
+
+def test_hit_uses_the_speculative_result(make_app):
+    services = Services("what plant is this")
+    app = make_app(services)
+    speculate(app)
+
+    spec = app.speculator.resolve("What plant is this?")
+    assert spec.hit
+    response, image_path = app._observe("What plant is this?", spec, Trace())
+
+    assert response == "reply to what plant is this"
+    assert services.asked == ["what plant is this"]  # no second vision call
+    assert image_path is not None and image_path.exists()
+    wait_for(lambda: "hit" in outcomes())
+    assert outcomes()["hit"] == {"count": 1, "input_tokens": 1000, "output_tokens": 50}
+
+
+def test_miss_discards_the_result_and_runs_vision_again(make_app):
+    services = Services("what plant is this")
+    app = make_app(services)
+    speculate(app)
+
+    spec = app.speculator.resolve("what plant is this growing by the outlet")
+    assert not spec.hit
+    response, _ = app._observe("what plant is this growing by the outlet", spec, Trace())
+
+    assert response == "reply to what plant is this growing by the outlet"
+    assert services.asked == ["what plant is this", "what plant is this growing by the outlet"]
+    wait_for(lambda: "miss" in outcomes())
+    assert outcomes()["miss"]["input_tokens"] == 1000  # the abandoned call was still paid for
+
+
+def test_reset_abandons_a_speculation_in_flight(make_app):
+    services = Services("is that drainage outlet blocked")
+    services.release.clear()  # the speculative call is still running when the next utterance starts
+    app = make_app(services)
+    spec = speculate(app)
+
+    app.speculator.reset()
+    assert app.speculator.resolve("status") is None  # nothing left over for the next utterance
+    services.release.set()
+    wait_for(lambda: spec.future.done() and "miss" in outcomes())
+    assert outcomes()["miss"]["count"] == 1
+    assert "hit" not in outcomes()
+
+
+def test_a_speculation_cancelled_before_its_call_starts_costs_nothing(make_app):
+    app = make_app(Services(""))
+    spec = Speculation("what plant is this")
+    spec.future = Future()  # queued behind other work, not yet running
+
+    app.speculator._abandon(spec)
+
+    assert spec.future.cancelled()
+    assert outcomes()["miss"] == {"count": 1, "input_tokens": 0, "output_tokens": 0}
+
+
+def test_no_speculation_for_voice_commands(make_app):
+    services = Services("status")
+    app = make_app(services)
+    speculator, frames = app.speculator, []
+    for _ in range(4):
+        frames += [SILENCE] * speculator._every
+        speculator.on_recording(list(frames))
+        wait_for(lambda: not speculator._partial_running)
+    assert speculator._current is None
+    assert services.asked == []
@@ -0,0 +1,84 @@
+"""Storage manager: only captures the server already has may be recompressed."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from capture_store import CaptureStore, _connect  # noqa: E402
+from config import RECOMPRESS_AFTER_DAYS  # noqa: E402
+from logger import _connect as events_connect  # noqa: E402
+from storage import StorageManager  # noqa: E402
+
+
+def captures(db, synced: bool, aged: bool, colours=("green", "grey")):
+    """Save one capture per colour; mark the first synced, optionally age them all."""
+    store = CaptureStore(db.parent / "captures", db)
+    paths = [store.save(Image.new("RGB", (64, 48), colour)) for colour in colours]
+    conn = _connect(db)
+    if aged:
+        created = (datetime.now(timezone.utc) - timedelta(days=RECOMPRESS_AFTER_DAYS + 1)).isoformat()
+        conn.execute("UPDATE captures SET created = ?", (created,))
+    if synced:
+        conn.execute("UPDATE captures SET synced_at = created WHERE path = ?", (str(paths[0]),))
+    conn.commit()
+    conn.close()
+    return paths
+
+
+def stored_paths(db) -> set[str]:
+    conn = _connect(db)
+    paths = {row[0] for row in conn.execute("SELECT path FROM captures")}
+    conn.close()
+    return paths
+
+
+@pytest.mark.parametrize("urgent, aged", [(True, False), (False, True), (True, True)])
+def test_only_synced_captures_are_recompressed(tmp_path, urgent, aged):
+    db = tmp_path / "airpiece.db"
+    events_connect(db).close()
+    synced, unsynced = captures(db, synced=True, aged=aged)
+
+    StorageManager(budget=0 if urgent else 10**12, db_path=db).run_once()
+
+    paths = stored_paths(db)
+    assert str(unsynced) in paths and unsynced.exists()  # still to be uploaded as it is
+    assert str(synced) not in paths and not synced.exists()
+    # Recompressed; at budget 0 the WebP is then pruned as well.
+    assert synced.with_suffix(".webp").exists() != urgent
+
+
+def test_fresh_captures_wait_when_not_over_budget(tmp_path):
+    db = tmp_path / "airpiece.db"
+    events_connect(db).close()
+    synced, unsynced = captures(db, synced=True, aged=False)
+
+    StorageManager(budget=10**12, db_path=db).run_once()
+
+    assert stored_paths(db) == {str(synced), str(unsynced)}
+
+
+def test_day_capture_bytes_follow_the_stored_frames():
+    from config import DB_PATH
+    from logger import get_stats, log_event
+
+    store = CaptureStore()
+    frame = store.save(Image.new("RGB", (64, 48), "navy"))
+    for _ in range(2):  # the same frame behind two events is stored once
+        store.link(frame, log_event("observation", image_path=str(frame)))
+    day = "2020-01-02"
+    conn = _connect(DB_PATH)
+    conn.execute(
+        "UPDATE captures SET created = ?, synced_at = ? WHERE path = ?",
+        (f"{day}T09:00:00+00:00", f"{day}T09:05:00+00:00", str(frame)),
+    )
+    conn.commit()
+    conn.close()
+    assert get_stats(day)["capture_bytes"] == frame.stat().st_size
+
+    StorageManager(budget=10**12).run_once()  # aged and synced: recompressed
+    assert get_stats(day)["capture_bytes"] == frame.with_suffix(".webp").stat().st_size
+
+    StorageManager(budget=0).run_once()  # over budget: pruned
+    assert get_stats(day)["capture_bytes"] == 0
@@ -0,0 +1,35 @@
+"""Event stream: a reconnecting client gets everything it missed, not just the first page."""
+
+import json
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app as server  # noqa: E402
+import logger  # noqa: E402
+from feed import EventFeed, Subscriber  # noqa: E402
+
+
+class CatchUpOnlyFeed(EventFeed):
+    """Hands out already-dropped subscribers, so the stream ends once catch-up is sent."""
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber()
+        sub.lagged = True
+        return sub
+
+
+def test_catch_up_drains_every_page(monkeypatch):
+    first = logger.log_event("observation", transcript="before")
+    missed = [logger.log_event("observation", transcript=f"missed {i}") for i in range(7)]
+    real = logger.get_events_since
+    monkeypatch.setattr(server, "get_events_since", lambda last_id: real(last_id, limit=3))
+    monkeypatch.setattr(server, "feed", CatchUpOnlyFeed())
+
+    r = TestClient(server.app).get("/api/stream", headers={"Last-Event-ID": str(first)})
+
+    lines = r.text.splitlines()
+    assert [json.loads(line[6:])["event"]["id"] for line in lines if line.startswith("data: ")] == missed
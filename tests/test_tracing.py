@@ -0,0 +1,29 @@
+"""Stage histograms stay consistent under concurrent records."""
+
+import threading
+
+from tracing import BUCKETS, Trace, get_histograms
+
+
+def test_concurrent_records_lose_no_bucket_increments(tmp_path):
+    db = tmp_path / "airpiece.db"
+    threads, per_thread = 8, 25
+
+    def record():
+        for i in range(per_thread):
+            trace = Trace()
+            trace.add("vision", 0.3 + i / 100)
+            trace.add("turn", 1.2)
+            trace.record(db)
+
+    workers = [threading.Thread(target=record) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    histograms = get_histograms(db)
+    for stage in ("vision", "turn"):
+        h = histograms[stage]
+        assert h["count"] == threads * per_thread
+        assert dict(h["buckets"])[BUCKETS[-1]] == h["count"]  # every sample is under the top bound